@@ -1,26 +1,36 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, session
+from flask import Blueprint, render_template, request, redirect, url_for, flash, session, jsonify, abort, Response, stream_with_context
+from sqlalchemy import select, func, case, or_
 from auth import login_required, admin_required
-from models import Topic, Question, User, QuestionAssignment
+from models import Topic, Question, User, QuestionAssignment, Job
 from app import db
-from openai_service import generate_question_variations
-import logging
+from jobs import submit_job, serialize_job, sweep_stale_jobs, ACTIVE_STATUSES
+from llm_cache import get_cache
+from llm_router import get_router
+from assignment import assign_roster, read_roster, resolve_roster
+from stats import get_dashboard_stats
+from pagination import keyset_page, page_size_arg
+from export import EXPORT_FORMATS, assignments_statement, questions_statement, export_chunks
+from importer import detect_format
+from db_routing import read_only
+from refill import trigger_refill, pool_settings, refill_enabled
+from purge import soft_delete_topic, count_topic_rows, active_topic_jobs
+import os
+import tempfile
 
 admin_bp = Blueprint('admin', __name__)
 
 @admin_bp.route('/dashboard')
 @login_required
 @admin_required
+@read_only
 def dashboard():
-    topics = Topic.query.all()
-    total_questions = Question.query.count()
-    total_students = User.query.filter_by(role='student').count()
-    total_assignments = QuestionAssignment.query.count()
+    stats = get_dashboard_stats()
     
     return render_template('admin/dashboard.html', 
-                         topics=topics,
-                         total_questions=total_questions,
-                         total_students=total_students,
-                         total_assignments=total_assignments)
+                         topics=stats['topics'],
+                         total_questions=stats['total_questions'],
+                         total_students=stats['total_students'],
+                         total_assignments=stats['total_assignments'])
 
 @admin_bp.route('/create_topic', methods=['GET', 'POST'])
 @login_required
@@ -52,96 +62,269 @@ def create_topic():
 @login_required
 @admin_required
 def generate_questions(topic_id):
-    topic = Topic.query.get_or_404(topic_id)
+    topic = Topic.get_active_or_404(topic_id)
     
     if request.method == 'POST':
         num_variations = int(request.form['num_variations'])
         base_question = request.form['base_question']
+        use_cache = 'fresh' not in request.form
+        stream = 'stream' in request.form
         
-        try:
-            logging.info(f"Starting question generation for topic {topic.id}: {topic.name}")
-            
-            # Generate question variations using OpenAI
-            variations = generate_question_variations(
-                base_question=base_question,
-                topic_name=topic.name,
-                difficulty=topic.difficulty,
-                category=topic.category,
-                num_variations=num_variations
-            )
-            
-            logging.info(f"Successfully generated {len(variations)} variations from AI")
-            
-            # Save generated questions to database
-            questions_added = 0
-            for i, variation in enumerate(variations):
-                try:
-                    question = Question(
-                        topic_id=topic.id,
-                        question_text=variation['question'],
-                        expected_answer=variation.get('expected_answer', ''),
-                        difficulty=topic.difficulty,
-                        variation_number=i + 1
-                    )
-                    db.session.add(question)
-                    questions_added += 1
-                    logging.debug(f"Added question {i+1}: {variation['question'][:50]}...")
-                except Exception as q_error:
-                    logging.error(f"Error adding question {i+1}: {q_error}")
-                    continue
-            
-            # Commit all questions at once
-            db.session.commit()
-            logging.info(f"Successfully committed {questions_added} questions to database")
-            
-            flash(f'🎉 Successfully generated {questions_added} question variations! Total questions for this topic: {Question.query.filter_by(topic_id=topic.id).count()}', 'success')
-            return redirect(url_for('admin.view_questions', topic_id=topic.id))
-            
-        except Exception as e:
-            db.session.rollback()
-            logging.error(f"Error generating questions: {e}")
-            logging.error(f"Exception type: {type(e).__name__}")
-            import traceback
-            logging.error(f"Traceback: {traceback.format_exc()}")
-            flash(f'Error generating questions: {str(e)}', 'error')
-    
-    return render_template('admin/generate_questions.html', topic=topic)
+        job = submit_job(
+            'generate',
+            topic_id=topic.id,
+            params={'base_question': base_question, 'num_variations': num_variations,
+                    'use_cache': use_cache, 'stream': stream},
+            created_by=session['user_id'],
+            total=num_variations
+        )
+        
+        flash(f'Question generation started for {num_variations} variations. You can keep working while it runs.', 'info')
+        return redirect(url_for('admin.generate_questions', topic_id=topic.id, job_id=job.id))
+    
+    job = None
+    job_id = request.args.get('job_id', type=int)
+    if job_id:
+        job = Job.query.filter_by(id=job_id, topic_id=topic.id).first()
+    
+    question_count = Question.query.filter_by(topic_id=topic.id).count()
+    low_watermark, target_size = pool_settings(topic)
+    
+    return render_template('admin/generate_questions.html', topic=topic, job=job, question_count=question_count,
+                           low_watermark=low_watermark, target_size=target_size,
+                           refill_on=refill_enabled(topic))
+
+@admin_bp.route('/jobs/<int:job_id>')
+@login_required
+@admin_required
+def job_status(job_id):
+    job = Job.query.get_or_404(job_id)
+    if job.status in ACTIVE_STATUSES and sweep_stale_jobs(job_id=job.id):
+        db.session.refresh(job)
+    return jsonify(serialize_job(job))
+
+@admin_bp.route('/llm_cache')
+@login_required
+@admin_required
+def llm_cache_stats():
+    cache = get_cache()
+    return jsonify(cache.stats() if cache is not None else {'enabled': False})
+
+@admin_bp.route('/llm_cache/clear', methods=['POST'])
+@login_required
+@admin_required
+def clear_llm_cache():
+    cache = get_cache()
+    if cache is not None:
+        cache.clear(request.form.get('namespace') or None)
+    flash('AI response cache cleared.', 'success')
+    return redirect(request.referrer or url_for('admin.dashboard'))
+
+@admin_bp.route('/llm_routing')
+@login_required
+@admin_required
+def llm_routing_stats():
+    return jsonify(get_router().stats())
 
 @admin_bp.route('/view_questions/<int:topic_id>')
 @login_required
 @admin_required
+@read_only
 def view_questions(topic_id):
-    topic = Topic.query.get_or_404(topic_id)
-    questions = Question.query.filter_by(topic_id=topic_id).all()
+    topic = Topic.get_active_or_404(topic_id)
+    status = request.args.get('status', '')
+    
+    statement = select(
+        Question.id,
+        Question.variation_number,
+        Question.question_text,
+        Question.expected_answer,
+        Question.is_assigned,
+        Question.quality_status,
+        Question.quality_feedback,
+        Question.created_at
+    ).where(Question.topic_id == topic_id)
+    if status == 'available':
+        statement = statement.where(Question.is_assigned == False)
+    elif status == 'assigned':
+        statement = statement.where(Question.is_assigned == True)
+    
+    questions, next_cursor = keyset_page(statement, Question.id, after=request.args.get('after', type=int),
+                                         limit=page_size_arg())
+    
+    total, assigned = db.session.query(
+        func.count(Question.id),
+        func.coalesce(func.sum(case((Question.is_assigned == True, 1), else_=0)), 0)
+    ).filter(Question.topic_id == topic_id).one()
     
-    return render_template('admin/view_questions.html', topic=topic, questions=questions)
+    return render_template('admin/view_questions.html', topic=topic, questions=questions,
+                           next_cursor=next_cursor, status=status,
+                           total_count=total, assigned_count=assigned)
 
-@admin_bp.route('/delete_topic/<int:topic_id>')
+@admin_bp.route('/import_questions/<int:topic_id>', methods=['POST'])
 @login_required
 @admin_required
-def delete_topic(topic_id):
-    topic = Topic.query.get_or_404(topic_id)
+def import_questions_to_topic(topic_id):
+    topic = Topic.get_active_or_404(topic_id)
+    
+    upload = request.files.get('bank')
+    if not upload or not upload.filename:
+        flash('Choose a CSV or JSONL file to import.', 'error')
+        return redirect(url_for('admin.view_questions', topic_id=topic.id))
+    
+    # The worker reads the upload from disk after this request has returned
+    fd, path = tempfile.mkstemp(prefix='question-import-', suffix=os.path.splitext(upload.filename)[1])
+    with os.fdopen(fd, 'wb') as stored:
+        upload.save(stored)
     
-    # Delete all related questions and assignments
-    Question.query.filter_by(topic_id=topic_id).delete()
-    QuestionAssignment.query.filter_by(topic_id=topic_id).delete()
+    job = submit_job(
+        'import',
+        topic_id=topic.id,
+        params={'path': path, 'fmt': detect_format(upload.filename)},
+        created_by=session['user_id']
+    )
     
-    db.session.delete(topic)
+    flash(f'Importing {upload.filename} in the background.', 'info')
+    return redirect(url_for('admin.generate_questions', topic_id=topic.id, job_id=job.id))
+
+@admin_bp.route('/assign_roster/<int:topic_id>', methods=['POST'])
+@login_required
+@admin_required
+def assign_roster_to_topic(topic_id):
+    topic = Topic.get_active_or_404(topic_id)
+    
+    user_ids = None
+    roster_file = request.files.get('roster')
+    if roster_file and roster_file.filename:
+        lines = roster_file.read().decode('utf-8-sig').splitlines()
+        user_ids, unknown = resolve_roster(read_roster(lines))
+        if unknown:
+            flash(f'{len(unknown)} roster entries did not match a student: {", ".join(unknown[:10])}', 'warning')
+    
+    try:
+        summary = assign_roster(topic.id, user_ids)
+    except Exception as e:
+        flash(f'Error assigning roster: {str(e)}', 'error')
+        return redirect(url_for('admin.view_questions', topic_id=topic.id))
+    
+    flash(f"Assigned {summary['assigned']} questions ({summary['already_assigned']} students already had one).", 'success')
+    if summary['without_question']:
+        flash(f"{summary['without_question']} students could not be assigned: generate more questions for this topic.", 'warning')
+    trigger_refill(topic.id)
+    return redirect(url_for('admin.view_questions', topic_id=topic.id))
+
+@admin_bp.route('/pool_settings/<int:topic_id>', methods=['POST'])
+@login_required
+@admin_required
+def update_pool_settings(topic_id):
+    topic = Topic.get_active_or_404(topic_id)
+    
+    low = request.form.get('pool_low_watermark', type=int)
+    target = request.form.get('pool_target_size', type=int)
+    if low is None or target is None or low < 0 or target < low:
+        flash('The target size must be at least the low watermark, and both must be zero or more.', 'error')
+        return redirect(url_for('admin.generate_questions', topic_id=topic.id))
+    
+    topic.pool_low_watermark = low
+    topic.pool_target_size = target
     db.session.commit()
     
-    flash('Topic and all related questions deleted successfully!', 'success')
+    job = trigger_refill(topic.id, force='top_up' in request.form)
+    if job:
+        flash(f'Automatic refill settings saved. Refill job #{job.id} is topping up the pool.', 'success')
+        return redirect(url_for('admin.generate_questions', topic_id=topic.id, job_id=job.id))
+    flash('Automatic refill settings saved.', 'success')
+    return redirect(url_for('admin.generate_questions', topic_id=topic.id))
+
+@admin_bp.route('/delete_topic/<int:topic_id>', methods=['POST'])
+@login_required
+@admin_required
+def delete_topic(topic_id):
+    topic = Topic.get_active_or_404(topic_id)
+    
+    # Jobs still adding questions would race the purge
+    busy = active_topic_jobs(topic.id)
+    if busy:
+        flash(f'Topic "{topic.name}" has running jobs ({", ".join(f"#{job.id}" for job in busy)}). '
+              f'Wait for them to finish before deleting it.', 'error')
+        return redirect(url_for('admin.dashboard'))
+    
+    # Hide the topic now; its questions and assignments are deleted in the background
+    soft_delete_topic(topic.id)
+    job = submit_job('purge', topic_id=topic.id, params={}, created_by=session['user_id'],
+                     total=count_topic_rows(topic.id))
+    
+    flash(f'Topic "{topic.name}" deleted. Its questions and assignments are being removed in the background (job #{job.id}).', 'success')
     return redirect(url_for('admin.dashboard'))
 
 @admin_bp.route('/view_assignments')
 @login_required
 @admin_required
+@read_only
 def view_assignments():
-    assignments = db.session.query(QuestionAssignment, User, Topic, Question).join(
+    topic_id = request.args.get('topic_id', type=int)
+    completed = request.args.get('completed', '')
+    user = request.args.get('user', '').strip()
+    
+    statement = select(
+        QuestionAssignment.id,
+        QuestionAssignment.assigned_at,
+        QuestionAssignment.completed,
+        User.username,
+        User.email,
+        Topic.id.label('topic_id'),
+        Topic.name.label('topic_name'),
+        Question.id.label('question_id'),
+        Question.variation_number,
+        func.substr(Question.question_text, 1, 150).label('question_preview')
+    ).join(
         User, QuestionAssignment.user_id == User.id
     ).join(
         Topic, QuestionAssignment.topic_id == Topic.id
     ).join(
         Question, QuestionAssignment.question_id == Question.id
+    ).where(Topic.deleted_at.is_(None))
+    if topic_id:
+        statement = statement.where(QuestionAssignment.topic_id == topic_id)
+    if completed in ('yes', 'no'):
+        statement = statement.where(QuestionAssignment.completed == (completed == 'yes'))
+    if user:
+        statement = statement.where(or_(User.username.startswith(user), User.email.startswith(user)))
+    
+    assignments, next_cursor = keyset_page(statement, QuestionAssignment.id,
+                                           after=request.args.get('after', type=int),
+                                           limit=page_size_arg(), descending=True)
+    topics = db.session.execute(
+        select(Topic.id, Topic.name).where(Topic.deleted_at.is_(None)).order_by(Topic.name)
     ).all()
     
-    return render_template('admin/view_assignments.html', assignments=assignments)
+    return render_template('admin/view_assignments.html', assignments=assignments, next_cursor=next_cursor,
+                           topics=topics, topic_id=topic_id, completed=completed, user=user)
+
+@admin_bp.route('/export/assignments.<fmt>')
+@login_required
+@admin_required
+@read_only
+def export_assignments(fmt):
+    if fmt not in EXPORT_FORMATS:
+        abort(404)
+    statement = assignments_statement(request.args.get('topic_id', type=int))
+    return Response(
+        stream_with_context(export_chunks(statement, fmt)),
+        mimetype=EXPORT_FORMATS[fmt],
+        headers={'Content-Disposition': f'attachment; filename=assignments.{fmt}'}
+    )
+
+@admin_bp.route('/export/questions/<int:topic_id>.<fmt>')
+@login_required
+@admin_required
+@read_only
+def export_questions(topic_id, fmt):
+    if fmt not in EXPORT_FORMATS:
+        abort(404)
+    Topic.get_active_or_404(topic_id)
+    return Response(
+        stream_with_context(export_chunks(questions_statement(topic_id), fmt)),
+        mimetype=EXPORT_FORMATS[fmt],
+        headers={'Content-Disposition': f'attachment; filename=topic-{topic_id}-questions.{fmt}'}
+    )
@@ -1,41 +1,52 @@
 import os
 import logging
+import threading
 
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy.orm import DeclarativeBase
 from werkzeug.middleware.proxy_fix import ProxyFix
 
-# Configure logging for debugging
-logging.basicConfig(level=logging.DEBUG)
+import db_routing
 
-class Base(DeclarativeBase):
-    pass
+# Log level from the environment; DEBUG logs every statement and request detail and is costly under load
+logging.basicConfig(level=os.environ.get("LOG_LEVEL", "INFO").upper())
 
-db = SQLAlchemy(model_class=Base)
+# Run bootstrap() before the first request each process serves. Turn this off
+# once deployments run `flask bootstrap` themselves, so cold starts skip it.
+AUTO_BOOTSTRAP = os.environ.get("AUTO_BOOTSTRAP", "1") != "0"
 
-# Create the app
-app = Flask(__name__)
-app.secret_key = os.environ.get("SESSION_SECRET", "dev-secret-key-change-in-production")
-app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
+class Base(DeclarativeBase):
+    pass
 
-# Configure the database
-app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get("DATABASE_URL")
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+db = SQLAlchemy(model_class=Base, session_options={"class_": db_routing.RoutingSession})
 
 
-# Initialize the app with the extension
-db.init_app(app)
+def bootstrap():
+    """Create missing tables, apply pending migrations and ensure the default admin exists.
 
-with app.app_context():
-    # Import models to ensure tables are created
+    Safe to run repeatedly. Must be called inside an application context.
+    Returns the migration versions applied.
+    """
     import models
-    db.create_all()
-    
-    # Create default admin user if it doesn't exist
+    from jobs import sweep_stale_jobs
+    from migrations import schema_lock, upgrade
     from models import User
+    from sqlalchemy.exc import IntegrityError
     from werkzeug.security import generate_password_hash
-    
+
+    # Only the primary: a replica receives the schema through replication.
+    # Under the schema lock, since every worker may bootstrap at once.
+    with schema_lock() as conn:
+        db.metadatas[None].create_all(conn)
+
+    # Evolve existing tables (indexes, new columns) that create_all won't touch
+    applied = upgrade()
+
+    # Jobs left behind by processes that exited mid-run
+    sweep_stale_jobs()
+
+    # Create default admin user if it doesn't exist
     admin = User.query.filter_by(username='admin').first()
     if not admin:
         admin_user = User(
@@ -45,19 +56,80 @@ with app.app_context():
             role='admin'
         )
         db.session.add(admin_user)
-        db.session.commit()
-        logging.info("Default admin user created: username=admin, password=admin123")
-
-# Import and register blueprints
-from auth import auth_bp
-from admin import admin_bp
-from student import student_bp
-
-app.register_blueprint(auth_bp)
-app.register_blueprint(admin_bp, url_prefix='/admin')
-app.register_blueprint(student_bp, url_prefix='/student')
-
-@app.route('/')
-def index():
-    from flask import redirect, url_for
-    return redirect(url_for('auth.login'))
+        try:
+            db.session.commit()
+            logging.info("Default admin user created: username=admin, password=admin123")
+        except IntegrityError:
+            # Another worker created it first
+            db.session.rollback()
+    return applied
+
+
+def create_app(config=None):
+    """Build the Flask application.
+
+    Nothing here touches the database or the LLM backend: the schema and
+    default admin are set up by ``flask bootstrap`` (or before the first
+    request when AUTO_BOOTSTRAP is on) and the LLM client is created on
+    first use.
+    """
+    app = Flask(__name__)
+    app.secret_key = os.environ.get("SESSION_SECRET", "dev-secret-key-change-in-production")
+    # x_for: login rate limits key on the client address behind the proxy
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=1, x_proto=1, x_host=1)
+
+    # Configure the database
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get("DATABASE_URL")
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['AUTO_BOOTSTRAP'] = AUTO_BOOTSTRAP
+    if config:
+        app.config.update(config)
+
+    # Pool settings per DB_PROFILE and the optional read replica bind
+    db_routing.init_app(app)
+
+    # Initialize the app with the extension
+    db.init_app(app)
+
+    # Import models so their tables are registered with the metadata
+    import models
+
+    # Request latency, SQL and LLM metrics at /metrics
+    import metrics
+    metrics.init_app(app)
+
+    # Import and register blueprints
+    from auth import auth_bp
+    from admin import admin_bp
+    from student import student_bp
+
+    app.register_blueprint(auth_bp)
+    app.register_blueprint(admin_bp, url_prefix='/admin')
+    app.register_blueprint(student_bp, url_prefix='/student')
+
+    from cli import register_commands
+    register_commands(app)
+
+    if app.config['AUTO_BOOTSTRAP']:
+        bootstrapped = threading.Event()
+        bootstrap_lock = threading.Lock()
+
+        @app.before_request
+        def bootstrap_on_first_request():
+            if bootstrapped.is_set():
+                return
+            with bootstrap_lock:
+                if not bootstrapped.is_set():
+                    bootstrap()
+                    bootstrapped.set()
+
+    @app.route('/')
+    def index():
+        from flask import redirect, url_for
+        return redirect(url_for('auth.login'))
+
+    return app
+
+
+# The module-level app used by main.py, gunicorn and `flask --app app`
+app = create_app()
@@ -0,0 +1,221 @@
+import time
+import random
+import logging
+from datetime import datetime
+
+from sqlalchemy import select, update, insert, func, or_
+from sqlalchemy.exc import IntegrityError, OperationalError
+
+from app import db
+from models import User, Question, QuestionAssignment, UNCLAIMABLE_STATUSES
+
+# How often a claim is retried when another request wins the race for a row
+CLAIM_ATTEMPTS = 8
+
+# Rows per bulk UPDATE when claiming questions for a whole roster
+ROSTER_CHUNK_SIZE = 500
+
+
+class PoolChanged(Exception):
+    """Raised when part of the question pool was claimed during a roster pass."""
+
+
+def _candidate_query(topic_id, pivot):
+    return select(Question.id).where(
+        Question.topic_id == topic_id,
+        Question.is_assigned == False,
+        Question.quality_status.notin_(UNCLAIMABLE_STATUSES),
+        Question.id >= pivot
+    ).order_by(Question.id).limit(1)
+
+
+def claim_random_question(topic_id):
+    """Atomically mark one random unassigned question of a topic as assigned.
+
+    A random pivot is drawn from the id range of the unassigned pool and the
+    first unassigned id at or after it (wrapping around) is claimed, so the
+    pool is never loaded into memory. Questions rejected by quality
+    validation, or still waiting for it, are never claimed. On PostgreSQL the claim is a single
+    ``UPDATE ... WHERE id = (SELECT ... FOR UPDATE SKIP LOCKED) RETURNING id``;
+    elsewhere a guarded ``UPDATE ... WHERE is_assigned = false`` is retried
+    until it wins. Returns the claimed question id, or None when the pool is
+    empty. The caller owns the transaction.
+    """
+    is_postgres = db.session.get_bind().dialect.name == 'postgresql'
+
+    for _ in range(CLAIM_ATTEMPTS):
+        low, high = db.session.execute(
+            select(func.min(Question.id), func.max(Question.id)).where(
+                Question.topic_id == topic_id,
+                Question.is_assigned == False,
+                Question.quality_status.notin_(UNCLAIMABLE_STATUSES)
+            )
+        ).one()
+        if low is None:
+            return None
+
+        pivot = random.randint(low, high)
+        for start in (pivot, low):
+            if is_postgres:
+                candidate = _candidate_query(topic_id, start).with_for_update(skip_locked=True).scalar_subquery()
+                claimed = db.session.execute(
+                    update(Question).where(Question.id == candidate)
+                    .values(is_assigned=True).returning(Question.id)
+                ).scalar()
+                if claimed is not None:
+                    return claimed
+            else:
+                candidate = db.session.execute(_candidate_query(topic_id, start)).scalar()
+                if candidate is None:
+                    continue
+                result = db.session.execute(
+                    update(Question).where(Question.id == candidate, Question.is_assigned == False)
+                    .values(is_assigned=True)
+                )
+                if result.rowcount == 1:
+                    return candidate
+
+    logging.warning(f"Could not claim a question for topic {topic_id} after {CLAIM_ATTEMPTS} attempts")
+    return None
+
+
+def assign_question(user_id, topic_id, retries=5):
+    """Return ``(assignment, created)`` for a user and topic.
+
+    An existing assignment is returned unchanged. Otherwise one question is
+    claimed and the assignment is inserted in the same transaction. If a
+    concurrent request for the same user wins the
+    ``unique_user_topic_assignment`` constraint, the claim is rolled back
+    and the winner's assignment is returned. ``(None, False)`` means the pool
+    is empty.
+    """
+    for attempt in range(retries):
+        existing = QuestionAssignment.query.filter_by(user_id=user_id, topic_id=topic_id).first()
+        if existing:
+            return existing, False
+
+        try:
+            question_id = claim_random_question(topic_id)
+            if question_id is None:
+                db.session.rollback()
+                return None, False
+
+            assignment = QuestionAssignment(user_id=user_id, question_id=question_id, topic_id=topic_id)
+            db.session.add(assignment)
+            db.session.commit()
+            return assignment, True
+
+        except IntegrityError:
+            # Another request assigned this user first; our claim is rolled back with it
+            db.session.rollback()
+        except OperationalError as e:
+            # SQLite reports write contention as "database is locked"
+            db.session.rollback()
+            logging.warning(f"Assignment for user {user_id} topic {topic_id} hit contention: {e}")
+            time.sleep(0.01 * (attempt + 1) * random.random())
+
+    existing = QuestionAssignment.query.filter_by(user_id=user_id, topic_id=topic_id).first()
+    return existing, False
+
+
+def read_roster(lines):
+    """Return the identifiers in a roster file: the first column of each non-empty line."""
+    identifiers = []
+    for line in lines:
+        first = line.split(',')[0].strip().strip('"')
+        if first and first.lower() not in ('username', 'email'):
+            identifiers.append(first)
+    return identifiers
+
+
+def resolve_roster(identifiers):
+    """Map usernames or emails to student user ids.
+
+    Returns ``(user_ids, unknown)`` where ``unknown`` lists identifiers that
+    matched no student.
+    """
+    wanted = [identifier.strip() for identifier in identifiers if identifier and identifier.strip()]
+    rows = db.session.execute(
+        select(User.id, User.username, User.email).where(
+            User.role == 'student',
+            or_(User.username.in_(wanted), User.email.in_(wanted))
+        )
+    ).all()
+
+    by_identifier = {}
+    for user_id, username, email in rows:
+        by_identifier[username] = user_id
+        by_identifier[email] = user_id
+
+    user_ids = list(dict.fromkeys(by_identifier[i] for i in wanted if i in by_identifier))
+    unknown = [i for i in wanted if i not in by_identifier]
+    return user_ids, unknown
+
+
+def assign_roster(topic_id, user_ids=None, retries=3):
+    """Give every student in a roster a question for a topic in one transaction.
+
+    ``user_ids`` defaults to every user with the student role. Students that
+    already hold an assignment are skipped; the rest are matched one-to-one
+    with a shuffled slice of the unassigned pool in memory and written with
+    bulk statements. The pool is claimed with a guarded UPDATE, so if a
+    student claims a question concurrently the whole pass is retried.
+    Returns a summary dict.
+    """
+    for attempt in range(retries):
+        try:
+            if user_ids is None:
+                roster = db.session.execute(select(User.id).where(User.role == 'student')).scalars().all()
+            else:
+                roster = list(dict.fromkeys(user_ids))
+
+            already = set(db.session.execute(
+                select(QuestionAssignment.user_id).where(QuestionAssignment.topic_id == topic_id)
+            ).scalars())
+            pending = [user_id for user_id in roster if user_id not in already]
+
+            pool_query = select(Question.id).where(
+                Question.topic_id == topic_id,
+                Question.is_assigned == False,
+                Question.quality_status.notin_(UNCLAIMABLE_STATUSES)
+            )
+            if db.session.get_bind().dialect.name == 'postgresql':
+                pool_query = pool_query.with_for_update(skip_locked=True)
+            pool = db.session.execute(pool_query).scalars().all()
+
+            random.shuffle(pending)
+            pool = random.sample(pool, min(len(pool), len(pending)))
+            pairs = list(zip(pending, pool))
+
+            for start in range(0, len(pairs), ROSTER_CHUNK_SIZE):
+                chunk = [question_id for _, question_id in pairs[start:start + ROSTER_CHUNK_SIZE]]
+                claimed = db.session.execute(
+                    update(Question).where(Question.id.in_(chunk), Question.is_assigned == False)
+                    .values(is_assigned=True)
+                ).rowcount
+                if claimed != len(chunk):
+                    raise PoolChanged()
+
+            if pairs:
+                now = datetime.utcnow()
+                db.session.execute(insert(QuestionAssignment), [
+                    {"user_id": user_id, "question_id": question_id, "topic_id": topic_id,
+                     "assigned_at": now, "completed": False}
+                    for user_id, question_id in pairs
+                ])
+            db.session.commit()
+
+            logging.info(f"Pre-assigned {len(pairs)} questions for topic {topic_id}")
+            return {
+                "assigned": len(pairs),
+                "already_assigned": len(roster) - len(pending),
+                "without_question": len(pending) - len(pairs),
+                "roster": len(roster),
+            }
+
+        except (PoolChanged, IntegrityError, OperationalError) as e:
+            db.session.rollback()
+            logging.warning(f"Roster assignment for topic {topic_id} raced with students ({type(e).__name__}); retrying")
+            time.sleep(0.05 * (attempt + 1))
+
+    raise Exception("Roster assignment kept conflicting with live student requests; try again shortly")
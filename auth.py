@@ -1,22 +1,131 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, session
-from werkzeug.security import check_password_hash, generate_password_hash
+import os
+from collections import namedtuple
+from functools import wraps
+
+from flask import Blueprint, render_template, request, redirect, url_for, flash, session, g
+from sqlalchemy import select, update, or_
+from sqlalchemy.exc import IntegrityError
 from models import User
 from app import db
+from cache import TTLCache
+from passwords import HashingBusy, hash_password, verify_password, needs_rehash, upgrade_hash
+from ratelimit import RateLimit
 
 auth_bp = Blueprint('auth', __name__)
 
+# How long a process trusts its cached copy of a user's role and session version.
+# Changes made through set_user_role apply at once in the process that made
+# them and within this many seconds everywhere else.
+PRINCIPAL_CACHE_TTL = float(os.environ.get("PRINCIPAL_CACHE_TTL", "30"))
+PRINCIPAL_CACHE_SIZE = int(os.environ.get("PRINCIPAL_CACHE_SIZE", "10000"))
+
+# Login attempts allowed per username and per client IP, as "N/seconds".
+# The username limit stops password guessing. The IP limit is only a flood
+# guard on password hashing, shared by logins and registrations: loose
+# enough for a class of hundreds behind one NAT address to sign in at once.
+LOGIN_LIMIT_PER_USERNAME = RateLimit('login-user', os.environ.get("LOGIN_RATE_PER_USERNAME", "10/300"))
+LOGIN_LIMIT_PER_IP = RateLimit('login-ip', os.environ.get("LOGIN_RATE_PER_IP", "1000/60"))
+
+Principal = namedtuple('Principal', ['id', 'username', 'role', 'session_version'])
+
+_principals = TTLCache(maxsize=PRINCIPAL_CACHE_SIZE, ttl=PRINCIPAL_CACHE_TTL)
+_MISSING = object()  # cached marker for deleted users
+
+
+def _load_principal(user_id):
+    row = db.session.execute(
+        select(User.id, User.username, User.role, User.session_version).where(User.id == user_id)
+    ).one_or_none()
+    return Principal(*row) if row is not None else _MISSING
+
+
+def invalidate_principal(user_id):
+    """Drop this process's cached copy of a user after changing or deleting them."""
+    _principals.delete(user_id)
+
+
+def set_user_role(user_id, role):
+    """Change a user's role and sign them out of every existing session."""
+    changed = db.session.execute(
+        update(User).where(User.id == user_id)
+        .values(role=role, session_version=User.session_version + 1)
+    ).rowcount
+    db.session.commit()
+    invalidate_principal(user_id)
+    return changed == 1
+
+
+def start_session(user):
+    """Store a freshly authenticated user in the (signed) session cookie."""
+    session.clear()
+    session['user_id'] = user.id
+    session['username'] = user.username
+    session['role'] = user.role
+    session['version'] = user.session_version
+    _principals.set(user.id, Principal(user.id, user.username, user.role, user.session_version))
+
+
+def current_principal():
+    """Return the Principal behind this request's session, or None.
+
+    The session cookie carries the user id and the session version it was
+    issued for; both are checked against the principal cache, so requests
+    normally cost no queries. A deleted user or a bumped session version
+    ends the session.
+    """
+    if 'principal' in g:
+        return g.principal
+
+    principal = None
+    user_id = session.get('user_id')
+    if user_id is not None:
+        cached = _principals.get_or_set(user_id, lambda: _load_principal(user_id))
+        if cached is not _MISSING and cached.session_version == session.get('version'):
+            principal = cached
+            if session.get('role') != principal.role:
+                session['role'] = principal.role
+        else:
+            session.clear()
+
+    g.principal = principal
+    return principal
+
+def _too_many_attempts(retry_after):
+    flash('Too many attempts. Please wait a moment and try again.', 'error')
+    return render_template('login.html'), 429, {'Retry-After': str(int(retry_after) + 1)}
+
 @auth_bp.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
         username = request.form['username']
         password = request.form['password']
         
+        # Limits are checked before any hashing, so floods cost no CPU
+        for limit, key in ((LOGIN_LIMIT_PER_IP, request.remote_addr), (LOGIN_LIMIT_PER_USERNAME, username.lower())):
+            allowed, retry_after = limit.hit(key)
+            if not allowed:
+                return _too_many_attempts(retry_after)
+        
         user = User.query.filter_by(username=username).first()
+        password_hash = user.password_hash if user else None
+        # Give the connection back to the pool while the hash queues and runs
+        db.session.commit()
+        
+        try:
+            verified = verify_password(password_hash, password)
+        except HashingBusy:
+            flash('The server is busy. Please try logging in again in a few seconds.', 'error')
+            return render_template('login.html'), 503, {'Retry-After': '2'}
         
-        if user and check_password_hash(user.password_hash, password):
-            session['user_id'] = user.id
-            session['username'] = user.username
-            session['role'] = user.role
+        if verified:
+            if needs_rehash(password_hash):
+                upgraded = upgrade_hash(password)
+                if upgraded:
+                    user.password_hash = upgraded
+                    db.session.commit()
+            
+            LOGIN_LIMIT_PER_USERNAME.reset(username.lower())
+            start_session(user)
             
             if user.role == 'admin':
                 return redirect(url_for('admin.dashboard'))
@@ -35,25 +144,35 @@ def register():
         password = request.form['password']
         role = request.form.get('role', 'student')
         
-        # Check if user already exists
-        if User.query.filter_by(username=username).first():
-            flash('Username already exists', 'error')
-            return render_template('login.html')
+        # Registrations hash a password too, so they share the per-IP flood guard
+        allowed, retry_after = LOGIN_LIMIT_PER_IP.hit(request.remote_addr)
+        if not allowed:
+            return _too_many_attempts(retry_after)
         
-        if User.query.filter_by(email=email).first():
-            flash('Email already exists', 'error')
-            return render_template('login.html')
+        try:
+            password_hash = hash_password(password)
+        except HashingBusy:
+            flash('The server is busy. Please try again in a few seconds.', 'error')
+            return render_template('login.html'), 503, {'Retry-After': '2'}
         
-        # Create new user
+        # Create new user; the unique constraints on username and email do the duplicate check
         user = User(
             username=username,
             email=email,
-            password_hash=generate_password_hash(password),
+            password_hash=password_hash,
             role=role
         )
         
         db.session.add(user)
-        db.session.commit()
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            taken = db.session.execute(
+                select(User.username).where(or_(User.username == username, User.email == email))
+            ).scalars().all()
+            flash('Username already exists' if username in taken else 'Email already exists', 'error')
+            return render_template('login.html')
         
         flash('Registration successful! Please login.', 'success')
         return redirect(url_for('auth.login'))
@@ -67,19 +186,18 @@ def logout():
     return redirect(url_for('auth.login'))
 
 def login_required(f):
-    from functools import wraps
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        if 'user_id' not in session:
+        if current_principal() is None:
             return redirect(url_for('auth.login'))
         return f(*args, **kwargs)
     return decorated_function
 
 def admin_required(f):
-    from functools import wraps
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        if 'user_id' not in session or session.get('role') != 'admin':
+        principal = current_principal()
+        if principal is None or principal.role != 'admin':
             flash('Admin access required', 'error')
             return redirect(url_for('auth.login'))
         return f(*args, **kwargs)
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Overhead of the auth decorators per request.
+
+Calls a trivial view wrapped in ``admin_required`` inside a request context
+and reports the time and SQL statements per call for: the old check of raw
+session keys, a principal cache hit, and a cache miss that loads the user.
+Runs against DATABASE_URL, or a throwaway SQLite file.
+
+    python benchmarks/bench_auth.py --calls 20000
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+from functools import wraps
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--calls', type=int, default=20000)
+    args = parser.parse_args()
+
+    if not os.environ.get('DATABASE_URL'):
+        path = os.path.join(tempfile.mkdtemp(), 'auth.db')
+        os.environ['DATABASE_URL'] = f'sqlite:///{path}'
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+    from flask import g, session
+    from sqlalchemy import event
+    from app import app, db, bootstrap
+    from models import User
+    import auth
+
+    def session_keys_only(f):
+        # The decorator as it was before the principal cache
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if 'user_id' not in session or session.get('role') != 'admin':
+                return 'denied'
+            return f(*args, **kwargs)
+        return decorated_function
+
+    def view():
+        return 'ok'
+
+    statements = [0]
+
+    def count_statement(*_):
+        statements[0] += 1
+
+    with app.app_context():
+        bootstrap()
+        admin = User.query.filter_by(username='admin').first()
+        event.listen(db.engine, 'before_cursor_execute', count_statement)
+
+        with app.test_request_context('/admin/dashboard'):
+            auth.start_session(admin)
+            modes = [
+                ('session keys only (old)', session_keys_only(view), None),
+                ('principal cache hit', auth.admin_required(view), None),
+                ('principal cache miss', auth.admin_required(view), lambda: auth.invalidate_principal(admin.id)),
+            ]
+
+            print(f"{'mode':<26} {'us/call':>10} {'queries/call':>13}")
+            for label, decorated, before in modes:
+                statements[0] = 0
+                elapsed = 0.0
+                for _ in range(args.calls):
+                    g.pop('principal', None)
+                    if before:
+                        before()
+                    started = time.perf_counter()
+                    assert decorated() == 'ok'
+                    elapsed += time.perf_counter() - started
+                print(f"{label:<26} {elapsed / args.calls * 1e6:>10.2f} {statements[0] / args.calls:>13.2f}")
+            db.session.rollback()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
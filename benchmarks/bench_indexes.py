@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Benchmark the hot-path queries with and without the indexes from migration 1.
+
+Seeds a throwaway database (or DATABASE_URL) with questions spread over
+topics and a set of assignments, then prints the query plan and the
+median latency of each hot query, first with the indexes dropped and then
+with them created. Finally prints the plan of the claim query exactly as
+assignment.py builds it, which should use ix_question_topic_pool.
+
+    python benchmarks/bench_indexes.py --questions 1000000 --assignments 100000
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import statistics
+import tempfile
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+HOT_QUERIES = {
+    "claim candidate": (
+        "SELECT id FROM question WHERE topic_id = :topic AND is_assigned = {false} "
+        "AND quality_status NOT IN ('reviewing', 'rejected') AND id >= :pivot ORDER BY id LIMIT 1"
+    ),
+    "pool bounds": (
+        "SELECT min(id), max(id) FROM question WHERE topic_id = :topic AND is_assigned = {false} "
+        "AND quality_status NOT IN ('reviewing', 'rejected')"
+    ),
+    "topic assigned count": (
+        "SELECT count(*) FROM question WHERE topic_id = :topic AND is_assigned = {true}"
+    ),
+    "next variation number": (
+        "SELECT max(variation_number) FROM question WHERE topic_id = :topic"
+    ),
+    "student assignments": (
+        "SELECT a.id, t.name, q.question_text FROM question_assignment a "
+        "JOIN topic t ON a.topic_id = t.id JOIN question q ON a.question_id = q.id WHERE a.user_id = :user"
+    ),
+    "topic completion count": (
+        "SELECT count(*) FROM question_assignment WHERE topic_id = :topic AND completed = {true}"
+    ),
+    "assignments for question": (
+        "SELECT id FROM question_assignment WHERE question_id = :question"
+    ),
+}
+
+
+def seed(db, models, args):
+    from sqlalchemy import insert
+    User, Topic, Question, QuestionAssignment = models
+    now = datetime.utcnow()
+
+    print(f"Seeding {args.topics} topics, {args.questions} questions, {args.assignments} assignments...")
+    started = time.perf_counter()
+    with db.engine.begin() as conn:
+        conn.execute(insert(Topic.__table__), [
+            {"name": f"Topic {t}", "description": "", "difficulty": "medium", "category": "bench",
+             "created_by": 1, "created_at": now}
+            for t in range(args.topics)
+        ])
+        topic_ids = [row[0] for row in conn.exec_driver_sql("SELECT id FROM topic")]
+
+        students = args.assignments // args.topics + 1
+        conn.execute(insert(User.__table__), [
+            {"username": f"bench{s}", "email": f"bench{s}@example.com", "password_hash": "x",
+             "role": "student", "created_at": now}
+            for s in range(students)
+        ])
+        user_ids = [row[0] for row in conn.exec_driver_sql("SELECT id FROM \"user\" WHERE role = 'student'")]
+
+        per_topic = args.questions // len(topic_ids)
+        batch = []
+        for topic_id in topic_ids:
+            for v in range(per_topic):
+                batch.append({"topic_id": topic_id, "question_text": f"Question {v} for topic {topic_id}",
+                              "expected_answer": "", "difficulty": "medium", "variation_number": v + 1,
+                              "is_assigned": False, "created_at": now})
+                if len(batch) >= 50000:
+                    conn.execute(insert(Question.__table__), batch)
+                    batch = []
+        if batch:
+            conn.execute(insert(Question.__table__), batch)
+
+        # Assign the first questions of each topic to distinct students
+        per_topic_assignments = args.assignments // len(topic_ids)
+        rows = []
+        for topic_id in topic_ids:
+            question_ids = [r[0] for r in conn.exec_driver_sql(
+                f"SELECT id FROM question WHERE topic_id = {topic_id} ORDER BY id LIMIT {per_topic_assignments}")]
+            for user_id, question_id in zip(user_ids, question_ids):
+                rows.append({"user_id": user_id, "question_id": question_id, "topic_id": topic_id,
+                             "assigned_at": now, "completed": random.random() < 0.5})
+            conn.exec_driver_sql(
+                f"UPDATE question SET is_assigned = {args.true} WHERE topic_id = {topic_id} AND id IN "
+                f"(SELECT id FROM question WHERE topic_id = {topic_id} ORDER BY id LIMIT {per_topic_assignments})")
+        for start in range(0, len(rows), 50000):
+            conn.execute(insert(QuestionAssignment.__table__), rows[start:start + 50000])
+    print(f"Seeded in {time.perf_counter() - started:.1f}s")
+    return topic_ids, user_ids
+
+
+def explain(conn, dialect, sql, params):
+    from sqlalchemy import text
+    prefix = "EXPLAIN QUERY PLAN " if dialect == "sqlite" else "EXPLAIN "
+    rows = conn.execute(text(prefix + sql), params).all()
+    return [" ".join(str(part) for part in row[-1:]) for row in rows]
+
+
+def measure(db, args, topic_ids, user_ids, label):
+    from sqlalchemy import text
+    dialect = db.engine.dialect.name
+    print(f"\n=== {label} ===")
+    with db.engine.connect() as conn:
+        conn.exec_driver_sql("ANALYZE")
+        max_question = conn.exec_driver_sql("SELECT max(id) FROM question").scalar()
+        for name, template in HOT_QUERIES.items():
+            sql = template.format(true=args.true, false=args.false)
+            timings = []
+            for _ in range(args.runs):
+                params = {"topic": random.choice(topic_ids), "user": random.choice(user_ids),
+                          "pivot": random.randint(1, max_question), "question": random.randint(1, max_question)}
+                started = time.perf_counter()
+                conn.execute(text(sql), params).all()
+                timings.append((time.perf_counter() - started) * 1000)
+            plan = explain(conn, dialect, sql, params)
+            print(f"{name:26s} median {statistics.median(timings):9.3f} ms   p95 "
+                  f"{sorted(timings)[int(len(timings) * 0.95) - 1]:9.3f} ms")
+            for line in plan:
+                print(f"    {line}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--questions', type=int, default=1_000_000)
+    parser.add_argument('--assignments', type=int, default=100_000)
+    parser.add_argument('--topics', type=int, default=200)
+    parser.add_argument('--runs', type=int, default=50)
+    args = parser.parse_args()
+
+    if not os.environ.get('DATABASE_URL'):
+        path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+        os.environ['DATABASE_URL'] = f'sqlite:///{path}'
+    os.environ.setdefault('OPENROUTER_API_KEY', 'bench')
+
+    from app import app, db, bootstrap
+    from models import User, Topic, Question, QuestionAssignment
+
+    with app.app_context():
+        bootstrap()
+        dialect = db.engine.dialect.name
+        args.true, args.false = ("1", "0") if dialect == "sqlite" else ("true", "false")
+        topic_ids, user_ids = seed(db, (User, Topic, Question, QuestionAssignment), args)
+
+        indexes = [index for model in (Question, QuestionAssignment) for index in model.__table__.indexes]
+        with db.engine.begin() as conn:
+            for index in indexes:
+                index.drop(conn, checkfirst=True)
+        measure(db, args, topic_ids, user_ids, "without hot-path indexes")
+
+        with db.engine.begin() as conn:
+            for index in indexes:
+                index.create(conn, checkfirst=True)
+        measure(db, args, topic_ids, user_ids, "with hot-path indexes")
+
+        from assignment import _candidate_query
+        compiled = _candidate_query(topic_ids[0], 1).compile(dialect=db.engine.dialect)
+        params = tuple(compiled.params[name] for name in compiled.positiontup) if compiled.positional else compiled.params
+        prefix = "EXPLAIN QUERY PLAN " if dialect == "sqlite" else "EXPLAIN "
+        print("\n=== claim query as issued by assignment.py ===")
+        with db.engine.connect() as conn:
+            for row in conn.exec_driver_sql(prefix + compiled.string, params).all():
+                print(f"    {row[-1]}")
+
+
+if __name__ == '__main__':
+    main()
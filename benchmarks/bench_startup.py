@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Cold-start benchmark: process import to first response.
+
+Each run starts a fresh Python process that imports ``main`` (as the Vercel
+and gunicorn entry points do) and serves ``GET /login`` through the test
+client, timing the import and the first response separately. The database
+is bootstrapped beforehand by ``--workers`` processes at once, as gunicorn
+workers starting together would, and every one of them must succeed; runs
+then measure a warm schema, the way a redeployed instance sees it. Runs
+against DATABASE_URL, or a throwaway SQLite file.
+
+    python benchmarks/bench_startup.py --runs 10
+"""
+import os
+import re
+import sys
+import json
+import argparse
+import tempfile
+import subprocess
+from statistics import median
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+CHILD = """
+import time, json
+started = time.perf_counter()
+from main import app
+imported = time.perf_counter()
+response = app.test_client().get('/login')
+responded = time.perf_counter()
+assert response.status_code == 200, response.status_code
+print(json.dumps({"import": imported - started, "first_response": responded - imported}))
+"""
+
+BOOTSTRAP = """
+from app import app, bootstrap
+with app.app_context():
+    bootstrap()
+"""
+
+
+def run_child(env):
+    output = subprocess.run([sys.executable, '-c', CHILD], cwd=ROOT, env=env, check=True,
+                            capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--workers', type=int, default=4, help='processes bootstrapping the database at once')
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    if not env.get('DATABASE_URL'):
+        env['DATABASE_URL'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'startup.db')}"
+
+    bootstraps = [subprocess.Popen([sys.executable, '-c', BOOTSTRAP], cwd=ROOT, env=env, text=True,
+                                   stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+                  for _ in range(args.workers)]
+    failed = 0
+    for process in bootstraps:
+        _, errors = process.communicate()
+        if process.returncode != 0:
+            failed += 1
+            print(next(line for line in reversed(errors.splitlines()) if re.match(r'[\w.]+(Error|Exception):', line)))
+    print(f"concurrent bootstrap: {args.workers - failed} of {args.workers} processes succeeded")
+    if failed:
+        return 1
+
+    print(f"{'mode':<24} {'import ms':>10} {'first resp ms':>14} {'total ms':>10}  (median of {args.runs})")
+    for label, auto in (('AUTO_BOOTSTRAP=1', '1'), ('AUTO_BOOTSTRAP=0', '0')):
+        samples = [run_child(dict(env, AUTO_BOOTSTRAP=auto)) for _ in range(args.runs)]
+        imported = median(s['import'] for s in samples) * 1000
+        first = median(s['first_response'] for s in samples) * 1000
+        total = median(s['import'] + s['first_response'] for s in samples) * 1000
+        print(f"{label:<24} {imported:>10.1f} {first:>14.1f} {total:>10.1f}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Tail latency of LLM calls with and without hedged model routing.
+
+Starts a local stub of the chat completions endpoint whose delay depends on
+the requested model, points the real OpenRouter client at it and sends
+``--calls`` requests through call_openrouter, first with hedging off and
+then on. The default stubs are a fast model with a heavy tail (most calls
+take --fast seconds, --tail-rate of them --tail seconds) and a steady
+slower model, both of the "high" tier, plus a "standard" model that fails
+--error-rate of its calls. Reports p50/p95/p99 latency and the router's
+decisions, and checks that hedges were sent only with hedging on and that
+they cut the p99.
+
+    python benchmarks/llm_routing.py --calls 300 --concurrency 8
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+
+def make_handler(profiles, seed):
+    rng = random.Random(seed)
+    lock = threading.Lock()
+
+    class StubHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            payload = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+            delay, tail_rate, tail, error_rate = profiles[payload['model']]
+            with lock:
+                slow, failed = rng.random() < tail_rate, rng.random() < error_rate
+            time.sleep(tail if slow else delay)
+            if failed:
+                self.send_response(500)
+                self.end_headers()
+                return
+            body = json.dumps({"model": payload['model'], "choices": [
+                {"message": {"role": "assistant", "content": f"answer from {payload['model']}"}, "finish_reason": "stop"}
+            ]}).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    return StubHandler
+
+
+def percentiles(latencies):
+    ordered = sorted(latencies)
+    return {p: ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))] * 1000 for p in (50, 95, 99)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--calls', type=int, default=300)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--fast', type=float, default=0.05, help='usual delay of the fast model')
+    parser.add_argument('--tail', type=float, default=1.0, help='delay of the fast model on its slow calls')
+    parser.add_argument('--tail-rate', type=float, default=0.03)
+    parser.add_argument('--steady', type=float, default=0.12, help='delay of the steady model')
+    parser.add_argument('--error-rate', type=float, default=0.5, help='failure rate of the standard model')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    os.environ['LLM_CACHE_ENABLED'] = '0'
+    os.environ.setdefault('LOG_LEVEL', 'ERROR')
+    import logging
+    logging.basicConfig(level=logging.ERROR)
+
+    import openai_service
+    from llm_router import ModelRouter, set_router
+
+    profiles = {
+        'stub/fast': (args.fast, args.tail_rate, args.tail, 0.0),
+        'stub/steady': (args.steady, 0.0, args.steady, 0.0),
+        'stub/flaky': (args.fast, 0.0, args.fast, args.error_rate),
+    }
+    server = ThreadingHTTPServer(('127.0.0.1', 0), make_handler(profiles, args.seed))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f'http://127.0.0.1:{server.server_port}/chat/completions'
+    openai_service.set_client(openai_service.OpenRouterClient('stub', url, max_retries=0))
+
+    models = [('stub/fast', 'high'), ('stub/steady', 'high'), ('stub/flaky', 'standard')]
+    results, hedged = {}, {}
+    for hedging in (False, True):
+        router = ModelRouter(models, hedging=hedging, min_samples=20, hedge_min_delay=0.01)
+        set_router(router)
+
+        def one(i):
+            started = time.monotonic()
+            messages = [{'role': 'user', 'content': f'question {i}'}]
+            openai_service.call_openrouter('high', messages)
+            return time.monotonic() - started
+
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            latencies = list(pool.map(one, range(args.calls)))
+        stats = router.stats()
+        results[hedging] = percentiles(latencies)
+        hedged[hedging] = stats['totals']['hedged']
+        print(f"hedging {'on ' if hedging else 'off'}: p50 {results[hedging][50]:7.1f} ms  "
+              f"p95 {results[hedging][95]:7.1f} ms  p99 {results[hedging][99]:7.1f} ms  totals {stats['totals']}")
+        for model in stats['models']:
+            p95 = f"{model['p95'] * 1000:.1f} ms" if model['p95'] is not None else '-'
+            print(f"    {model['model']:<12} {model['tier']:<9} samples {model['samples']:4d}  "
+                  f"errors {model['errors']:3d}  p95 {p95}  hedge after {model['hedge_delay'] * 1000:.1f} ms")
+
+    # A standard-tier call may use any model; the flaky one loses its place once its errors show
+    router = ModelRouter(models, hedging=True, min_samples=5, hedge_min_delay=0.01)
+    set_router(router)
+    for i in range(60):
+        openai_service.call_openrouter('standard', [{'role': 'user', 'content': f'review {i}'}])
+    flaky = next(model for model in router.stats()['models'] if model['model'] == 'stub/flaky')
+    totals = router.stats()['totals']
+    print(f"standard tier: {totals}; stub/flaky error rate {flaky['error_rate']:.2f}, first choice now {router.pick('standard')}")
+
+    server.shutdown()
+    ok = (hedged[False] == 0 and hedged[True] > 0 and results[True][99] < results[False][99]
+          and totals['failures'] == 0 and router.pick('standard') != 'stub/flaky')
+    print('PASS' if ok else 'FAIL')
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
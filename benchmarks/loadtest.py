@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+End-to-end load test of the student flow.
+
+Seeds a roster of students and a few topics, has the admin generate each
+topic's question bank through the web UI (served by the fake LLM backend
+unless LLM_BACKEND says otherwise), then runs every student concurrently
+through login -> dashboard -> get_question -> question -> complete over
+HTTP and reports p50/p95/p99 latency per route.
+
+Without --url the app is served in-process on a random port against
+DATABASE_URL, or a throwaway SQLite file. With --url the driver targets a
+running server and seeds the database that DATABASE_URL points at, which
+must be the one that server uses.
+
+    python benchmarks/loadtest.py --students 300 --topics 3 --llm-latency 0.2 --llm-failure-rate 0.05
+"""
+import os
+import re
+import sys
+import time
+import random
+import logging
+import argparse
+import tempfile
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+STUDENT_PASSWORD = 'loadtest-password'
+# Login tries per student before giving up while the server is busy
+LOGIN_ATTEMPTS = 10
+
+
+def percentile(ordered, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))]
+
+
+class Recorder:
+    """Collects per-route latencies and failures from many threads."""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.outcomes = defaultdict(int)
+        self.lock = threading.Lock()
+
+    def request(self, session, route, method, url, expect=(200, 302), **kwargs):
+        started = time.perf_counter()
+        try:
+            response = session.request(method, url, allow_redirects=False, timeout=60, **kwargs)
+        except requests.RequestException:
+            response = None
+        elapsed = time.perf_counter() - started
+        with self.lock:
+            self.latencies[route].append(elapsed)
+            if response is None or response.status_code not in expect:
+                self.errors[route] += 1
+        return response
+
+    def outcome(self, name):
+        with self.lock:
+            self.outcomes[name] += 1
+
+    def report(self, elapsed):
+        total = sum(len(values) for values in self.latencies.values())
+        print(f"{total} requests in {elapsed:.2f}s ({total / elapsed:.0f} req/s)")
+        print(f"{'route':<40} {'count':>6} {'errors':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+        for route, values in self.latencies.items():
+            ordered = sorted(values)
+            print(f"{route:<40} {len(ordered):>6} {self.errors[route]:>6} "
+                  + " ".join(f"{percentile(ordered, q) * 1000:>8.1f}" for q in (0.50, 0.95, 0.99))
+                  + f" {ordered[-1] * 1000:>8.1f}")
+        print(f"Outcomes: {dict(self.outcomes)}")
+
+
+def seed(args):
+    """Create the students and empty topics; return ``(usernames, topic_ids)``."""
+    from app import db
+    from models import User, Topic
+    from werkzeug.security import generate_password_hash
+
+    # One hash for everyone: hashing hundreds of passwords would dominate the setup time
+    password_hash = generate_password_hash(STUDENT_PASSWORD)
+    run_id = int(time.time() * 1000)
+    admin = User.query.filter_by(username='admin').first()
+
+    usernames = [f'load{run_id}_{i}' for i in range(args.students)]
+    db.session.add_all(
+        User(username=username, email=f'{username}@example.com', password_hash=password_hash)
+        for username in usernames
+    )
+    topics = [
+        Topic(name=f'Load topic {run_id} #{i + 1}', description='', difficulty='medium',
+              category='load test', created_by=admin.id)
+        for i in range(args.topics)
+    ]
+    db.session.add_all(topics)
+    db.session.commit()
+    return usernames, [topic.id for topic in topics]
+
+
+def generate_banks(base_url, topic_ids, count, recorder):
+    """Generate every topic's question bank through the admin UI and wait for the jobs."""
+    admin = requests.Session()
+    recorder.request(admin, 'POST /login (admin)', 'POST', f'{base_url}/login',
+                     data={'username': 'admin', 'password': 'admin123'})
+
+    job_ids = []
+    for topic_id in topic_ids:
+        response = recorder.request(
+            admin, 'POST /admin/generate_questions/<id>', 'POST', f'{base_url}/admin/generate_questions/{topic_id}',
+            data={'base_question': 'Implement a bounded queue and analyse its operations.', 'num_variations': count}
+        )
+        match = re.search(r'job_id=(\d+)', response.headers.get('Location', '')) if response is not None else None
+        if match is None:
+            raise SystemExit(f'Could not start generation for topic {topic_id}')
+        job_ids.append(int(match.group(1)))
+
+    pending = set(job_ids)
+    while pending:
+        time.sleep(0.5)
+        for job_id in list(pending):
+            response = recorder.request(admin, 'GET /admin/jobs/<id>', 'GET', f'{base_url}/admin/jobs/{job_id}',
+                                        expect=(200,))
+            job = response.json() if response is not None and response.status_code == 200 else {}
+            if job.get('status') in ('succeeded', 'failed'):
+                print(f"Generation job {job_id}: {job['status']}: {job['message']}")
+                pending.discard(job_id)
+
+
+def student_flow(base_url, username, topic_ids, recorder):
+    session = requests.Session()
+    # A busy server turns logins away with Retry-After; students try again like people would
+    for attempt in range(LOGIN_ATTEMPTS):
+        response = recorder.request(session, 'POST /login', 'POST', f'{base_url}/login', expect=(302, 429, 503),
+                                    data={'username': username, 'password': STUDENT_PASSWORD})
+        if response is None or response.status_code not in (429, 503):
+            break
+        recorder.outcome('login turned away')
+        # Jittered exponential backoff on top of Retry-After, so retries don't arrive in step
+        time.sleep(float(response.headers.get('Retry-After', 2)) + random.uniform(0, min(30, 2 ** attempt)))
+    else:
+        recorder.outcome('gave up logging in')
+        return
+    recorder.request(session, 'GET /student/dashboard', 'GET', f'{base_url}/student/dashboard', expect=(200,))
+
+    for topic_id in topic_ids:
+        response = recorder.request(session, 'GET /student/get_question/<id>', 'GET',
+                                    f'{base_url}/student/get_question/{topic_id}', expect=(302,))
+        location = response.headers.get('Location', '') if response is not None else ''
+        match = re.search(r'/student/question/(\d+)', location)
+        if match is None:
+            recorder.outcome('no question')
+            continue
+
+        assignment_id = match.group(1)
+        recorder.request(session, 'GET /student/question/<id>', 'GET',
+                         f'{base_url}/student/question/{assignment_id}', expect=(200,))
+        recorder.request(session, 'POST /student/complete_question/<id>', 'POST',
+                         f'{base_url}/student/complete_question/{assignment_id}', expect=(302,))
+        recorder.outcome('completed')
+
+    recorder.request(session, 'GET /student/dashboard', 'GET', f'{base_url}/student/dashboard', expect=(200,))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', help='base URL of a running server; default serves the app in-process')
+    parser.add_argument('--students', type=int, default=200)
+    parser.add_argument('--topics', type=int, default=3)
+    parser.add_argument('--questions', type=int, help='variations generated per topic (default: students + 10%%)')
+    parser.add_argument('--concurrency', type=int, help='simultaneous students (default: all of them)')
+    parser.add_argument('--llm-latency', type=float, help='fake LLM response time in seconds')
+    parser.add_argument('--llm-failure-rate', type=float, help='fraction of fake LLM calls that fail')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    if not os.environ.get('DATABASE_URL'):
+        path = os.path.join(tempfile.mkdtemp(), 'loadtest.db')
+        os.environ['DATABASE_URL'] = f'sqlite:///{path}'
+    os.environ.setdefault('LLM_BACKEND', 'fake')
+    os.environ.setdefault('FAKE_LLM_SEED', str(args.seed))
+    if args.llm_latency is not None:
+        os.environ['FAKE_LLM_LATENCY'] = str(args.llm_latency)
+    if args.llm_failure_rate is not None:
+        os.environ['FAKE_LLM_FAILURE_RATE'] = str(args.llm_failure_rate)
+    random.seed(args.seed)
+
+    from app import app, bootstrap
+
+    logging.getLogger().setLevel(logging.WARNING)
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+
+    with app.app_context():
+        bootstrap()
+        usernames, topic_ids = seed(args)
+
+    server = None
+    base_url = args.url.rstrip('/') if args.url else None
+    if base_url is None:
+        from werkzeug.serving import make_server
+
+        server = make_server('127.0.0.1', 0, app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base_url = f'http://127.0.0.1:{server.server_port}'
+
+    try:
+        setup = Recorder()
+        started = time.perf_counter()
+        generate_banks(base_url, topic_ids, args.questions or args.students + args.students // 10 + 1, setup)
+        print(f"Question banks ready in {time.perf_counter() - started:.2f}s")
+
+        recorder = Recorder()
+        random.shuffle(usernames)
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency or len(usernames)) as pool:
+            list(pool.map(lambda username: student_flow(base_url, username, topic_ids, recorder), usernames))
+        elapsed = time.perf_counter() - started
+    finally:
+        if server is not None:
+            server.shutdown()
+
+    print(f"\n{len(usernames)} students, {len(topic_ids)} topics")
+    recorder.report(elapsed)
+    if server is not None:
+        from passwords import hash_capacity
+        capacity = hash_capacity()
+        print(f"Password hashing: {capacity['workers']} workers (HASH_WORKERS), {capacity['hash_seconds'] * 1000:.0f} ms "
+              f"per hash -> ~{capacity['logins_per_second']:.0f} logins/s; a full queue of {capacity['queue_limit']} "
+              f"waits ~{capacity['full_queue_wait']:.1f}s (HASH_TIMEOUT {capacity['timeout']:.0f}s). "
+              f"More workers speed up login bursts but take CPU from other requests.")
+    failed = sum(recorder.errors.values())
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
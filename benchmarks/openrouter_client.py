@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Check the OpenRouter client's retries and circuit breaker against a stub.
+
+Starts a local stub of the chat completions endpoint that answers each
+path with a scripted sequence of statuses and headers, points the real
+OpenRouterClient at it and checks that: a 429 with Retry-After in seconds
+or as an HTTP date is retried after the advertised wait, a 5xx is retried
+with backoff, the client gives up once max_retries is spent, a 400 does
+not count against the breaker, and the breaker goes open -> half-open ->
+closed.
+
+    python benchmarks/openrouter_client.py
+"""
+import os
+import sys
+import json
+import time
+import threading
+from email.utils import formatdate
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+
+class Stub:
+    """Scripted responses per path; the last one repeats. Request times are recorded."""
+
+    def __init__(self):
+        self.scripts = {}
+        self.arrivals = {}
+        self.lock = threading.Lock()
+
+    def script(self, path, *responses):
+        with self.lock:
+            self.scripts[path] = list(responses)
+            self.arrivals[path] = []
+
+    def next_response(self, path):
+        with self.lock:
+            self.arrivals[path].append(time.monotonic())
+            script = self.scripts[path]
+            return script.pop(0) if len(script) > 1 else script[0]
+
+
+def make_handler(stub):
+    class StubHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            self.rfile.read(int(self.headers['Content-Length']))
+            status, headers = stub.next_response(self.path)
+            body = b''
+            if status == 200:
+                body = json.dumps({"choices": [{"message": {"role": "assistant", "content": "ok"},
+                                                "finish_reason": "stop"}]}).encode()
+            self.send_response(status)
+            for name, value in headers.items():
+                self.send_header(name, value() if callable(value) else value)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    return StubHandler
+
+
+def main():
+    os.environ['LLM_CACHE_ENABLED'] = '0'
+    import logging
+    logging.basicConfig(level=logging.CRITICAL)
+
+    from openai_service import OpenRouterClient, OpenRouterError, CircuitOpenError, CircuitBreaker
+
+    stub = Stub()
+    server = ThreadingHTTPServer(('127.0.0.1', 0), make_handler(stub))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f'http://127.0.0.1:{server.server_port}'
+    payload = {"model": "stub/model", "messages": [{"role": "user", "content": "hi"}]}
+    ok_response = (200, {})
+    checks = []
+
+    def check(label, ok):
+        checks.append(ok)
+        print(f"{'ok  ' if ok else 'FAIL'} {label}")
+
+    def client(path, **options):
+        options.setdefault('backoff_base', 0.05)
+        options.setdefault('backoff_max', 5)
+        return OpenRouterClient('stub', base + path, **options)
+
+    def gaps(path):
+        times = stub.arrivals[path]
+        return [later - earlier for earlier, later in zip(times, times[1:])]
+
+    stub.script('/retry-after-seconds', (429, {'Retry-After': '1'}), ok_response)
+    client('/retry-after-seconds').post(payload)
+    wait = gaps('/retry-after-seconds')
+    check(f"429 with Retry-After: 1 is retried after {wait[0]:.2f}s", len(wait) == 1 and 0.95 <= wait[0] < 1.5)
+
+    # HTTP dates have one-second resolution, so ask for two seconds and expect at least one
+    stub.script('/retry-after-date', (429, {'Retry-After': lambda: formatdate(time.time() + 2, usegmt=True)}), ok_response)
+    client('/retry-after-date').post(payload)
+    wait = gaps('/retry-after-date')
+    check(f"429 with an HTTP-date Retry-After is retried after {wait[0]:.2f}s", len(wait) == 1 and 0.95 <= wait[0] < 2.5)
+
+    stub.script('/server-error', (503, {}), (502, {}), (500, {}), ok_response)
+    retrying = client('/server-error', backoff_base=0.2, max_retries=4)
+    retrying.post(payload)
+    wait = gaps('/server-error')
+    # Full jitter: retry n waits between 0 and backoff_base * 2 ** (n - 1)
+    bounded = all(gap < 0.2 * 2 ** n + 0.1 for n, gap in enumerate(wait))
+    check(f"5xx is retried with backoff ({', '.join(f'{gap:.2f}s' for gap in wait)})",
+          len(wait) == 3 and bounded and retrying.stats()["retries"] == 3)
+
+    stub.script('/always-failing', (500, {}))
+    try:
+        client('/always-failing', max_retries=2).post(payload)
+        gave_up = False
+    except OpenRouterError as e:
+        gave_up = e.status_code == 500
+    check("gives up with the last status once max_retries is spent",
+          gave_up and len(stub.arrivals['/always-failing']) == 3)
+
+    stub.script('/bad-request', (400, {}))
+    strict = client('/bad-request', max_retries=3, breaker_factory=lambda: CircuitBreaker(failure_threshold=1))
+    for _ in range(3):
+        try:
+            strict.post(payload)
+        except OpenRouterError:
+            pass
+    check("a 400 is not retried and does not open the breaker",
+          len(stub.arrivals['/bad-request']) == 3 and strict.breaker("stub/model").state == 'closed')
+
+    stub.script('/breaker', (500, {}), (500, {}), ok_response)
+    breaking = client('/breaker', max_retries=0,
+                      breaker_factory=lambda: CircuitBreaker(failure_threshold=2, reset_timeout=0.5))
+    breaker = breaking.breaker("stub/model")
+    for _ in range(2):
+        try:
+            breaking.post(payload)
+        except OpenRouterError:
+            pass
+    opened = breaker.state == 'open'
+    try:
+        breaking.post(payload)
+        rejected = False
+    except CircuitOpenError:
+        rejected = len(stub.arrivals['/breaker']) == 2
+    time.sleep(0.6)
+    half_open = breaker.state == 'half-open'
+    breaking.post(payload)
+    check("breaker opens after 2 failures, rejects without calling, then goes half-open and closes",
+          opened and rejected and half_open and breaker.state == 'closed')
+
+    server.shutdown()
+    print('PASS' if all(checks) else 'FAIL')
+    return 0 if all(checks) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Check read-replica routing against two local SQLite files.
+
+The "replica" is a copy of the primary taken after seeding, so rows written
+to the primary afterwards exist only there. The script then checks that:
+read_only views run their queries on the replica, other views and every
+write go to the primary, and a client that just wrote is pinned to the
+primary. Pass --primary/--replica to use a local Postgres pair instead
+(the replica must already be replicating from the primary).
+
+    python benchmarks/replica_routing.py
+"""
+import os
+import sys
+import shutil
+import argparse
+import tempfile
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--primary', help='primary database URL')
+    parser.add_argument('--replica', help='replica database URL')
+    args = parser.parse_args()
+
+    snapshot = None
+    if args.primary and args.replica:
+        primary_url, replica_url = args.primary, args.replica
+    else:
+        directory = tempfile.mkdtemp()
+        primary_path, snapshot = os.path.join(directory, 'primary.db'), os.path.join(directory, 'replica.db')
+        primary_url, replica_url = f'sqlite:///{primary_path}', f'sqlite:///{snapshot}'
+    os.environ['DATABASE_URL'] = primary_url
+    os.environ['DATABASE_REPLICA_URL'] = replica_url
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    # Counting queries per page: background refills would add their own
+    os.environ['REFILL_ENABLED'] = '0'
+
+    from sqlalchemy import event
+    from app import app, db, bootstrap
+    from models import User, Topic, Question
+    from progress import invalidate_progress
+    from stats import invalidate_topic_catalogue
+    from werkzeug.security import generate_password_hash
+
+    with app.app_context():
+        bootstrap()
+        admin = User.query.filter_by(username='admin').first()
+        db.session.add(User(username='replica_student', email='replica_student@example.com',
+                            password_hash=generate_password_hash('pw', 'pbkdf2:sha256:1000')))
+        topic = Topic(name='Seeded before the snapshot', description='', difficulty='easy', category='c',
+                      created_by=admin.id)
+        db.session.add(topic)
+        db.session.flush()
+        db.session.add(Question(topic_id=topic.id, question_text='Seeded question', difficulty='easy', variation_number=1))
+        db.session.commit()
+        topic_id = topic.id
+        db.engines[None].dispose()
+        if snapshot:
+            shutil.copyfile(primary_path, snapshot)
+
+        # Only on the primary from here on
+        db.session.add(Topic(name='Written after the snapshot', description='', difficulty='easy', category='c',
+                             created_by=admin.id))
+        db.session.commit()
+
+        statements = Counter()
+        for key, engine in db.engines.items():
+            event.listen(engine, 'before_cursor_execute',
+                         lambda *_, key=key or 'primary': statements.__setitem__(key, statements[key] + 1))
+
+    client = app.test_client()
+    checks = []
+
+    def check(label, ok):
+        checks.append(ok)
+        print(f"{'ok  ' if ok else 'FAIL'} {label}")
+
+    client.post('/login', data={'username': 'replica_student', 'password': 'pw'})
+    # Logging in upgraded the seeded password hash, which pins the client; start unpinned
+    with client.session_transaction() as session:
+        session['primary_until'] = 0
+    statements.clear()
+    page = client.get('/student/dashboard').get_data(as_text=True)
+    check('student dashboard reads the replica', statements['replica'] > 0)
+    if snapshot:
+        check('replica lacks rows written after the snapshot', 'Written after the snapshot' not in page)
+
+    statements.clear()
+    client.get(f'/student/get_question/{topic_id}')
+    check('get_question (a write path) uses only the primary', statements['replica'] == 0 and statements['primary'] > 0)
+
+    # The dashboard is otherwise served from the progress and topic caches without queries
+    invalidate_progress()
+    statements.clear()
+    client.get('/student/dashboard')
+    check('client that just wrote is pinned to the primary', statements['replica'] == 0 and statements['primary'] > 0)
+
+    with client.session_transaction() as session:
+        session['primary_until'] = 0
+    invalidate_progress()
+    invalidate_topic_catalogue()
+    statements.clear()
+    client.get('/student/dashboard')
+    check('after the sticky window reads return to the replica', statements['replica'] > 0)
+
+    print('PASS' if all(checks) else 'FAIL')
+    return 0 if all(checks) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
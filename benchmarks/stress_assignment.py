@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Concurrency stress test for the question assignment engine.
+
+Seeds one topic with a pool of questions and a roster of students, then has
+many threads call assign_question at once (each student several times) and
+checks that no question was handed out twice and no student got two
+assignments. Runs against DATABASE_URL, or a throwaway SQLite file.
+
+    python benchmarks/stress_assignment.py --students 300 --questions 250 --threads 32
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--students', type=int, default=300)
+    parser.add_argument('--questions', type=int, default=250)
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--repeats', type=int, default=3, help='requests per student, to exercise the unique constraint')
+    args = parser.parse_args()
+
+    if not os.environ.get('DATABASE_URL'):
+        path = os.path.join(tempfile.mkdtemp(), 'stress.db')
+        os.environ['DATABASE_URL'] = f'sqlite:///{path}'
+    os.environ.setdefault('OPENROUTER_API_KEY', 'stress-test')
+
+    from app import app, db, bootstrap
+    from models import User, Topic, Question, QuestionAssignment
+    from assignment import assign_question
+
+    with app.app_context():
+        bootstrap()
+        topic = Topic(name='Stress topic', description='', difficulty='easy', category='stress', created_by=1)
+        db.session.add(topic)
+        db.session.flush()
+        db.session.add_all(
+            Question(topic_id=topic.id, question_text=f'Question {i}', difficulty='easy', variation_number=i + 1)
+            for i in range(args.questions)
+        )
+        run_id = int(time.time() * 1000)
+        students = [
+            User(username=f'stress{run_id}_{i}', email=f'stress{run_id}_{i}@example.com', password_hash='x')
+            for i in range(args.students)
+        ]
+        db.session.add_all(students)
+        db.session.commit()
+        topic_id = topic.id
+        user_ids = [student.id for student in students]
+
+    results = Counter()
+    lock = threading.Lock()
+
+    def worker(user_id):
+        with app.app_context():
+            assignment, created = assign_question(user_id, topic_id)
+            with lock:
+                results['created' if created else ('existing' if assignment else 'empty')] += 1
+            db.session.remove()
+
+    requests = [user_id for user_id in user_ids for _ in range(args.repeats)]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        list(pool.map(worker, requests))
+    elapsed = time.perf_counter() - started
+
+    with app.app_context():
+        rows = db.session.query(QuestionAssignment.user_id, QuestionAssignment.question_id).filter_by(topic_id=topic_id).all()
+        assigned_flags = Question.query.filter_by(topic_id=topic_id, is_assigned=True).count()
+
+    by_question = Counter(question_id for _, question_id in rows)
+    by_user = Counter(user_id for user_id, _ in rows)
+    double_questions = [q for q, n in by_question.items() if n > 1]
+    double_users = [u for u, n in by_user.items() if n > 1]
+    expected = min(args.students, args.questions)
+
+    print(f"{len(requests)} requests in {elapsed:.2f}s ({len(requests) / elapsed:.0f} req/s) with {args.threads} threads")
+    print(f"Outcomes: {dict(results)}")
+    print(f"Assignments: {len(rows)} (expected {expected}); questions flagged assigned: {assigned_flags}")
+    print(f"Questions assigned twice: {len(double_questions)}; students assigned twice: {len(double_users)}")
+
+    ok = not double_questions and not double_users and len(rows) == expected == assigned_flags
+    print("PASS" if ok else "FAIL")
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
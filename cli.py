@@ -0,0 +1,124 @@
+import click
+
+from app import db
+from models import Topic
+
+
+def register_commands(app):
+    """Attach the maintenance commands to ``flask``."""
+
+    @app.cli.command('bootstrap')
+    def bootstrap_command():
+        """Create the schema, apply migrations and create the default admin (run once per deploy)."""
+        from app import bootstrap
+
+        applied = bootstrap()
+        click.echo(f"Applied migrations: {', '.join(map(str, applied))}" if applied else "Database schema is up to date.")
+        click.echo("Bootstrap complete.")
+
+    @app.cli.command('purge-topic')
+    @click.argument('topic_id', type=int)
+    @click.option('--chunk-size', type=int, help='Rows deleted per transaction.')
+    def purge_topic_command(topic_id, chunk_size):
+        """Delete TOPIC_ID with its questions and assignments in short transactions."""
+        from purge import soft_delete_topic, count_topic_rows, purge_topic
+
+        if db.session.get(Topic, topic_id) is None:
+            raise click.ClickException(f"Topic {topic_id} does not exist")
+
+        soft_delete_topic(topic_id)
+        total = count_topic_rows(topic_id)
+
+        def on_progress(deleted):
+            click.echo(f"\r{deleted} of {total} rows deleted", nl=False, err=True)
+
+        summary = purge_topic(topic_id, chunk_size=chunk_size, on_progress=on_progress)
+        click.echo(err=True)
+        click.echo(f"Deleted topic {topic_id}: {summary['assignments']} assignments, {summary['questions']} questions.")
+
+    @app.cli.command('set-role')
+    @click.argument('username')
+    @click.argument('role', type=click.Choice(['admin', 'student']))
+    def set_role_command(username, role):
+        """Give USERNAME a new ROLE and sign them out of existing sessions."""
+        from models import User
+        from auth import set_user_role
+
+        user = User.query.filter_by(username=username).first()
+        if user is None:
+            raise click.ClickException(f"No user named {username}")
+        set_user_role(user.id, role)
+        click.echo(f"{username} is now {role}; their existing sessions have been ended.")
+
+    @app.cli.command('assign-roster')
+    @click.argument('topic_id', type=int)
+    @click.option('--roster', type=click.File('r'), help='File with one username or email per line (CSV first column).')
+    def assign_roster_command(topic_id, roster):
+        """Pre-assign questions for TOPIC_ID to every student, or to a roster file."""
+        from assignment import assign_roster, read_roster, resolve_roster
+
+        topic = db.session.get(Topic, topic_id)
+        if topic is None or topic.deleted_at is not None:
+            raise click.ClickException(f"Topic {topic_id} does not exist")
+
+        user_ids = None
+        if roster is not None:
+            user_ids, unknown = resolve_roster(read_roster(roster))
+            if unknown:
+                click.echo(f"Skipping {len(unknown)} unknown students: {', '.join(unknown[:10])}", err=True)
+
+        summary = assign_roster(topic_id, user_ids)
+        from refill import trigger_refill
+        trigger_refill(topic_id)
+        click.echo(
+            f"Assigned {summary['assigned']} questions; {summary['already_assigned']} students already had one; "
+            f"{summary['without_question']} students left without a question."
+        )
+
+    @app.cli.command('export-assignments')
+    @click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']), default='csv', show_default=True)
+    @click.option('--topic-id', type=int, help='Only export assignments for this topic.')
+    @click.option('--output', type=click.File('w'), default='-', help='Output file (default: stdout).')
+    def export_assignments_command(fmt, topic_id, output):
+        """Stream assignments joined with student, topic and question."""
+        from export import assignments_statement, export_chunks
+
+        for chunk in export_chunks(assignments_statement(topic_id), fmt):
+            output.write(chunk)
+
+    @app.cli.command('export-questions')
+    @click.argument('topic_id', type=int)
+    @click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']), default='csv', show_default=True)
+    @click.option('--output', type=click.File('w'), default='-', help='Output file (default: stdout).')
+    def export_questions_command(topic_id, fmt, output):
+        """Stream the question bank of TOPIC_ID."""
+        from export import questions_statement, export_chunks
+
+        for chunk in export_chunks(questions_statement(topic_id), fmt):
+            output.write(chunk)
+
+    @app.cli.command('import-questions')
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--topic-id', type=int, help='Topic for rows without a topic_id column.')
+    @click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl', 'json']), help='Defaults to the file extension.')
+    @click.option('--batch-size', type=int, help='Rows per bulk INSERT.')
+    def import_questions_command(path, topic_id, fmt, batch_size):
+        """Bulk import a CSV, JSONL or JSON question bank from PATH."""
+        import time
+        from importer import import_questions, detect_format
+
+        started = time.perf_counter()
+
+        def on_progress(imported, skipped):
+            click.echo(f"\r{imported} imported, {skipped} skipped", nl=False, err=True)
+
+        with open(path, newline='', encoding='utf-8-sig') as stream:
+            summary = import_questions(stream, fmt or detect_format(path), default_topic_id=topic_id,
+                                       batch_size=batch_size, on_progress=on_progress)
+
+        elapsed = time.perf_counter() - started
+        click.echo(err=True)
+        for error in summary['errors']:
+            click.echo(f"  {error}", err=True)
+        click.echo(f"Imported {summary['imported']} questions, skipped {summary['skipped']} rows "
+                   f"in {elapsed:.1f}s ({summary['imported'] / max(elapsed, 1e-9):.0f} rows/s).")
@@ -0,0 +1,106 @@
+"""
+Engine pool settings per deployment profile and read-replica routing.
+
+DB_PROFILE picks the pool settings in ENGINE_PROFILES; the DB_POOL_*
+variables override single values. When DATABASE_REPLICA_URL is set, views
+decorated with ``read_only`` run their queries on the replica, while
+flushes and INSERT/UPDATE/DELETE statements always go to the primary. A
+client that wrote something is pinned to the primary for
+REPLICA_STICKY_SECONDS so it reads its own writes despite replication lag.
+"""
+import os
+import time
+from functools import wraps
+
+from flask import g, has_request_context, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy.pool import NullPool
+from sqlalchemy.sql.dml import UpdateBase
+
+DB_PROFILE = os.environ.get("DB_PROFILE", "development")
+DATABASE_REPLICA_URL = os.environ.get("DATABASE_REPLICA_URL")
+REPLICA_STICKY_SECONDS = float(os.environ.get("REPLICA_STICKY_SECONDS", "5"))
+
+ENGINE_PROFILES = {
+    # Local runs: small pool, drop dead connections after a laptop sleep
+    "development": {"pool_size": 5, "max_overflow": 5, "pool_timeout": 30,
+                    "pool_recycle": 1800, "pool_pre_ping": True},
+    # Long-running gunicorn workers: room for the job pool and request threads
+    "server": {"pool_size": 10, "max_overflow": 20, "pool_timeout": 10,
+               "pool_recycle": 1800, "pool_pre_ping": True},
+    # Serverless (Vercel): instances freeze between requests, so keep no idle connections
+    "serverless": {"poolclass": NullPool},
+}
+
+_ENV_OVERRIDES = {
+    "pool_size": ("DB_POOL_SIZE", int),
+    "max_overflow": ("DB_MAX_OVERFLOW", int),
+    "pool_timeout": ("DB_POOL_TIMEOUT", float),
+    "pool_recycle": ("DB_POOL_RECYCLE", int),
+    "pool_pre_ping": ("DB_POOL_PRE_PING", lambda value: value != "0"),
+}
+
+
+def engine_options(url, profile=None):
+    """Return ``create_engine`` keyword arguments for a database URL."""
+    profile = profile or DB_PROFILE
+    if profile not in ENGINE_PROFILES:
+        raise ValueError(f"Unknown DB_PROFILE {profile!r}; choose one of {', '.join(ENGINE_PROFILES)}")
+    options = dict(ENGINE_PROFILES[profile])
+    for option, (variable, convert) in _ENV_OVERRIDES.items():
+        if os.environ.get(variable):
+            options[option] = convert(os.environ[variable])
+
+    if options.get("poolclass") is NullPool:
+        return {"poolclass": NullPool}
+    if (url or "").startswith("sqlite"):
+        # SQLite files need no recycling and in-memory databases use a single-connection pool
+        return {"pool_pre_ping": options.get("pool_pre_ping", False)}
+    return options
+
+
+def read_only(f):
+    """Run a view's queries on the read replica, when one is configured."""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        g.db_read_only = True
+        return f(*args, **kwargs)
+    return decorated_function
+
+
+def _use_replica():
+    if not has_request_context() or not g.get("db_read_only"):
+        return False
+    return session.get("primary_until", 0) < time.time()
+
+
+class RoutingSession(Session):
+    """Session that sends reads of ``read_only`` views to the replica bind."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and "replica" in self._db.engines:
+            writing = self._flushing or isinstance(clause, UpdateBase)
+            if writing:
+                if has_request_context():
+                    g.db_wrote = True
+            elif _use_replica():
+                return self._db.engines["replica"]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def init_app(app):
+    """Configure pools and the replica bind, and pin writers to the primary."""
+    url = app.config.get("SQLALCHEMY_DATABASE_URI")
+    app.config.setdefault("SQLALCHEMY_ENGINE_OPTIONS", engine_options(url))
+    replica_url = app.config.setdefault("DATABASE_REPLICA_URL", DATABASE_REPLICA_URL)
+    if not replica_url:
+        return
+
+    binds = app.config.setdefault("SQLALCHEMY_BINDS", {})
+    binds["replica"] = {"url": replica_url, **engine_options(replica_url)}
+
+    @app.after_request
+    def pin_writers_to_primary(response):
+        if g.get("db_wrote"):
+            session["primary_until"] = time.time() + REPLICA_STICKY_SECONDS
+        return response
@@ -0,0 +1,105 @@
+import io
+import csv
+import json
+from datetime import datetime
+
+from sqlalchemy import select
+
+from app import db
+from models import Topic, Question, User, QuestionAssignment
+
+# Rows fetched per round trip from the server-side cursor
+EXPORT_BATCH_SIZE = 1000
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson',
+}
+
+
+def assignments_statement(topic_id=None):
+    statement = select(
+        QuestionAssignment.id.label('assignment_id'),
+        User.id.label('user_id'),
+        User.username,
+        User.email,
+        Topic.id.label('topic_id'),
+        Topic.name.label('topic_name'),
+        Question.id.label('question_id'),
+        Question.variation_number,
+        Question.question_text,
+        QuestionAssignment.assigned_at,
+        QuestionAssignment.completed
+    ).join(
+        User, QuestionAssignment.user_id == User.id
+    ).join(
+        Topic, QuestionAssignment.topic_id == Topic.id
+    ).join(
+        Question, QuestionAssignment.question_id == Question.id
+    ).where(Topic.deleted_at.is_(None)).order_by(QuestionAssignment.id)
+    if topic_id:
+        statement = statement.where(QuestionAssignment.topic_id == topic_id)
+    return statement
+
+
+def questions_statement(topic_id):
+    return select(
+        Question.id.label('question_id'),
+        Question.topic_id,
+        Question.variation_number,
+        Question.question_text,
+        Question.expected_answer,
+        Question.difficulty,
+        Question.is_assigned,
+        Question.created_at
+    ).where(Question.topic_id == topic_id).order_by(Question.id)
+
+
+def stream_rows(statement, batch_size=EXPORT_BATCH_SIZE):
+    """Yield result rows as dicts, reading ``batch_size`` rows at a time from a server-side cursor."""
+    result = db.session.execute(statement.execution_options(yield_per=batch_size))
+    try:
+        for row in result:
+            yield row._asdict()
+    finally:
+        result.close()
+
+
+def _plain(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def iter_csv(rows, columns, rows_per_chunk=500):
+    """Encode rows as CSV text chunks, starting with the header line."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    count = 0
+    for row in rows:
+        writer.writerow([_plain(row[column]) for column in columns])
+        count += 1
+        if count % rows_per_chunk == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def iter_jsonl(rows, rows_per_chunk=500):
+    """Encode rows as JSON Lines text chunks."""
+    lines = []
+    for row in rows:
+        lines.append(json.dumps({key: _plain(value) for key, value in row.items()}, ensure_ascii=False))
+        if len(lines) >= rows_per_chunk:
+            yield "\n".join(lines) + "\n"
+            lines = []
+    if lines:
+        yield "\n".join(lines) + "\n"
+
+
+def export_chunks(statement, fmt):
+    """Return an iterator of text chunks for ``statement`` in the given format."""
+    rows = stream_rows(statement)
+    if fmt == 'csv':
+        return iter_csv(rows, [column.name for column in statement.selected_columns])
+    return iter_jsonl(rows)
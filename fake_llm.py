@@ -0,0 +1,159 @@
+import os
+import re
+import json
+import time
+import random
+import hashlib
+import threading
+from collections import deque
+
+from openai_service import LLMBackend, OpenRouterError
+
+# Simulated response time in seconds; each call varies by up to +/- FAKE_LLM_JITTER of it
+FAKE_LLM_LATENCY = float(os.environ.get("FAKE_LLM_LATENCY", "0.2"))
+FAKE_LLM_JITTER = float(os.environ.get("FAKE_LLM_JITTER", "0.5"))
+# Fraction of calls that fail with a 503, and of questions the fake reviewer rejects
+FAKE_LLM_FAILURE_RATE = float(os.environ.get("FAKE_LLM_FAILURE_RATE", "0"))
+FAKE_LLM_REJECT_RATE = float(os.environ.get("FAKE_LLM_REJECT_RATE", "0.05"))
+FAKE_LLM_SEED = int(os.environ.get("FAKE_LLM_SEED", "0"))
+
+_SETTINGS = ["a hospital triage desk", "a warehouse robot fleet", "a music streaming service", "a city bike share",
+             "an airline check-in system", "a weather station network", "a library catalogue", "a food delivery app",
+             "a chess tournament", "a traffic light controller", "a bank ledger", "a school timetable"]
+_TASKS = ["design and implement", "trace by hand and then code", "write and benchmark", "prototype and test",
+          "model and simulate", "sketch, implement and justify"]
+_ITEMS = ["records", "requests", "sensor readings", "orders", "events", "jobs", "messages", "transactions"]
+_REPORTS = ["the time complexity of each operation", "how memory use grows with input size",
+            "which edge cases break a naive version", "the trade-offs against one alternative",
+            "how you verified correctness", "the worst case input and its cost"]
+
+
+def _field(pattern, text, default):
+    match = re.search(pattern, text)
+    return match.group(1).strip() if match else default
+
+
+class FakeLLMBackend(LLMBackend):
+    """Deterministic, offline stand-in for the OpenRouter client.
+
+    Responses are derived from a hash of the request payload and the seed,
+    so the same prompt always gets the same answer. The fake understands the
+    prompts built in ``openai_service`` (variations, single and batched
+    validation) and answers them in the JSON shapes they ask for. Latency
+    and a failure rate are simulated; failures raise OpenRouterError with
+    status 503 like an exhausted retry budget would.
+    """
+
+    def __init__(self, latency=None, jitter=None, failure_rate=None, reject_rate=None, seed=None, history=200):
+        self.latency = FAKE_LLM_LATENCY if latency is None else latency
+        self.jitter = FAKE_LLM_JITTER if jitter is None else jitter
+        self.failure_rate = FAKE_LLM_FAILURE_RATE if failure_rate is None else failure_rate
+        self.reject_rate = FAKE_LLM_REJECT_RATE if reject_rate is None else reject_rate
+        self.seed = FAKE_LLM_SEED if seed is None else seed
+        self.recent_calls = deque(maxlen=history)
+        self.totals = {"calls": 0, "failures": 0, "retries": 0}
+        self.lock = threading.Lock()
+        # Failures depend on call order rather than payload, but are reproducible for a given seed
+        self.failures = random.Random(self.seed)
+
+    def _rng(self, *parts):
+        digest = hashlib.sha256(json.dumps([self.seed, *parts], sort_keys=True).encode("utf-8")).digest()
+        return random.Random(int.from_bytes(digest[:8], "big"))
+
+    def _variations(self, prompt, rng):
+        count = int(_field(r"Generate (\d+) unique", prompt, 5))
+        topic = _field(r"Topic: (.+)", prompt, "the topic")
+        variations = []
+        for _ in range(count):
+            setting, task, items, report = rng.choice(_SETTINGS), rng.choice(_TASKS), rng.choice(_ITEMS), rng.choice(_REPORTS)
+            size, limit = rng.randint(10, 99999), rng.randint(2, 500)
+            variations.append({
+                "question": f"For {setting}, {task} a {topic} solution that processes {size} {items} "
+                            f"with at most {limit} held in memory at once. Explain {report}.",
+                "expected_answer": f"A working {topic} solution for {size} {items} and a discussion of {report}.",
+            })
+        return {"variations": variations}
+
+    def _verdict(self, question, topic):
+        valid = self._rng("verdict", question, topic).random() >= self.reject_rate
+        return {"valid": valid, "feedback": "Clear and on topic." if valid else "Too vague to grade consistently."}
+
+    def complete(self, payload):
+        """Return the assistant message text for a chat completion payload."""
+        prompt = payload["messages"][-1]["content"]
+        topic = _field(r"Topic: (.+)", prompt, "")
+
+        if '"variations"' in prompt:
+            return json.dumps(self._variations(prompt, self._rng("variations", payload)))
+        if '"results"' in prompt:
+            questions = re.findall(r"^\s+(\d+)\. (.*)$", prompt, re.M)
+            return json.dumps({"results": [dict(self._verdict(text, topic), index=int(index)) for index, text in questions]})
+        if '"valid"' in prompt:
+            question = _field(r"Question: (.+)", prompt, prompt)
+            return json.dumps(self._verdict(question, topic))
+        rng = self._rng("text", payload)
+        return f"In {rng.choice(_SETTINGS)}, {rng.choice(_TASKS)} a solution and explain {rng.choice(_REPORTS)}."
+
+    def _simulate(self, call):
+        with self.lock:
+            failed = self.failures.random() < self.failure_rate
+            delay = max(0.0, self.latency * (1 + self.jitter * self.failures.uniform(-1, 1)))
+        time.sleep(delay)
+        if failed:
+            call["status"] = 503
+            raise OpenRouterError("Fake LLM backend simulated a failure", status_code=503)
+        call["status"] = 200
+
+    def _record(self, call, started, failed=False):
+        call["latency"] = time.monotonic() - started
+        with self.lock:
+            self.totals["calls"] += 1
+            if failed:
+                self.totals["failures"] += 1
+            self.recent_calls.append(call)
+
+    def post(self, payload):
+        started = time.monotonic()
+        call = {"retries": 0, "status": None}
+        try:
+            self._simulate(call)
+        except OpenRouterError:
+            self._record(call, started, failed=True)
+            raise
+        content = self.complete(payload)
+        self._record(call, started)
+
+        prompt_tokens = sum(len(message["content"]) for message in payload["messages"]) // 4
+        return {
+            "id": f"fake-{hashlib.sha256(content.encode('utf-8')).hexdigest()[:12]}",
+            "model": payload.get("model"),
+            "choices": [{"message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(content) // 4,
+                      "total_tokens": prompt_tokens + len(content) // 4},
+        }
+
+    def stream(self, payload):
+        started = time.monotonic()
+        call = {"retries": 0, "status": None, "stream": True}
+        try:
+            self._simulate(call)
+        except OpenRouterError:
+            self._record(call, started, failed=True)
+            raise
+        content = self.complete(payload)
+        try:
+            for offset in range(0, len(content), 40):
+                yield content[offset:offset + 40], None
+            yield "", "stop"
+        finally:
+            self._record(call, started)
+
+    def stats(self):
+        with self.lock:
+            recent = list(self.recent_calls)
+            totals = dict(self.totals)
+        latencies = sorted(call["latency"] for call in recent)
+        totals["breaker"] = "closed"
+        totals["recent_calls"] = recent
+        totals["p50_latency"] = latencies[len(latencies) // 2] if latencies else None
+        return totals
@@ -0,0 +1,200 @@
+"""
+Cache for rendered page fragments.
+
+A fragment is stored as a dict with its HTML, an ETag derived from the HTML
+and the time it was rendered. FRAGMENT_CACHE_BACKEND selects where entries
+live: ``memory`` keeps an LRU per process, ``filesystem`` keeps one file per
+entry under FRAGMENT_CACHE_DIR so every gunicorn worker on the host shares
+the entries and sees invalidations at once. Keys should include everything
+that changes the fragment; invalidation only has to cover edits made in
+place (see ``invalidate_on_change``), which memory caches in other
+processes pick up within FRAGMENT_CACHE_TTL.
+"""
+import os
+import json
+import time
+import hashlib
+import logging
+import tempfile
+import threading
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from cache import TTLCache
+from metrics import observe_fragment_lookup
+
+FRAGMENT_CACHE_ENABLED = os.environ.get("FRAGMENT_CACHE_ENABLED", "1") != "0"
+FRAGMENT_CACHE_BACKEND = os.environ.get("FRAGMENT_CACHE_BACKEND", "memory")
+FRAGMENT_CACHE_SIZE = int(os.environ.get("FRAGMENT_CACHE_SIZE", "5000"))
+FRAGMENT_CACHE_TTL = float(os.environ.get("FRAGMENT_CACHE_TTL", "600"))
+FRAGMENT_CACHE_DIR = os.environ.get("FRAGMENT_CACHE_DIR", os.path.join(tempfile.gettempdir(), "labquestion-fragments"))
+
+
+class MemoryBackend:
+    """LRU of fragments in this process."""
+
+    def __init__(self, maxsize=FRAGMENT_CACHE_SIZE, ttl=FRAGMENT_CACHE_TTL):
+        self.entries = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    def get(self, key):
+        return self.entries.get(key)
+
+    def set(self, key, entry):
+        self.entries.set(key, entry)
+
+    def delete(self, key):
+        self.entries.delete(key)
+
+    def clear(self):
+        self.entries.clear()
+
+
+class FilesystemBackend:
+    """One JSON file per fragment, shared by every process on the host.
+
+    Files are written to a temporary name and renamed into place, so readers
+    never see a partial entry. Expired files are removed when read.
+    """
+
+    def __init__(self, directory=FRAGMENT_CACHE_DIR, ttl=FRAGMENT_CACHE_TTL):
+        self.directory = directory
+        self.ttl = ttl
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".json")
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            if time.time() - os.path.getmtime(path) > self.ttl:
+                os.remove(path)
+                return None
+            with open(path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def set(self, key, entry):
+        descriptor, temporary = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(descriptor, "w", encoding="utf-8") as f:
+                json.dump(entry, f)
+            os.replace(temporary, self._path(key))
+        except OSError:
+            logging.exception(f"Could not write fragment {key}")
+            try:
+                os.remove(temporary)
+            except OSError:
+                pass
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            if name.endswith(".json"):
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    pass
+
+
+# Deployments spread over several hosts need a store all of them reach; it
+# only has to hold the fragment dicts and drop them on ``delete``/``clear``.
+FRAGMENT_CACHE_BACKENDS = {
+    "memory": MemoryBackend,
+    "filesystem": FilesystemBackend,
+}
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    """Return the process-wide fragment backend, or None when caching is disabled."""
+    global _backend
+    if not FRAGMENT_CACHE_ENABLED:
+        return None
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                if FRAGMENT_CACHE_BACKEND not in FRAGMENT_CACHE_BACKENDS:
+                    raise ValueError(f"Unknown FRAGMENT_CACHE_BACKEND {FRAGMENT_CACHE_BACKEND!r}; "
+                                     f"choose one of {', '.join(FRAGMENT_CACHE_BACKENDS)}")
+                _backend = FRAGMENT_CACHE_BACKENDS[FRAGMENT_CACHE_BACKEND]()
+    return _backend
+
+
+def make_entry(html, **extra):
+    """Wrap rendered HTML with its ETag and render time."""
+    return {"html": html, "etag": hashlib.sha1(html.encode("utf-8")).hexdigest(),
+            "rendered_at": time.time(), **extra}
+
+
+def cached_fragment(key, render):
+    """Return the entry cached under ``key``, storing ``render()`` on a miss.
+
+    ``render`` returns an entry from ``make_entry``, or None for nothing to
+    cache (None is returned without storing it).
+    """
+    backend = get_backend()
+    entry = backend.get(key) if backend is not None else None
+    observe_fragment_lookup(entry is not None)
+    if entry is None:
+        entry = render()
+        if entry is not None and backend is not None:
+            backend.set(key, entry)
+    return entry
+
+
+def store_fragment(key, entry):
+    backend = get_backend()
+    if backend is not None:
+        backend.set(key, entry)
+
+
+def invalidate_fragment(key):
+    backend = get_backend()
+    if backend is not None:
+        backend.delete(key)
+
+
+def invalidate_fragments():
+    backend = get_backend()
+    if backend is not None:
+        backend.clear()
+
+
+# model -> (columns shown in fragments, whether bulk UPDATE/DELETE statements count as edits)
+_watched = {}
+
+
+def invalidate_on_change(model, columns, bulk_writes=True):
+    """Clear the cache when an instance of ``model`` is deleted or one of ``columns`` changes."""
+    _watched[model] = (tuple(columns), bulk_writes)
+
+
+@event.listens_for(Session, 'after_flush')
+def _invalidate_after_flush(session, flush_context):
+    for obj in (*session.dirty, *session.deleted):
+        watched = _watched.get(type(obj))
+        if watched is None:
+            continue
+        state = inspect(obj)
+        if obj in session.deleted or any(state.attrs[column].history.has_changes() for column in watched[0]):
+            invalidate_fragments()
+            return
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _invalidate_after_bulk_write(orm_execute_state):
+    if orm_execute_state.is_update or orm_execute_state.is_delete:
+        mapper = orm_execute_state.bind_mapper
+        watched = _watched.get(mapper.class_) if mapper is not None else None
+        if watched is not None and watched[1]:
+            invalidate_fragments()
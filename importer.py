@@ -0,0 +1,187 @@
+import csv
+import json
+import os
+import logging
+from datetime import datetime
+
+from sqlalchemy import select, insert, func
+
+from app import db
+from models import Topic, Question
+from purge import deleted_topic_ids
+
+# Rows written per executemany INSERT (and per transaction)
+IMPORT_BATCH_SIZE = int(os.environ.get("IMPORT_BATCH_SIZE", "5000"))
+
+# How many row errors are kept for the final report
+MAX_REPORTED_ERRORS = 100
+
+DIFFICULTIES = ('easy', 'medium', 'hard')
+
+
+def detect_format(filename):
+    """Return 'jsonl', 'json' or 'csv' based on a file name."""
+    name = filename.lower()
+    if name.endswith(('.jsonl', '.ndjson')):
+        return 'jsonl'
+    return 'json' if name.endswith('.json') else 'csv'
+
+
+def read_records(stream, fmt):
+    """Yield ``(line_number, record_dict)`` pairs from a CSV, JSONL or JSON text stream.
+
+    A JSON file holds one array of objects and is parsed whole; its
+    "line numbers" are the positions of the objects in the array.
+    """
+    if fmt == 'json':
+        try:
+            records = json.load(stream)
+        except ValueError as e:
+            yield 1, ValueError(f"invalid JSON: {e}")
+            return
+        if not isinstance(records, list):
+            yield 1, ValueError("expected a JSON array of objects")
+            return
+        for position, record in enumerate(records, start=1):
+            yield position, record if isinstance(record, dict) else ValueError("expected a JSON object")
+    elif fmt == 'jsonl':
+        for line_number, line in enumerate(stream, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                yield line_number, ValueError(f"invalid JSON: {e}")
+                continue
+            yield line_number, record if isinstance(record, dict) else ValueError("expected a JSON object")
+    else:
+        reader = csv.DictReader(stream)
+        for record in reader:
+            yield reader.line_num, record
+
+
+def _text(record, *names):
+    """Return the first present field of ``names`` as stripped text.
+
+    Numbers are converted to text; other JSON values (lists, objects,
+    booleans) raise ValueError so the row is rejected.
+    """
+    for name in names:
+        value = record.get(name)
+        if value is None:
+            continue
+        if isinstance(value, bool) or not isinstance(value, (str, int, float)):
+            raise ValueError(f"{name} must be text, not {type(value).__name__}")
+        value = str(value).strip()
+        if value:
+            return value
+    return ''
+
+
+def load_topic_state():
+    """Return ``{topic_id: [difficulty, next_variation_number]}`` for every live topic in one query."""
+    rows = db.session.execute(
+        select(Topic.id, Topic.difficulty, func.max(Question.variation_number))
+        .outerjoin(Question, Question.topic_id == Topic.id)
+        .where(Topic.deleted_at.is_(None))
+        .group_by(Topic.id, Topic.difficulty)
+    ).all()
+    return {topic_id: [difficulty, (current or 0) + 1] for topic_id, difficulty, current in rows}
+
+
+def import_questions(stream, fmt='csv', default_topic_id=None, batch_size=None, on_progress=None):
+    """Validate and bulk insert questions from a CSV, JSONL or JSON stream.
+
+    Rows are validated in a single streaming pass and written with
+    executemany INSERTs of ``batch_size`` rows, one transaction per batch.
+    Each row needs ``question_text`` (or ``question``) and a topic, given by
+    a ``topic_id`` column or ``default_topic_id``. ``expected_answer`` and
+    ``difficulty`` are optional; the difficulty defaults to the topic's.
+    Variation numbers continue from each topic's current maximum.
+    ``on_progress(imported, skipped)`` is called after every batch.
+    Returns a summary dict with the first errors found.
+    """
+    batch_size = batch_size or IMPORT_BATCH_SIZE
+    topics = load_topic_state()
+    now = datetime.utcnow()
+
+    imported = 0
+    skipped = 0
+    errors = []
+    batch = []
+
+    def reject(line_number, message):
+        nonlocal skipped
+        skipped += 1
+        if len(errors) < MAX_REPORTED_ERRORS:
+            errors.append(f"line {line_number}: {message}")
+
+    def flush():
+        nonlocal imported, skipped, batch
+        # Topics deleted since the import started get no more rows
+        deleted = deleted_topic_ids({row["topic_id"] for row in batch}) if batch else set()
+        for topic_id in deleted:
+            topics.pop(topic_id, None)
+            dropped = sum(1 for row in batch if row["topic_id"] == topic_id)
+            skipped += dropped
+            if len(errors) < MAX_REPORTED_ERRORS:
+                errors.append(f"{dropped} rows for topic {topic_id} dropped: the topic was deleted")
+        batch = [row for row in batch if row["topic_id"] not in deleted]
+        if batch:
+            db.session.execute(insert(Question), batch)
+            db.session.commit()
+            imported += len(batch)
+            batch = []
+        if on_progress:
+            on_progress(imported, skipped)
+
+    for line_number, record in read_records(stream, fmt):
+        if isinstance(record, Exception):
+            reject(line_number, str(record))
+            continue
+
+        try:
+            text = _text(record, 'question_text', 'question')
+            difficulty = _text(record, 'difficulty').lower()
+            expected_answer = _text(record, 'expected_answer')
+        except ValueError as e:
+            reject(line_number, str(e))
+            continue
+        if not text:
+            reject(line_number, "missing question_text")
+            continue
+
+        raw_topic = record.get('topic_id') or default_topic_id
+        try:
+            topic_id = int(raw_topic)
+        except (TypeError, ValueError):
+            reject(line_number, f"invalid topic_id {raw_topic!r}")
+            continue
+        state = topics.get(topic_id)
+        if state is None:
+            reject(line_number, f"unknown topic {topic_id}")
+            continue
+
+        difficulty = difficulty or state[0]
+        if difficulty not in DIFFICULTIES:
+            reject(line_number, f"invalid difficulty {difficulty!r}")
+            continue
+
+        batch.append({
+            "topic_id": topic_id,
+            "question_text": text,
+            "expected_answer": expected_answer,
+            "difficulty": difficulty,
+            "variation_number": state[1],
+            "is_assigned": False,
+            "created_at": now,
+        })
+        state[1] += 1
+
+        if len(batch) >= batch_size:
+            flush()
+
+    flush()
+    logging.info(f"Imported {imported} questions ({skipped} rows skipped)")
+    return {"imported": imported, "skipped": skipped, "errors": errors}
@@ -0,0 +1,399 @@
+"""
+Background jobs: generation, import, refill and purge.
+
+A job is a row in the ``job`` table plus a task on this process's worker
+pool. Nothing else holds the task, so a job whose process exits (a deploy,
+a crash, gunicorn recycling a worker) is lost: its row stays ``queued`` or
+``running`` and no other process picks it up. ``sweep_stale_jobs`` marks
+such rows failed once they are older than JOB_STALE_SECONDS; it runs at
+bootstrap and when an active job's status is polled. Start the work again
+to retry it.
+"""
+import json
+import os
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import func, update
+
+from app import db
+from models import Job, Question, Topic
+
+# Number of background threads per process that run queued jobs
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "2"))
+
+# A job queued or running for longer than this is assumed lost with its process
+JOB_STALE_SECONDS = int(os.environ.get("JOB_STALE_SECONDS", "3600"))
+
+ACTIVE_STATUSES = ('queued', 'running')
+
+# Run batched AI quality validation on freshly generated questions
+VALIDATE_GENERATED_QUESTIONS = os.environ.get("VALIDATE_GENERATED_QUESTIONS", "1") != "0"
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """Return the process-wide worker pool, creating it on first use."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="job-worker")
+    return _executor
+
+
+def submit_job(kind, topic_id, params, created_by=None, total=0):
+    """Persist a new job and hand it to the local worker pool."""
+    job = Job(
+        kind=kind,
+        topic_id=topic_id,
+        params=json.dumps(params),
+        total=total,
+        created_by=created_by
+    )
+    db.session.add(job)
+    db.session.commit()
+
+    app = current_app._get_current_object()
+    get_executor().submit(_run_job, app, job.id)
+    logging.info(f"Queued {kind} job {job.id} for topic {topic_id}")
+    return job
+
+
+def sweep_stale_jobs(max_age=JOB_STALE_SECONDS, job_id=None):
+    """Mark queued or running jobs older than ``max_age`` seconds as failed.
+
+    Age counts from the start of a running job, or from creation of a queued
+    one. Pass ``job_id`` to check a single job. Returns the number of jobs marked.
+    """
+    now = datetime.utcnow()
+    statement = update(Job).where(
+        Job.status.in_(ACTIVE_STATUSES),
+        func.coalesce(Job.started_at, Job.created_at) < now - timedelta(seconds=max_age)
+    )
+    if job_id is not None:
+        statement = statement.where(Job.id == job_id)
+    swept = db.session.execute(statement.values(
+        status='failed', message='Abandoned: its process stopped before the job finished', finished_at=now
+    )).rowcount
+    db.session.commit()
+    if swept:
+        logging.warning(f"Marked {swept} stale job(s) as failed")
+    if job_id is None:
+        # Questions whose review died with its job: release them unchecked
+        released = db.session.execute(
+            update(Question).where(Question.quality_status == 'reviewing',
+                                   Question.created_at < now - timedelta(seconds=max_age))
+            .values(quality_status='pending')
+        ).rowcount
+        db.session.commit()
+        if released:
+            logging.warning(f"Released {released} question(s) left under review by stale jobs")
+    return swept
+
+
+def serialize_job(job):
+    """Return the JSON-friendly status of a job for polling clients."""
+    return {
+        "id": job.id,
+        "kind": job.kind,
+        "topic_id": job.topic_id,
+        "status": job.status,
+        "total": job.total or 0,
+        "progress": job.progress or 0,
+        "message": job.message,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+
+def update_progress(job, progress, message=None):
+    """Record job progress and commit so pollers see it immediately."""
+    job.progress = progress
+    if message is not None:
+        job.message = message
+    db.session.commit()
+
+
+def _run_job(app, job_id):
+    with app.app_context():
+        try:
+            job = db.session.get(Job, job_id)
+            if job is None:
+                logging.error(f"Job {job_id} vanished before it could run")
+                return
+
+            job.status = 'running'
+            job.started_at = datetime.utcnow()
+            db.session.commit()
+
+            handler = JOB_HANDLERS[job.kind]
+            params = json.loads(job.params or "{}")
+            message = handler(job, **params)
+
+            job.status = 'succeeded'
+            job.message = message
+            job.finished_at = datetime.utcnow()
+            db.session.commit()
+            logging.info(f"Job {job_id} finished: {message}")
+
+        except Exception as e:
+            db.session.rollback()
+            logging.exception(f"Job {job_id} failed")
+            job = db.session.get(Job, job_id)
+            if job is not None:
+                job.status = 'failed'
+                job.message = str(e)
+                job.finished_at = datetime.utcnow()
+                db.session.commit()
+        finally:
+            db.session.remove()
+
+
+def next_variation_number(topic_id):
+    """Return the first unused variation number for a topic."""
+    current = db.session.query(func.max(Question.variation_number)).filter(
+        Question.topic_id == topic_id
+    ).scalar()
+    return (current or 0) + 1
+
+
+def build_question(topic, variation, variation_number):
+    return Question(
+        topic_id=topic.id,
+        question_text=variation['question'],
+        expected_answer=variation.get('expected_answer', ''),
+        difficulty=topic.difficulty,
+        variation_number=variation_number,
+        # Not claimable until validate_questions has reviewed it
+        quality_status='reviewing' if VALIDATE_GENERATED_QUESTIONS else 'pending'
+    )
+
+
+def validate_questions(job, topic, questions, use_cache=True):
+    """Store AI quality verdicts for saved questions.
+
+    Questions are validated in batches (see
+    ``openai_service.validate_questions_batch``) and verdicts are written
+    with one bulk UPDATE. The questions are saved as 'reviewing', which
+    keeps them out of claims until then; those without a verdict (their
+    batch failed) are released as 'pending', i.e. assignable but unchecked.
+    Returns a note for the job message, or None.
+    """
+    import openai_service
+
+    if not VALIDATE_GENERATED_QUESTIONS or not questions:
+        return None
+
+    update_progress(job, job.progress, f"Validating {len(questions)} questions...")
+    try:
+        verdicts = openai_service.validate_questions_batch(
+            [question.question_text for question in questions],
+            topic_name=topic.name,
+            difficulty=topic.difficulty,
+            use_cache=use_cache
+        )
+    except Exception:
+        db.session.rollback()
+        verdicts = [None] * len(questions)
+        logging.exception(f"Job {job.id}: quality review failed; releasing questions unchecked")
+
+    rows = [
+        {"id": question.id,
+         "quality_status": 'pending' if verdict is None else 'approved' if verdict["valid"] else 'rejected',
+         "quality_feedback": (verdict.get("feedback") or None) if verdict is not None else None}
+        for question, verdict in zip(questions, verdicts)
+    ]
+    db.session.execute(update(Question), rows)
+    db.session.commit()
+
+    rejected = sum(1 for row in rows if row["quality_status"] == 'rejected')
+    unchecked = sum(1 for row in rows if row["quality_status"] == 'pending')
+    notes = []
+    if rejected:
+        notes.append(f"{rejected} failed quality review")
+    if unchecked:
+        notes.append(f"{unchecked} not validated")
+    return '; '.join(notes) or None
+
+
+def run_generation(job, base_question, num_variations, use_cache=True, stream=False):
+    """Generate question variations for a topic and save them."""
+    import openai_service
+    from purge import ensure_topic_active
+    from similarity import filter_near_duplicates
+
+    topic = db.session.get(Topic, job.topic_id)
+    if topic is None or topic.deleted_at is not None:
+        raise Exception(f"Topic {job.topic_id} no longer exists")
+
+    update_progress(job, 0, "Waiting for AI response...")
+
+    if stream:
+        return run_streaming_generation(job, topic, base_question, num_variations, use_cache)
+
+    notes = []
+    if num_variations > openai_service.GENERATION_BATCH_SIZE:
+        def on_batch(done, total_batches, generated):
+            update_progress(job, generated, f"Finished {done} of {total_batches} batches")
+
+        result = openai_service.generate_question_variations_chunked(
+            base_question=base_question,
+            topic_name=topic.name,
+            difficulty=topic.difficulty,
+            category=topic.category,
+            num_variations=num_variations,
+            on_batch=on_batch,
+            use_cache=use_cache
+        )
+        variations = result['variations']
+        if result['failed_batches']:
+            notes.append(f"{len(result['failed_batches'])} of {result['batches']} batches failed")
+        if result['duplicates']:
+            notes.append(f"{result['duplicates']} duplicates dropped")
+    else:
+        variations = openai_service.generate_question_variations(
+            base_question=base_question,
+            topic_name=topic.name,
+            difficulty=topic.difficulty,
+            category=topic.category,
+            num_variations=num_variations,
+            use_cache=use_cache
+        )
+    logging.info(f"Job {job.id}: received {len(variations)} variations from AI")
+
+    variations, rejected = filter_near_duplicates(topic.id, variations)
+    if rejected:
+        notes.append(f"{len(rejected)} near-duplicates rejected")
+
+    # The topic may have been deleted while the AI was answering
+    ensure_topic_active(topic.id)
+
+    # Save everything in one batch
+    start = next_variation_number(topic.id)
+    questions = [
+        build_question(topic, variation, start + i)
+        for i, variation in enumerate(variations)
+        if variation.get('question')
+    ]
+
+    db.session.add_all(questions)
+    job.progress = len(questions)
+    db.session.commit()
+
+    note = validate_questions(job, topic, questions, use_cache)
+    if note:
+        notes.append(note)
+
+    message = f"Generated {len(questions)} of {num_variations} question variations"
+    if notes:
+        message += f" ({'; '.join(notes)})"
+    return message
+
+
+def run_streaming_generation(job, topic, base_question, num_variations, use_cache=True):
+    """Stream variations from the AI and commit each one as soon as it is complete."""
+    import openai_service
+    from purge import ensure_topic_active
+    from similarity import get_topic_index
+
+    index = get_topic_index(topic.id)
+    start = next_variation_number(topic.id)
+    saved = 0
+    rejected = 0
+    questions = []
+    for variation in openai_service.stream_question_variations(
+        base_question=base_question,
+        topic_name=topic.name,
+        difficulty=topic.difficulty,
+        category=topic.category,
+        num_variations=num_variations,
+        use_cache=use_cache
+    ):
+        if index.find_similar(variation['question']):
+            rejected += 1
+            continue
+        ensure_topic_active(topic.id)
+        question = build_question(topic, variation, start + saved)
+        db.session.add(question)
+        saved += 1
+        update_progress(job, saved, f"Saved {saved} of {num_variations} variations")
+        index.record(question.id, question.question_text)
+        questions.append(question)
+
+    note = validate_questions(job, topic, questions, use_cache)
+
+    message = f"Generated {saved} of {num_variations} question variations"
+    if rejected:
+        message += f" ({rejected} near-duplicates rejected)"
+    if note:
+        message += f" ({note})"
+    if saved + rejected < num_variations:
+        message += " (AI response ended early; all complete variations were kept)"
+    return message
+
+
+def run_import(job, path, fmt):
+    """Bulk import an uploaded question bank, then remove the upload."""
+    from importer import import_questions
+
+    def on_progress(imported, skipped):
+        update_progress(job, imported, f"Imported {imported} questions ({skipped} rows skipped)")
+
+    try:
+        with open(path, newline='', encoding='utf-8-sig') as stream:
+            summary = import_questions(stream, fmt, default_topic_id=job.topic_id, on_progress=on_progress)
+    finally:
+        os.remove(path)
+
+    message = f"Imported {summary['imported']} questions ({summary['skipped']} rows skipped)"
+    if summary['errors']:
+        message += f". First problems: {'; '.join(summary['errors'][:5])}"
+    return message
+
+
+def run_refill(job):
+    """Top a topic's unassigned pool back up to its target size."""
+    from refill import pool_settings, available_count, base_question_for
+
+    topic = db.session.get(Topic, job.topic_id)
+    if topic is None or topic.deleted_at is not None:
+        raise Exception(f"Topic {job.topic_id} no longer exists")
+
+    _, target = pool_settings(topic)
+    needed = target - available_count(topic.id)
+    if needed <= 0:
+        return "Pool already at its target size"
+
+    base_question = base_question_for(topic.id)
+    if not base_question:
+        raise Exception("Topic has no generate job or question to base new variations on")
+
+    job.total = needed
+    # Fresh AI responses: a cached reply would repeat questions already in the pool
+    return run_generation(job, base_question, needed, use_cache=False)
+
+
+def run_purge(job, chunk_size=None):
+    """Delete a (soft-deleted) topic's rows in chunks, then the topic itself."""
+    from purge import purge_topic
+
+    def on_progress(deleted):
+        update_progress(job, deleted, f"Deleted {deleted} of {job.total} rows")
+
+    summary = purge_topic(job.topic_id, chunk_size=chunk_size, on_progress=on_progress)
+    return f"Deleted {summary['assignments']} assignments and {summary['questions']} questions"
+
+
+JOB_HANDLERS = {
+    'generate': run_generation,
+    'import': run_import,
+    'refill': run_refill,
+    'purge': run_purge,
+}
@@ -0,0 +1,129 @@
+import json
+import os
+import time
+import sqlite3
+import hashlib
+import logging
+import tempfile
+import threading
+
+# Persistent cache for LLM responses, shared by all processes on the host.
+# The default lives in the temp directory, which is writable even where the
+# app directory is not (e.g. Vercel).
+LLM_CACHE_ENABLED = os.environ.get("LLM_CACHE_ENABLED", "1") != "0"
+LLM_CACHE_PATH = os.environ.get("LLM_CACHE_PATH", os.path.join(tempfile.gettempdir(), "labquestion-llm-cache.sqlite3"))
+LLM_CACHE_TTL = int(os.environ.get("LLM_CACHE_TTL", str(7 * 24 * 3600)))
+LLM_CACHE_MAX_ENTRIES = int(os.environ.get("LLM_CACHE_MAX_ENTRIES", "5000"))
+
+
+def make_key(namespace, **parts):
+    """Return a content address for a namespaced set of JSON-serializable parts."""
+    encoded = json.dumps(parts, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return f"{namespace}:{hashlib.sha256(encoded.encode('utf-8')).hexdigest()}"
+
+
+class ResponseCache:
+    """SQLite-backed key/value cache with a TTL and LRU eviction.
+
+    Entries older than ``ttl`` seconds are treated as misses and removed.
+    When more than ``max_entries`` rows exist, the least recently read ones
+    are evicted. Hit, miss and eviction counters are kept per process.
+    """
+
+    def __init__(self, path, ttl=LLM_CACHE_TTL, max_entries=LLM_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.counters = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+        self.lock = threading.Lock()
+
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            " key TEXT PRIMARY KEY,"
+            " value TEXT NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " accessed_at REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS ix_llm_cache_accessed_at ON llm_cache (accessed_at)")
+
+    def get(self, key):
+        """Return the cached value for ``key`` or None on a miss."""
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute("SELECT value, created_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is None or now - row[1] > self.ttl:
+                if row is not None:
+                    self.conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                self.counters["misses"] += 1
+                return None
+            self.conn.execute("UPDATE llm_cache SET accessed_at = ? WHERE key = ?", (now, key))
+            self.counters["hits"] += 1
+        return json.loads(row[0])
+
+    def set(self, key, value):
+        """Store ``value`` under ``key`` and evict the least recently used overflow."""
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now, now)
+            )
+            evicted = self.conn.execute(
+                "DELETE FROM llm_cache WHERE key IN ("
+                " SELECT key FROM llm_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            ).rowcount
+            self.counters["writes"] += 1
+            self.counters["evictions"] += max(evicted, 0)
+
+    def invalidate(self, key):
+        """Drop a single entry."""
+        with self.lock:
+            self.conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+
+    def clear(self, namespace=None):
+        """Drop every entry, or every entry in one namespace."""
+        with self.lock:
+            if namespace:
+                self.conn.execute("DELETE FROM llm_cache WHERE key LIKE ?", (f"{namespace}:%",))
+            else:
+                self.conn.execute("DELETE FROM llm_cache")
+
+    def stats(self):
+        """Return hit/miss counters and the current entry count."""
+        with self.lock:
+            entries = self.conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+            stats = dict(self.counters)
+        lookups = stats["hits"] + stats["misses"]
+        stats["entries"] = entries
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else None
+        return stats
+
+
+_cache = None
+_cache_failed = False
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """Return the process-wide response cache, or None when caching is disabled.
+
+    A cache file that cannot be opened is logged once and the process runs
+    without a cache rather than failing the LLM call.
+    """
+    global _cache, _cache_failed
+    if not LLM_CACHE_ENABLED or _cache_failed:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None and not _cache_failed:
+                try:
+                    _cache = ResponseCache(LLM_CACHE_PATH)
+                except (sqlite3.Error, OSError):
+                    _cache_failed = True
+                    logging.exception(f"Could not open the LLM response cache at {LLM_CACHE_PATH}; caching is off")
+                    return None
+                logging.info(f"LLM response cache opened at {LLM_CACHE_PATH}")
+    return _cache
@@ -0,0 +1,265 @@
+"""
+Latency-aware routing of LLM calls across the configured models.
+
+LLM_MODELS lists the models that may serve a call, each with a quality
+tier, e.g. ``openai/gpt-4o:high,openai/gpt-4o-mini:standard``. A call asks
+for a tier and may be served by any model of that tier or above. Every
+model keeps a rolling window of latencies and errors; a call goes to the
+fastest healthy model, and if it has not answered by that model's p95
+latency a hedged duplicate is sent to the next best model. Whichever
+answers first wins; the other call is cancelled if it has not started and
+otherwise left to finish: it keeps its worker slot (LLM_ROUTER_WORKERS) and
+its latency or error is still recorded for its model. A call that fails
+outright fails over to the next model at once.
+"""
+import os
+import time
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+# Quality tiers from lowest to highest
+TIERS = ("basic", "standard", "high")
+
+LLM_MODELS = os.environ.get("LLM_MODELS", "gpt-4:high")
+LLM_HEDGING = os.environ.get("LLM_HEDGING", "1") != "0"
+
+# Rolling window per model: samples older than this many seconds are forgotten
+LLM_ROUTER_WINDOW = float(os.environ.get("LLM_ROUTER_WINDOW", "600"))
+LLM_ROUTER_MAX_SAMPLES = int(os.environ.get("LLM_ROUTER_MAX_SAMPLES", "200"))
+# Below this many samples a model's latency is unknown and it is tried first
+LLM_ROUTER_MIN_SAMPLES = int(os.environ.get("LLM_ROUTER_MIN_SAMPLES", "10"))
+# A model failing more than this share of recent calls is only used as a last resort
+LLM_ROUTER_MAX_ERROR_RATE = float(os.environ.get("LLM_ROUTER_MAX_ERROR_RATE", "0.25"))
+# Hedge deadline bounds: never hedge sooner than the minimum; use the default until p95 is known
+LLM_HEDGE_MIN_DELAY = float(os.environ.get("LLM_HEDGE_MIN_DELAY", "1"))
+LLM_HEDGE_DEFAULT_DELAY = float(os.environ.get("LLM_HEDGE_DEFAULT_DELAY", "20"))
+LLM_ROUTER_WORKERS = int(os.environ.get("LLM_ROUTER_WORKERS", "32"))
+
+
+def parse_models(text):
+    """Parse ``"model:tier,..."`` into ``[(model, tier), ...]``; the tier defaults to "high"."""
+    models = []
+    for item in text.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        name, _, tier = item.rpartition(":")
+        if not name or tier not in TIERS:
+            name, tier = item, "high"
+        models.append((name, tier))
+    if not models:
+        raise ValueError("LLM_MODELS lists no models")
+    return models
+
+
+def _percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class ModelStats:
+    """Rolling latency and error profile of one model."""
+
+    def __init__(self, window=LLM_ROUTER_WINDOW, max_samples=LLM_ROUTER_MAX_SAMPLES):
+        self.window = window
+        self.samples = deque(maxlen=max_samples)
+        self.in_flight = 0
+        self.lock = threading.Lock()
+
+    def record(self, latency, ok):
+        """Add one call; ``latency`` None counts toward the error rate only."""
+        with self.lock:
+            self.samples.append((time.monotonic(), latency, ok))
+
+    def snapshot(self):
+        cutoff = time.monotonic() - self.window
+        with self.lock:
+            while self.samples and self.samples[0][0] < cutoff:
+                self.samples.popleft()
+            samples = list(self.samples)
+            in_flight = self.in_flight
+        latencies = sorted(latency for _, latency, ok in samples if ok and latency is not None)
+        errors = sum(1 for _, _, ok in samples if not ok)
+        return {
+            "samples": len(samples),
+            "timed": len(latencies),
+            "errors": errors,
+            "error_rate": errors / len(samples) if samples else 0.0,
+            "p50": _percentile(latencies, 0.5) if latencies else None,
+            "p95": _percentile(latencies, 0.95) if latencies else None,
+            "in_flight": in_flight,
+        }
+
+
+class ModelRouter:
+    """Pick, hedge and fail over between models; see the module docstring.
+
+    ``call(tier, send)`` runs ``send(model)`` for the chosen model(s) on a
+    worker pool and returns the first successful result. ``send`` must
+    raise on failure. Recent decisions are kept for ``stats``.
+    """
+
+    def __init__(self, models, hedging=LLM_HEDGING, min_samples=LLM_ROUTER_MIN_SAMPLES,
+                 max_error_rate=LLM_ROUTER_MAX_ERROR_RATE, hedge_min_delay=LLM_HEDGE_MIN_DELAY,
+                 hedge_default_delay=LLM_HEDGE_DEFAULT_DELAY, window=LLM_ROUTER_WINDOW,
+                 max_samples=LLM_ROUTER_MAX_SAMPLES, workers=LLM_ROUTER_WORKERS, history=100):
+        self.models = list(models)
+        self.hedging = hedging
+        self.min_samples = min_samples
+        self.max_error_rate = max_error_rate
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_default_delay = hedge_default_delay
+        self.stats_by_model = {name: ModelStats(window, max_samples) for name, _ in self.models}
+        self.decisions = deque(maxlen=history)
+        self.totals = {"calls": 0, "hedged": 0, "hedge_wins": 0, "failovers": 0, "failures": 0}
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="llm-router")
+
+    def candidates(self, tier):
+        """Models allowed for ``tier``, best first: healthy, then untried, then fastest median."""
+        if tier not in TIERS:
+            raise ValueError(f"Unknown tier {tier!r}; choose one of {', '.join(TIERS)}")
+        rank = TIERS.index(tier)
+        ranked = []
+        for order, (name, model_tier) in enumerate(self.models):
+            if TIERS.index(model_tier) < rank:
+                continue
+            snapshot = self.stats_by_model[name].snapshot()
+            healthy = snapshot["samples"] < self.min_samples or snapshot["error_rate"] <= self.max_error_rate
+            known = snapshot["timed"] >= self.min_samples
+            ranked.append(((not healthy, known, snapshot["p50"] if known else 0.0, order), name))
+        if not ranked:
+            raise ValueError(f"LLM_MODELS has no model of tier {tier!r} or above")
+        return [name for _, name in sorted(ranked)]
+
+    def hedge_delay(self, model):
+        """Seconds to wait for ``model`` before sending a hedged request."""
+        snapshot = self.stats_by_model[model].snapshot()
+        if snapshot["timed"] < self.min_samples:
+            return self.hedge_default_delay
+        return max(self.hedge_min_delay, snapshot["p95"])
+
+    def pick(self, tier):
+        return self.candidates(tier)[0]
+
+    def record(self, model, latency, ok):
+        self.stats_by_model[model].record(latency, ok)
+
+    def _start(self, model, send):
+        stats = self.stats_by_model[model]
+        started = time.monotonic()
+
+        def run():
+            with stats.lock:
+                stats.in_flight += 1
+            try:
+                result = send(model)
+            except Exception:
+                stats.record(time.monotonic() - started, False)
+                raise
+            finally:
+                with stats.lock:
+                    stats.in_flight -= 1
+            stats.record(time.monotonic() - started, True)
+            return result
+
+        future = self.executor.submit(run)
+        future.model = model
+        return future
+
+    def call(self, tier, send):
+        """Return ``send(model)`` from the first model to succeed for ``tier``."""
+        queue = self.candidates(tier)
+        started = time.monotonic()
+        decision = {"tier": tier, "primary": queue[0], "hedged_to": None, "failed": [], "winner": None}
+
+        pending = {self._start(queue.pop(0), send)}
+        deadline = started + self.hedge_delay(decision["primary"])
+        last_error = None
+        try:
+            while pending:
+                hedge_due = self.hedging and queue and decision["hedged_to"] is None
+                timeout = max(0.0, deadline - time.monotonic()) if hedge_due else None
+                done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        last_error = e
+                        decision["failed"].append(future.model)
+                        continue
+                    decision["winner"] = future.model
+                    return result
+
+                if not done and hedge_due:
+                    # The primary passed its p95: race a second model against it
+                    decision["hedged_to"] = queue[0]
+                    pending.add(self._start(queue.pop(0), send))
+                elif done and not pending and queue:
+                    # Everything in flight failed: fail over to the next model
+                    model = queue.pop(0)
+                    pending.add(self._start(model, send))
+                    deadline = time.monotonic() + self.hedge_delay(model)
+            raise last_error
+        finally:
+            for future in pending:
+                future.cancel()
+            self._decide(decision, time.monotonic() - started)
+
+    def _decide(self, decision, latency):
+        decision["latency"] = round(latency, 3)
+        decision["at"] = time.time()
+        with self.lock:
+            self.totals["calls"] += 1
+            if decision["hedged_to"]:
+                self.totals["hedged"] += 1
+                if decision["winner"] == decision["hedged_to"]:
+                    self.totals["hedge_wins"] += 1
+            if decision["failed"] and decision["winner"]:
+                self.totals["failovers"] += 1
+            if decision["winner"] is None:
+                self.totals["failures"] += 1
+            self.decisions.append(decision)
+        if decision["winner"] is None:
+            logging.warning(f"LLM call for tier {decision['tier']} failed on {', '.join(decision['failed'])}")
+
+    def stats(self):
+        """Return per-model profiles, totals and recent decisions.
+
+        Profiles include calls that lost a hedge race, since a loser that
+        already started runs to completion; ``in_flight`` counts them too,
+        so it can exceed the number of calls waiting on the router.
+        """
+        models = []
+        for name, tier in self.models:
+            snapshot = self.stats_by_model[name].snapshot()
+            snapshot.update(model=name, tier=tier, hedge_delay=self.hedge_delay(name))
+            models.append(snapshot)
+        with self.lock:
+            totals = dict(self.totals)
+            decisions = list(self.decisions)
+        return {"hedging": self.hedging, "models": models, "totals": totals, "decisions": decisions}
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_router():
+    """Return the process-wide router for LLM_MODELS, creating it on first use."""
+    global _router
+    if _router is None:
+        with _router_lock:
+            if _router is None:
+                _router = ModelRouter(parse_models(LLM_MODELS))
+                logging.info(f"Routing LLM calls across {', '.join(name for name, _ in _router.models)}")
+    return _router
+
+
+def set_router(router):
+    """Replace the process-wide router, e.g. with one for stub models in scripts."""
+    global _router
+    with _router_lock:
+        _router = router
@@ -0,0 +1,315 @@
+"""
+In-process instrumentation exported in the Prometheus text format.
+
+``init_app`` times every request by route template, counts the SQL
+statements each request runs (through SQLAlchemy engine events) and serves
+everything at ``/metrics``. ``openai_service`` reports LLM call latency and
+token usage through ``observe_llm_call``. Metrics are kept per process;
+scrape every worker, or run one worker per scrape target.
+
+Setting PROFILE_SLOW_REQUESTS_MS turns on a sampling profiler: stacks of
+threads serving requests are sampled every PROFILE_INTERVAL_MS, and requests
+slower than the threshold get their samples written to PROFILE_DIR in the
+folded format that flamegraph.pl and speedscope read.
+"""
+import os
+import sys
+import time
+import logging
+import threading
+import collections
+from bisect import bisect_left
+from datetime import datetime
+
+from flask import Response, g, request, abort
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "1") != "0"
+# /metrics answers 404 unless METRICS_TOKEN is set, in which case it requires
+# "Authorization: Bearer <token>", or METRICS_PUBLIC=1 opens it to anyone
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN")
+METRICS_PUBLIC = os.environ.get("METRICS_PUBLIC", "0") == "1"
+
+PROFILE_SLOW_REQUESTS_MS = float(os.environ.get("PROFILE_SLOW_REQUESTS_MS", "0"))
+PROFILE_INTERVAL_MS = float(os.environ.get("PROFILE_INTERVAL_MS", "5"))
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "profiles")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+LLM_LATENCY_BUCKETS = (0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 40.0, 80.0)
+
+
+def _label_text(names, values):
+    if not names:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for value in values)
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(names, escaped)) + "}"
+
+
+class Counter:
+    """Monotonic counter with optional labels."""
+
+    kind = "counter"
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1, *label_values):
+        with self.lock:
+            self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def samples(self):
+        with self.lock:
+            items = sorted(self.values.items())
+        for label_values, value in items:
+            yield f"{self.name}{_label_text(self.labels, label_values)} {value}"
+
+
+class Histogram:
+    """Cumulative-bucket histogram with optional labels."""
+
+    kind = "histogram"
+
+    def __init__(self, name, help, buckets, labels=()):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self.labels = tuple(labels)
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        position = bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(label_values)
+            if series is None:
+                series = self.series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][position] += 1
+            series[1] += value
+            series[2] += 1
+
+    def samples(self):
+        with self.lock:
+            items = sorted((labels, (list(counts), total, count)) for labels, (counts, total, count) in self.series.items())
+        for label_values, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += bucket_count
+                labels = _label_text(self.labels + ("le",), label_values + (bound,))
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _label_text(self.labels, label_values)
+            yield f"{self.name}_sum{labels} {total}"
+            yield f"{self.name}_count{labels} {count}"
+
+
+REGISTRY = []
+
+
+def _register(metric):
+    REGISTRY.append(metric)
+    return metric
+
+
+http_request_duration = _register(Histogram(
+    "http_request_duration_seconds", "Request latency by route template.",
+    LATENCY_BUCKETS, labels=("method", "route", "status")))
+http_request_queries = _register(Histogram(
+    "http_request_sql_queries", "SQL statements executed per request.",
+    QUERY_COUNT_BUCKETS, labels=("route",)))
+http_request_sql_duration = _register(Histogram(
+    "http_request_sql_seconds", "Time spent in SQL statements per request.",
+    LATENCY_BUCKETS, labels=("route",)))
+db_queries = _register(Counter(
+    "db_queries_total", "SQL statements executed, in and out of requests."))
+db_query_duration = _register(Histogram(
+    "db_query_duration_seconds", "Latency of single SQL statements.", LATENCY_BUCKETS))
+llm_call_duration = _register(Histogram(
+    "llm_call_duration_seconds", "Latency of LLM calls that reached the backend.",
+    LLM_LATENCY_BUCKETS, labels=("model", "kind", "outcome")))
+llm_tokens = _register(Counter(
+    "llm_tokens_total", "Tokens reported by the LLM backend.", labels=("model", "type")))
+llm_cache_hits = _register(Counter(
+    "llm_cache_hits_total", "LLM requests answered from the response cache.", labels=("model",)))
+fragment_cache_lookups = _register(Counter(
+    "fragment_cache_lookups_total", "Rendered-fragment cache lookups.", labels=("result",)))
+slow_request_profiles = _register(Counter(
+    "slow_request_profiles_total", "Slow requests whose sampled stacks were written to disk.", labels=("route",)))
+
+
+def render():
+    """Return every metric in the Prometheus text exposition format."""
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.samples())
+    return "\n".join(lines) + "\n"
+
+
+def observe_llm_call(model, seconds, usage=None, kind="chat", failed=False):
+    """Record one LLM backend call and the token usage from its response body."""
+    if not METRICS_ENABLED:
+        return
+    llm_call_duration.observe(seconds, model, kind, "error" if failed else "ok")
+    for token_type in ("prompt_tokens", "completion_tokens"):
+        if usage and usage.get(token_type):
+            llm_tokens.inc(usage[token_type], model, token_type.split("_")[0])
+
+
+def observe_llm_cache_hit(model):
+    if METRICS_ENABLED:
+        llm_cache_hits.inc(1, model)
+
+
+def observe_fragment_lookup(hit):
+    if METRICS_ENABLED:
+        fragment_cache_lookups.inc(1, "hit" if hit else "miss")
+
+
+class SamplingProfiler:
+    """Samples the stacks of registered threads from a background thread.
+
+    Each sample is a folded stack ("outer;inner;leaf") and samples are
+    counted per thread until ``stop`` returns them.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.active = {}
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def start(self, thread_id):
+        with self.lock:
+            self.active[thread_id] = collections.Counter()
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+                self.thread.start()
+
+    def stop(self, thread_id):
+        with self.lock:
+            return self.active.pop(thread_id, collections.Counter())
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self.lock:
+                if not self.active:
+                    continue
+                frames = sys._current_frames()
+                for thread_id, samples in self.active.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        samples[_fold(frame)] += 1
+
+
+def _fold(frame):
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(stack))
+
+
+_profiler = None
+
+
+def _write_profile(route, seconds, samples):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    slug = "".join(ch if ch.isalnum() else "_" for ch in route).strip("_") or "root"
+    path = os.path.join(PROFILE_DIR, f"{datetime.utcnow():%Y%m%dT%H%M%S%f}-{slug}-{seconds * 1000:.0f}ms.folded")
+    with open(path, "w") as output:
+        for stack, count in samples.most_common():
+            output.write(f"{stack} {count}\n")
+    slow_request_profiles.inc(1, route)
+    logging.warning(f"Slow request {route} took {seconds * 1000:.0f}ms; stacks written to {path}")
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get("query_started")
+    if not started or not METRICS_ENABLED:
+        if started:
+            started.pop()
+        return
+    elapsed = time.perf_counter() - started.pop()
+    db_queries.inc()
+    db_query_duration.observe(elapsed)
+    # Engine events fire on the thread that runs the statement, i.e. the request's own thread
+    stats = getattr(_request_sql, "stats", None)
+    if stats is not None:
+        stats[0] += 1
+        stats[1] += elapsed
+
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(context):
+    started = context.connection.info.get("query_started") if context.connection is not None else None
+    if started:
+        started.pop()
+
+
+_request_sql = threading.local()
+
+
+def init_app(app):
+    """Instrument requests of ``app`` and add the ``/metrics`` route."""
+    global _profiler
+    if not METRICS_ENABLED:
+        return
+    if PROFILE_SLOW_REQUESTS_MS > 0 and _profiler is None:
+        _profiler = SamplingProfiler(PROFILE_INTERVAL_MS / 1000)
+
+    @app.before_request
+    def start_request_timer():
+        g.metrics_started = time.perf_counter()
+        _request_sql.stats = [0, 0.0]
+        if _profiler is not None:
+            _profiler.start(threading.get_ident())
+
+    @app.after_request
+    def record_request_metrics(response):
+        started = g.pop("metrics_started", None)
+        if started is None:
+            return response
+        elapsed = time.perf_counter() - started
+        route = request.url_rule.rule if request.url_rule is not None else "<unmatched>"
+        http_request_duration.observe(elapsed, request.method, route, response.status_code)
+
+        stats = getattr(_request_sql, "stats", None)
+        _request_sql.stats = None
+        if stats is not None:
+            http_request_queries.observe(stats[0], route)
+            http_request_sql_duration.observe(stats[1], route)
+
+        if _profiler is not None:
+            samples = _profiler.stop(threading.get_ident())
+            if elapsed * 1000 >= PROFILE_SLOW_REQUESTS_MS and samples:
+                _write_profile(f"{request.method} {route}", elapsed, samples)
+        return response
+
+    @app.teardown_request
+    def discard_request_metrics(exc):
+        # after_request is skipped when a view raises; don't leak per-thread state
+        _request_sql.stats = None
+        if _profiler is not None:
+            _profiler.stop(threading.get_ident())
+
+    @app.route('/metrics')
+    def metrics():
+        if not METRICS_TOKEN and not METRICS_PUBLIC:
+            abort(404)
+        if METRICS_TOKEN and request.headers.get("Authorization") != f"Bearer {METRICS_TOKEN}":
+            abort(401)
+        return Response(render(), mimetype="text/plain; version=0.0.4")
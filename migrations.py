@@ -0,0 +1,153 @@
+"""
+Schema migrations applied on top of ``db.create_all()``.
+
+``create_all`` only creates missing tables, so changes to existing tables
+(new indexes, new columns) are written here as numbered steps. Applied
+versions are recorded in the ``schema_migrations`` table. Every step must
+be safe to run against a database that ``create_all`` just built from the
+current models, because fresh databases get the full schema up front.
+
+Every gunicorn worker may bootstrap at once, so schema changes run under
+``schema_lock``: a transaction-scoped advisory lock on PostgreSQL and a
+``BEGIN IMMEDIATE`` write lock on SQLite. Each step re-reads the applied
+versions after taking the lock, so a worker that waited skips the steps
+another worker applied meanwhile.
+"""
+import os
+import logging
+from contextlib import contextmanager
+from datetime import datetime
+
+from sqlalchemy import inspect, text
+
+from app import db
+
+MIGRATIONS = []
+
+# Advisory lock id shared by every process migrating the same PostgreSQL database
+MIGRATION_LOCK_KEY = 7314520911
+# Seconds a SQLite process waits for another one's migration to finish
+MIGRATION_LOCK_TIMEOUT = float(os.environ.get("MIGRATION_LOCK_TIMEOUT", "300"))
+
+
+def migration(version, description):
+    """Register a migration step; steps run in ascending version order."""
+    def register(func):
+        MIGRATIONS.append((version, description, func))
+        MIGRATIONS.sort(key=lambda step: step[0])
+        return func
+    return register
+
+
+def create_indexes(conn, model):
+    """Create every index declared on a model that the database lacks."""
+    for index in model.__table__.indexes:
+        index.create(conn, checkfirst=True)
+
+
+def add_column(conn, table, name, ddl):
+    """Add a column unless it already exists, e.g. ``add_column(conn, 'question', 'x', 'INTEGER')``."""
+    columns = {column['name'] for column in inspect(conn).get_columns(table)}
+    if name not in columns:
+        conn.execute(text(f'ALTER TABLE "{table}" ADD COLUMN {name} {ddl}'))
+
+
+@migration(1, "Indexes for question claiming, per-topic counts and assignment lookups")
+def add_hot_path_indexes(conn):
+    from models import Question, QuestionAssignment, Job
+    for model in (Question, QuestionAssignment, Job):
+        create_indexes(conn, model)
+
+
+@migration(2, "Quality verdict and feedback on questions")
+def add_question_quality(conn):
+    add_column(conn, 'question', 'quality_status', "VARCHAR(20) NOT NULL DEFAULT 'pending'")
+    add_column(conn, 'question', 'quality_feedback', 'TEXT')
+
+
+@migration(3, "Session version on users")
+def add_user_session_version(conn):
+    add_column(conn, 'user', 'session_version', 'INTEGER NOT NULL DEFAULT 1')
+
+
+@migration(4, "Pool refill settings on topics and the single-flight refill index")
+def add_pool_refill(conn):
+    from models import Job
+    add_column(conn, 'topic', 'pool_low_watermark', 'INTEGER')
+    add_column(conn, 'topic', 'pool_target_size', 'INTEGER')
+    create_indexes(conn, Job)
+
+
+@migration(5, "Soft delete for topics")
+def add_topic_deleted_at(conn):
+    add_column(conn, 'topic', 'deleted_at', 'TIMESTAMP')
+
+
+@migration(6, "One (topic, assigned, id) index for claiming and pool counts")
+def replace_question_pool_indexes(conn):
+    from models import Question
+    # The partial index never matched the claim queries, which also exclude rejected questions
+    for name in ('ix_question_topic_unassigned', 'ix_question_topic_assigned'):
+        conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+    create_indexes(conn, Question)
+
+
+def applied_versions(conn):
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        " version INTEGER PRIMARY KEY,"
+        " description VARCHAR(200) NOT NULL,"
+        " applied_at TIMESTAMP NOT NULL)"
+    ))
+    return set(conn.execute(text("SELECT version FROM schema_migrations")).scalars())
+
+
+@contextmanager
+def schema_lock(engine=None):
+    """Yield a connection in a transaction that holds the cross-process schema lock.
+
+    Other dialects get a plain transaction.
+    """
+    engine = engine or db.engine
+    if engine.dialect.name != 'sqlite':
+        with engine.begin() as conn:
+            if engine.dialect.name == 'postgresql':
+                conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": MIGRATION_LOCK_KEY})
+            yield conn
+        return
+
+    # pysqlite opens deferred transactions itself; take over so the write lock is held from the start
+    with engine.connect() as conn:
+        conn.execution_options(isolation_level="AUTOCOMMIT")
+        conn.exec_driver_sql(f"PRAGMA busy_timeout = {int(MIGRATION_LOCK_TIMEOUT * 1000)}")
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.exec_driver_sql("ROLLBACK")
+            raise
+        conn.exec_driver_sql("COMMIT")
+
+
+def upgrade(engine=None):
+    """Apply pending migrations, each in its own transaction. Returns the versions applied."""
+    engine = engine or db.engine
+    with schema_lock(engine) as conn:
+        done = applied_versions(conn)
+
+    applied = []
+    for version, description, func in MIGRATIONS:
+        if version in done:
+            continue
+        with schema_lock(engine) as conn:
+            # Another process may have applied it while this one waited for the lock
+            if version in applied_versions(conn):
+                continue
+            func(conn)
+            conn.execute(
+                text("INSERT INTO schema_migrations (version, description, applied_at) VALUES (:v, :d, :t)"),
+                {"v": version, "d": description, "t": datetime.utcnow()}
+            )
+        logging.info(f"Applied migration {version}: {description}")
+        applied.append(version)
+    return applied
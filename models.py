@@ -7,6 +7,8 @@ class User(db.Model):
     email = db.Column(db.String(120), unique=True, nullable=False)
     password_hash = db.Column(db.String(256), nullable=False)
     role = db.Column(db.String(20), nullable=False, default='student')  # 'admin' or 'student'
+    # Bumped to sign the user out everywhere, e.g. when their role changes
+    session_version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     # Relationship to question assignments
@@ -20,9 +22,22 @@ class Topic(db.Model):
     category = db.Column(db.String(50), nullable=False)
     created_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Automatic refill: below low_watermark unassigned questions, generate up to target_size (None = defaults)
+    pool_low_watermark = db.Column(db.Integer)
+    pool_target_size = db.Column(db.Integer)
+    # Set when the topic is deleted; its rows are purged in the background afterwards
+    deleted_at = db.Column(db.DateTime)
     
     # Relationship to questions
     questions = db.relationship('Question', backref='topic', lazy=True)
+    
+    @classmethod
+    def get_active_or_404(cls, topic_id):
+        """Return a topic that is not deleted, or abort with 404."""
+        return cls.query.filter_by(id=topic_id, deleted_at=None).first_or_404()
+
+# Quality statuses that keep a question out of claims: waiting for its review, or failed it
+UNCLAIMABLE_STATUSES = ('reviewing', 'rejected')
 
 class Question(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -32,10 +47,20 @@ class Question(db.Model):
     difficulty = db.Column(db.String(20), nullable=False)
     variation_number = db.Column(db.Integer, nullable=False)  # For tracking variations
     is_assigned = db.Column(db.Boolean, default=False)
+    quality_status = db.Column(db.String(20), nullable=False, default='pending', server_default='pending')  # 'pending', 'reviewing', 'approved', 'rejected'
+    quality_feedback = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     # Relationship to assignments
     assignments = db.relationship('QuestionAssignment', backref='question', lazy=True)
+    
+    __table_args__ = (
+        # Claiming walks a topic's unassigned questions in id order from a random pivot;
+        # also serves the per-topic assigned/unassigned counts
+        db.Index('ix_question_topic_pool', 'topic_id', 'is_assigned', 'id'),
+        # The next variation number
+        db.Index('ix_question_topic_variation', 'topic_id', 'variation_number'),
+    )
 
 class QuestionAssignment(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -45,5 +70,31 @@ class QuestionAssignment(db.Model):
     assigned_at = db.Column(db.DateTime, default=datetime.utcnow)
     completed = db.Column(db.Boolean, default=False)
     
-    # Ensure unique assignment per user per topic
-    __table_args__ = (db.UniqueConstraint('user_id', 'topic_id', name='unique_user_topic_assignment'),)
+    # Ensure unique assignment per user per topic. Its index also serves lookups by user_id.
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'topic_id', name='unique_user_topic_assignment'),
+        db.Index('ix_question_assignment_topic_completed', 'topic_id', 'completed'),
+        db.Index('ix_question_assignment_question', 'question_id'),
+    )
+
+class Job(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(30), nullable=False)  # 'generate', 'import', 'refill', 'purge'
+    topic_id = db.Column(db.Integer, nullable=False)  # No FK: job history outlives deleted topics
+    status = db.Column(db.String(20), nullable=False, default='queued')  # 'queued', 'running', 'succeeded', 'failed'
+    params = db.Column(db.Text)  # JSON-encoded job arguments
+    total = db.Column(db.Integer, default=0)
+    progress = db.Column(db.Integer, default=0)
+    message = db.Column(db.Text)
+    created_by = db.Column(db.Integer, db.ForeignKey('user.id'))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    
+    __table_args__ = (
+        db.Index('ix_job_topic_status', 'topic_id', 'status'),
+        # Single flight: at most one queued or running refill per topic, across processes
+        db.Index('ux_job_active_refill', 'topic_id', unique=True,
+                 postgresql_where=db.text("kind = 'refill' AND status IN ('queued', 'running')"),
+                 sqlite_where=db.text("kind = 'refill' AND status IN ('queued', 'running')")),
+    )
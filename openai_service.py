@@ -1,22 +1,351 @@
 import json
 import os
+import time
+import random
 import logging
+import threading
+from collections import deque
+from email.utils import parsedate_to_datetime
 import requests
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from llm_cache import get_cache, make_key
+from llm_router import TIERS, get_router
+from metrics import observe_llm_call, observe_llm_cache_hit
+
+# Which backend serves chat completions: "openrouter", or "fake" for offline development and load tests
+LLM_BACKEND = os.environ.get("LLM_BACKEND", "openrouter")
 
 # Load API key from environment variable
 OPENROUTER_API_KEY = os.environ.get("OPENROUTER_API_KEY")
-OPENROUTER_URL = "https://openrouter.ai/api/v1/chat/completions"
+OPENROUTER_URL = os.environ.get("OPENROUTER_URL", "https://openrouter.ai/api/v1/chat/completions")
 
-if not OPENROUTER_API_KEY:
-    raise Exception("OPENROUTER_API_KEY is not set in environment variables.")
+# HTTP client tuning: connect/read timeouts in seconds, retry budget and backoff
+OPENROUTER_CONNECT_TIMEOUT = float(os.environ.get("OPENROUTER_CONNECT_TIMEOUT", "5"))
+OPENROUTER_READ_TIMEOUT = float(os.environ.get("OPENROUTER_READ_TIMEOUT", "120"))
+OPENROUTER_MAX_RETRIES = int(os.environ.get("OPENROUTER_MAX_RETRIES", "4"))
+OPENROUTER_BACKOFF_BASE = float(os.environ.get("OPENROUTER_BACKOFF_BASE", "0.5"))
+OPENROUTER_BACKOFF_MAX = float(os.environ.get("OPENROUTER_BACKOFF_MAX", "30"))
+OPENROUTER_POOL_SIZE = int(os.environ.get("OPENROUTER_POOL_SIZE", "16"))
 
-def call_openrouter(model, messages, max_tokens=1000, temperature=0.7, response_format=None):
-    """Send a chat completion request to OpenRouter API."""
-    headers = {
-        "Authorization": f"Bearer {OPENROUTER_API_KEY}",
-        "Content-Type": "application/json"
-    }
+# Large variation requests are split into batches of this size and run concurrently
+GENERATION_BATCH_SIZE = int(os.environ.get("GENERATION_BATCH_SIZE", "10"))
+GENERATION_MAX_CONCURRENCY = int(os.environ.get("GENERATION_MAX_CONCURRENCY", "8"))
+# Output tokens asked for in one generation request; keep it within the models' limits
+GENERATION_MAX_TOKENS = int(os.environ.get("GENERATION_MAX_TOKENS", "4000"))
+
+# Quality validation packs this many questions into one evaluation prompt
+VALIDATION_BATCH_SIZE = int(os.environ.get("VALIDATION_BATCH_SIZE", "20"))
+
+# Quality tiers (see llm_router) requested for generating and for reviewing questions
+GENERATION_TIER = os.environ.get("GENERATION_TIER", "high")
+VALIDATION_TIER = os.environ.get("VALIDATION_TIER", "standard")
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+class OpenRouterError(Exception):
+    """Raised when OpenRouter returns an error after all retries."""
+
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+class CircuitOpenError(OpenRouterError):
+    """Raised without calling OpenRouter while the circuit breaker is open."""
+
+class CircuitBreaker:
+    """Stop calling a failing upstream for a cool-down period.
+
+    After ``failure_threshold`` consecutive failed calls the breaker opens and
+    rejects calls for ``reset_timeout`` seconds. It then lets a single trial
+    call through (half-open); success closes it, failure opens it again.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+        self.lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self.lock:
+            return self._state()
+
+    def _state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return 'half-open'
+        return 'open'
+
+    def before_call(self):
+        with self.lock:
+            state = self._state()
+            if state == 'open' or (state == 'half-open' and self.trial_in_flight):
+                raise CircuitOpenError("OpenRouter circuit breaker is open; skipping call")
+            if state == 'half-open':
+                self.trial_in_flight = True
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_in_flight = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.trial_in_flight or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self.trial_in_flight = False
+
+class LLMBackend:
+    """Interface of the chat completion backends returned by ``get_client``.
+
+    ``post`` takes an OpenAI-style chat completion payload and returns the
+    decoded response body; ``stream`` yields ``(content, finish_reason)``
+    deltas for the same payload. Both raise OpenRouterError on failure.
+    """
+
+    def post(self, payload):
+        raise NotImplementedError
+
+    def stream(self, payload):
+        raise NotImplementedError
+
+    def stats(self):
+        """Return call totals and recent latencies for the admin pages."""
+        raise NotImplementedError
+
+class OpenRouterClient(LLMBackend):
+    """Shared, keep-alive HTTP client for the chat completions endpoint.
+
+    Connections are pooled in one ``requests.Session``. Calls get a
+    connect/read timeout, retries with jittered exponential backoff on
+    429/5xx and network errors (honoring ``Retry-After``), and a circuit
+    breaker per model, so one failing model does not stop calls to the
+    others. The latency and retry count of recent calls are kept in
+    ``recent_calls``.
+    """
+
+    def __init__(self, api_key, url, timeout=None, max_retries=None, backoff_base=None,
+                 backoff_max=None, pool_size=None, breaker_factory=CircuitBreaker, history=200):
+        self.api_key = api_key
+        self.url = url
+        self.timeout = timeout or (OPENROUTER_CONNECT_TIMEOUT, OPENROUTER_READ_TIMEOUT)
+        self.max_retries = OPENROUTER_MAX_RETRIES if max_retries is None else max_retries
+        self.backoff_base = OPENROUTER_BACKOFF_BASE if backoff_base is None else backoff_base
+        self.backoff_max = OPENROUTER_BACKOFF_MAX if backoff_max is None else backoff_max
+        self.breaker_factory = breaker_factory
+        self.breakers = {}
+        self.recent_calls = deque(maxlen=history)
+        self.totals = {"calls": 0, "failures": 0, "retries": 0}
+        self.lock = threading.Lock()
+
+        pool_size = pool_size or OPENROUTER_POOL_SIZE
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json"
+        })
+
+    def breaker(self, model):
+        with self.lock:
+            if model not in self.breakers:
+                self.breakers[model] = self.breaker_factory()
+            return self.breakers[model]
+
+    def retry_delay(self, attempt, response=None):
+        """Seconds to wait before retry number ``attempt`` (1-based)."""
+        if response is not None:
+            retry_after = response.headers.get("Retry-After")
+            if retry_after:
+                try:
+                    return min(float(retry_after), self.backoff_max)
+                except ValueError:
+                    try:
+                        delay = parsedate_to_datetime(retry_after).timestamp() - time.time()
+                        return min(max(delay, 0.0), self.backoff_max)
+                    except (TypeError, ValueError):
+                        pass
+        # Full jitter keeps concurrent batches from retrying in lockstep
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** (attempt - 1))))
+
+    def _send(self, payload, call, stream=False):
+        """POST with retries and return the first 200 response."""
+        while True:
+            response = None
+            error = None
+            try:
+                response = self.session.post(self.url, json=payload, timeout=self.timeout, stream=stream)
+                call["status"] = response.status_code
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = e
+                call["status"] = None
+
+            if response is not None and response.status_code == 200:
+                return response
+
+            retryable = error is not None or call["status"] in RETRYABLE_STATUS_CODES
+            if not retryable or call["retries"] >= self.max_retries:
+                if error is not None:
+                    raise OpenRouterError(f"OpenRouter request failed: {error}")
+                logging.error(f"OpenRouter API error: {response.text}")
+                response.close()
+                raise OpenRouterError(f"OpenRouter API returned status {call['status']}", status_code=call["status"])
 
+            call["retries"] += 1
+            delay = self.retry_delay(call["retries"], response)
+            if response is not None:
+                response.close()
+            logging.warning(f"OpenRouter call failed ({error or call['status']}); retry {call['retries']}/{self.max_retries} in {delay:.2f}s")
+            time.sleep(delay)
+
+    @staticmethod
+    def _settle(breaker, error):
+        """Report a failed call to the breaker if the upstream is at fault.
+
+        Transport errors, 429 and 5xx count as failures. Other errors (a 4xx
+        for a bad request, a malformed body) mean the upstream answered, so
+        they do not open the breaker for a healthy model.
+        """
+        status = getattr(error, "status_code", None)
+        if isinstance(error, OpenRouterError) and status is not None and status not in RETRYABLE_STATUS_CODES:
+            breaker.record_success()
+        else:
+            breaker.record_failure()
+
+    def _record(self, call, started, failed=False):
+        call["latency"] = time.monotonic() - started
+        with self.lock:
+            self.totals["calls"] += 1
+            self.totals["retries"] += call["retries"]
+            if failed:
+                self.totals["failures"] += 1
+            self.recent_calls.append(call)
+
+    def post(self, payload):
+        """POST a chat completion payload and return the decoded JSON body."""
+        breaker = self.breaker(payload.get("model"))
+        breaker.before_call()
+
+        started = time.monotonic()
+        call = {"retries": 0, "status": None, "model": payload.get("model")}
+        try:
+            response = self._send(payload, call)
+            try:
+                body = response.json()
+            except ValueError:
+                raise OpenRouterError("OpenRouter returned a non-JSON body", status_code=call["status"])
+        except Exception as e:
+            self._settle(breaker, e)
+            self._record(call, started, failed=True)
+            raise
+
+        breaker.record_success()
+        self._record(call, started)
+        return body
+
+    def stream(self, payload):
+        """POST a streaming chat completion and yield ``(content, finish_reason)`` deltas.
+
+        Retries only happen before the first byte arrives. If the stream
+        breaks part-way the generator simply stops, so callers keep whatever
+        content they already received.
+        """
+        breaker = self.breaker(payload.get("model"))
+        breaker.before_call()
+
+        started = time.monotonic()
+        call = {"retries": 0, "status": None, "stream": True, "model": payload.get("model")}
+        try:
+            response = self._send(dict(payload, stream=True), call, stream=True)
+        except Exception as e:
+            self._settle(breaker, e)
+            self._record(call, started, failed=True)
+            raise
+
+        breaker.record_success()
+        response.encoding = "utf-8"
+        try:
+            for line in response.iter_lines(decode_unicode=True):
+                # Blank lines separate events; lines starting with ':' are keep-alive comments
+                if not line or not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    break
+                try:
+                    chunk = json.loads(data)
+                except ValueError:
+                    continue
+                choice = (chunk.get("choices") or [{}])[0]
+                content = (choice.get("delta") or {}).get("content") or ""
+                if content or choice.get("finish_reason"):
+                    yield content, choice.get("finish_reason")
+        except requests.RequestException as e:
+            logging.warning(f"OpenRouter stream interrupted: {e}")
+        finally:
+            response.close()
+            self._record(call, started)
+
+    def stats(self):
+        """Return call totals, recent latencies and the worst breaker state."""
+        with self.lock:
+            recent = list(self.recent_calls)
+            totals = dict(self.totals)
+            breakers = list(self.breakers.values())
+        latencies = sorted(call["latency"] for call in recent)
+        states = {breaker.state for breaker in breakers}
+        totals["breaker"] = next((state for state in ('open', 'half-open') if state in states), 'closed')
+        totals["recent_calls"] = recent
+        totals["p50_latency"] = latencies[len(latencies) // 2] if latencies else None
+        return totals
+
+def _openrouter_backend():
+    if not OPENROUTER_API_KEY:
+        raise OpenRouterError("OPENROUTER_API_KEY is not set in environment variables.")
+    return OpenRouterClient(OPENROUTER_API_KEY, OPENROUTER_URL)
+
+def _fake_backend():
+    from fake_llm import FakeLLMBackend
+    return FakeLLMBackend()
+
+# Backend factories selectable with LLM_BACKEND
+LLM_BACKENDS = {
+    "openrouter": _openrouter_backend,
+    "fake": _fake_backend,
+}
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_client():
+    """Return the process-wide LLM backend, creating it on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                if LLM_BACKEND not in LLM_BACKENDS:
+                    raise OpenRouterError(f"Unknown LLM_BACKEND {LLM_BACKEND!r}; choose one of {', '.join(LLM_BACKENDS)}")
+                _client = LLM_BACKENDS[LLM_BACKEND]()
+                logging.info(f"Using the {LLM_BACKEND} LLM backend")
+    return _client
+
+def set_client(backend):
+    """Replace the process-wide LLM backend, e.g. with a FakeLLMBackend in scripts."""
+    global _client
+    with _client_lock:
+        _client = backend
+
+def build_payload(model, messages, max_tokens=1000, temperature=0.7, response_format=None):
+    """Build the chat completion request body."""
     payload = {
         "model": model,
         "messages": messages,
@@ -28,25 +357,206 @@ def call_openrouter(model, messages, max_tokens=1000, temperature=0.7, response_
     if response_format:
         payload["response_format"] = response_format
 
-    response = requests.post(OPENROUTER_URL, headers=headers, json=payload)
+    return payload
+
+def _post(payload):
+    started = time.monotonic()
+    try:
+        result = get_client().post(payload)
+    except Exception:
+        observe_llm_call(payload["model"], time.monotonic() - started, failed=True)
+        raise
+    observe_llm_call(payload["model"], time.monotonic() - started, result.get("usage"))
+    return result
+
+def call_openrouter(model, messages, max_tokens=1000, temperature=0.7, response_format=None, use_cache=True):
+    """Send a chat completion request to OpenRouter API.
+
+    ``model`` is an OpenRouter model id, or a quality tier from
+    ``llm_router.TIERS``; a tier is served by the model router, which picks
+    and hedges between the models in LLM_MODELS. Responses are cached by a
+    hash of the full payload, with the tier standing in for the model; pass
+    ``use_cache=False`` to force a fresh call (the result is still stored).
+    """
+    payload = build_payload(model, messages, max_tokens, temperature, response_format)
+
+    cache = get_cache()
+    key = make_key("chat", **payload)
+    if cache is not None and use_cache:
+        cached = cache.get(key)
+        if cached is not None:
+            observe_llm_cache_hit(model)
+            return cached
+
+    if model in TIERS:
+        result = get_router().call(model, lambda chosen: _post(dict(payload, model=chosen)))
+    else:
+        result = _post(payload)
+
+    if cache is not None:
+        cache.set(key, result)
+    return result
+
+def invalidate_cached_response(model, messages, max_tokens=1000, temperature=0.7, response_format=None):
+    """Forget the cached response for a request, e.g. after it failed to parse."""
+    cache = get_cache()
+    if cache is not None:
+        cache.invalidate(make_key("chat", **build_payload(model, messages, max_tokens, temperature, response_format)))
+
+def stream_openrouter(model, messages, max_tokens=1000, temperature=0.7, use_cache=True):
+    """Stream a chat completion, yielding text deltas as they arrive.
+
+    A cached response is replayed as a single delta. A stream that finishes
+    normally is cached under the same key as the non-streaming request.
+    """
+    payload = build_payload(model, messages, max_tokens, temperature)
 
-    if response.status_code != 200:
-        logging.error(f"OpenRouter API error: {response.text}")
-        raise Exception(f"OpenRouter API returned status {response.status_code}")
+    cache = get_cache()
+    key = make_key("chat", **payload)
+    if cache is not None and use_cache:
+        cached = cache.get(key)
+        if cached is not None:
+            observe_llm_cache_hit(model)
+            yield cached["choices"][0]["message"]["content"]
+            return
 
-    return response.json()
+    # Streams are not hedged: the router only picks the model. Their duration
+    # grows with the output, so they count toward the model's error rate but
+    # stay out of the latency profile that ranks models and sets hedge delays.
+    router = get_router() if model in TIERS else None
+    chosen = router.pick(model) if router else model
+
+    parts = []
+    finish_reason = None
+    started = time.monotonic()
+    try:
+        for content, reason in get_client().stream(dict(payload, model=chosen)):
+            parts.append(content)
+            finish_reason = reason or finish_reason
+            if content:
+                yield content
+    except Exception:
+        observe_llm_call(chosen, time.monotonic() - started, kind="stream", failed=True)
+        if router:
+            router.record(chosen, time.monotonic() - started, False)
+        raise
+    observe_llm_call(chosen, time.monotonic() - started, kind="stream")
+    if router:
+        router.record(chosen, None, True)
+
+    if cache is not None and finish_reason == "stop":
+        cache.set(key, {"choices": [{"message": {"content": "".join(parts)}, "finish_reason": finish_reason}]})
+
+class VariationStreamParser:
+    """Incrementally extract variation objects from streamed JSON text.
+
+    Feed arbitrary text chunks; every object that is an element of the
+    top-level ``variations`` array (or of a bare top-level array) is
+    returned as soon as its closing brace arrives. Text before the first
+    bracket, such as a markdown code fence, is ignored.
+    """
+
+    def __init__(self):
+        self.buffer = []
+        self.stack = []
+        self.in_string = False
+        self.escaped = False
+        self.capturing = False
+
+    def feed(self, text):
+        completed = []
+        for ch in text:
+            if self.capturing:
+                self.buffer.append(ch)
+
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif ch == "\\":
+                    self.escaped = True
+                elif ch == '"':
+                    self.in_string = False
+                continue
+
+            if ch == '"':
+                if self.stack:
+                    self.in_string = True
+            elif ch in "{[":
+                if ch == "{" and not self.capturing and self._at_element_level():
+                    self.capturing = True
+                    self.buffer = [ch]
+                self.stack.append(ch)
+            elif ch in "}]" and self.stack:
+                self.stack.pop()
+                if ch == "}" and self.capturing and self._at_element_level():
+                    self.capturing = False
+                    try:
+                        completed.append(json.loads("".join(self.buffer)))
+                    except ValueError:
+                        logging.warning("Skipping malformed variation object in AI stream")
+                    self.buffer = []
+        return completed
+
+    def _at_element_level(self):
+        return self.stack == ["{", "["] or self.stack == ["["]
+
+def stream_question_variations(base_question, topic_name, difficulty, category, num_variations=5, use_cache=True):
+    """Yield variations one by one while the AI response is still streaming.
+
+    Requests larger than GENERATION_BATCH_SIZE are streamed as consecutive
+    batches, each within GENERATION_MAX_TOKENS. If a response is cut off or
+    a batch fails, every variation completed before that is still yielded
+    and the next batch is tried. Raises only when no complete variation
+    arrived at all.
+    """
+    sizes = [GENERATION_BATCH_SIZE] * (num_variations // GENERATION_BATCH_SIZE)
+    if num_variations % GENERATION_BATCH_SIZE:
+        sizes.append(num_variations % GENERATION_BATCH_SIZE)
+    total_batches = len(sizes)
+
+    produced = 0
+    for batch_number, size in enumerate(sizes, start=1):
+        prompt = build_variations_prompt(base_question, topic_name, difficulty, category, size,
+                                         batch_number=batch_number, total_batches=total_batches)
+        messages = [{"role": "system", "content": "You are a lab instructor creating fair question variations."},
+                    {"role": "user", "content": prompt}]
+
+        parser = VariationStreamParser()
+        try:
+            for text in stream_openrouter(GENERATION_TIER, messages,
+                                          max_tokens=min(GENERATION_MAX_TOKENS, max(2000, 200 * size)),
+                                          temperature=0.7, use_cache=use_cache):
+                for variation in parser.feed(text):
+                    if isinstance(variation, dict) and variation.get("question"):
+                        produced += 1
+                        yield variation
+        except Exception as e:
+            if total_batches == 1:
+                raise
+            logging.error(f"Streamed variation batch {batch_number}/{total_batches} failed: {e}")
+
+    if not produced:
+        logging.error("AI stream ended without a complete variation.")
+        raise Exception("Invalid JSON from AI response.")
 
 def generate_question(prompt):
     """Generate a single AI question from a prompt."""
     result = call_openrouter(
-        model="gpt-4",  # or another OpenRouter-supported model
+        model=GENERATION_TIER,
         messages=[{"role": "user", "content": prompt}]
     )
     return result
 
-def generate_question_variations(base_question, topic_name, difficulty, category, num_variations=5):
-    """Generate multiple variations of a lab question."""
-    prompt = f"""
+def build_variations_prompt(base_question, topic_name, difficulty, category, num_variations, batch_number=None, total_batches=None):
+    """Build the prompt asking for a set of question variations."""
+    batch_note = ""
+    if batch_number is not None and total_batches and total_batches > 1:
+        batch_note = f"""
+    This is batch {batch_number} of {total_batches} generated in parallel for the same class.
+    Use scenarios, data values and contexts that another batch is unlikely to choose.
+    """
+
+    return f"""
     You are an expert lab instructor creating variations of laboratory questions.
 
     Topic: {topic_name}
@@ -61,7 +571,7 @@ def generate_question_variations(base_question, topic_name, difficulty, category
     3. Be unique in wording and details
     4. Be suitable for a lab setting
     5. Include a brief expected answer
-
+    {batch_note}
     Respond in JSON format:
     {{
         "variations": [
@@ -70,13 +580,21 @@ def generate_question_variations(base_question, topic_name, difficulty, category
         ]
     }}
     """
+
+def generate_question_variations(base_question, topic_name, difficulty, category, num_variations=5,
+                                 batch_number=None, total_batches=None, use_cache=True):
+    """Generate multiple variations of a lab question."""
+    prompt = build_variations_prompt(base_question, topic_name, difficulty, category, num_variations,
+                                     batch_number=batch_number, total_batches=total_batches)
+    messages = [{"role": "system", "content": "You are a lab instructor creating fair question variations."},
+                {"role": "user", "content": prompt}]
     try:
         result = call_openrouter(
-            model="gpt-4",
-            messages=[{"role": "system", "content": "You are a lab instructor creating fair question variations."},
-                      {"role": "user", "content": prompt}],
+            model=GENERATION_TIER,
+            messages=messages,
             max_tokens=2000,
-            temperature=0.7
+            temperature=0.7,
+            use_cache=use_cache
         )
 
         # Extract the text output
@@ -85,10 +603,88 @@ def generate_question_variations(base_question, topic_name, difficulty, category
 
     except json.JSONDecodeError:
         logging.error("Failed to parse AI JSON output.")
+        invalidate_cached_response(GENERATION_TIER, messages, max_tokens=2000, temperature=0.7)
         raise Exception("Invalid JSON from AI response.")
 
-def validate_question_quality(question_text, topic_name, difficulty):
-    """Validate a generated question for quality using AI."""
+def normalize_question_text(text):
+    """Normalize question text so trivially different copies compare equal."""
+    return " ".join("".join(ch for ch in text.lower() if ch.isalnum() or ch.isspace()).split())
+
+def generate_question_variations_chunked(base_question, topic_name, difficulty, category, num_variations,
+                                         batch_size=None, max_concurrency=None, on_batch=None, use_cache=True):
+    """Generate a large number of variations as concurrent bounded batches.
+
+    Returns a dict with the merged, de-duplicated ``variations`` plus
+    ``failed_batches`` and ``duplicates`` so callers can report partial
+    success. ``on_batch(done_batches, total_batches, variations_so_far)`` is
+    called from the caller's thread after each batch finishes.
+    """
+    batch_size = batch_size or GENERATION_BATCH_SIZE
+    max_concurrency = max_concurrency or GENERATION_MAX_CONCURRENCY
+
+    sizes = [batch_size] * (num_variations // batch_size)
+    if num_variations % batch_size:
+        sizes.append(num_variations % batch_size)
+    total_batches = len(sizes)
+
+    variations = []
+    seen = set()
+    duplicates = 0
+    failed_batches = []
+
+    with ThreadPoolExecutor(max_workers=min(max_concurrency, total_batches) or 1) as pool:
+        futures = {
+            pool.submit(generate_question_variations, base_question, topic_name, difficulty, category,
+                        size, batch_number, total_batches, use_cache): batch_number
+            for batch_number, size in enumerate(sizes, start=1)
+        }
+
+        for done, future in enumerate(as_completed(futures), start=1):
+            batch_number = futures[future]
+            try:
+                batch = future.result()
+            except Exception as e:
+                logging.error(f"Variation batch {batch_number}/{total_batches} failed: {e}")
+                failed_batches.append({"batch": batch_number, "error": str(e)})
+                batch = []
+
+            for variation in batch:
+                question = variation.get("question") if isinstance(variation, dict) else None
+                if not question:
+                    continue
+                key = normalize_question_text(question)
+                if key in seen:
+                    duplicates += 1
+                    continue
+                seen.add(key)
+                variations.append(variation)
+
+            if on_batch:
+                on_batch(done, total_batches, len(variations))
+
+    if failed_batches and not variations:
+        raise Exception(f"All {total_batches} generation batches failed: {failed_batches[0]['error']}")
+
+    return {
+        "variations": variations[:num_variations],
+        "requested": num_variations,
+        "batches": total_batches,
+        "failed_batches": failed_batches,
+        "duplicates": duplicates,
+    }
+
+def validate_question_quality(question_text, topic_name, difficulty, use_cache=True):
+    """Validate a generated question for quality using AI.
+
+    Verdicts are memoized per question text, topic and difficulty.
+    """
+    cache = get_cache()
+    key = make_key("validation", question=question_text, topic=topic_name, difficulty=difficulty)
+    if cache is not None and use_cache:
+        cached = cache.get(key)
+        if cached is not None:
+            return cached["valid"]
+
     prompt = f"""
     Evaluate this lab question for clarity, relevance, and difficulty.
 
@@ -104,15 +700,102 @@ def validate_question_quality(question_text, topic_name, difficulty):
     """
     try:
         result = call_openrouter(
-            model="gpt-4",
+            model=VALIDATION_TIER,
             messages=[{"role": "system", "content": "You are a QA expert for educational content."},
                       {"role": "user", "content": prompt}],
-            max_tokens=500
+            max_tokens=500,
+            use_cache=use_cache
         )
 
         content = result["choices"][0]["message"]["content"]
-        return json.loads(content).get("valid", True)
+        verdict = json.loads(content)
+        valid = verdict.get("valid", True)
 
     except Exception as e:
         logging.error(f"Validation error: {e}")
         return True  # Assume valid if AI validation fails
+
+    if cache is not None:
+        cache.set(key, {"valid": valid, "feedback": verdict.get("feedback", "")})
+    return valid
+
+def _validate_batch(questions, topic_name, difficulty, use_cache=True):
+    numbered = "\n".join(f"    {i}. {text}" for i, text in enumerate(questions, start=1))
+    prompt = f"""
+    Evaluate each of these lab questions for clarity, relevance, and difficulty.
+
+    Topic: {topic_name}
+    Difficulty: {difficulty}
+    Questions:
+{numbered}
+
+    Respond in JSON format with one entry per question, using its number:
+    {{
+        "results": [
+            {{"index": 1, "valid": true/false, "feedback": "brief explanation"}},
+            ...
+        ]
+    }}
+    """
+    result = call_openrouter(
+        model=VALIDATION_TIER,
+        messages=[{"role": "system", "content": "You are a QA expert for educational content."},
+                  {"role": "user", "content": prompt}],
+        max_tokens=min(4000, 200 + 80 * len(questions)),
+        use_cache=use_cache
+    )
+
+    content = result["choices"][0]["message"]["content"]
+    verdicts = {}
+    for entry in json.loads(content).get("results", []):
+        try:
+            verdicts[int(entry["index"])] = {"valid": bool(entry.get("valid", True)),
+                                             "feedback": entry.get("feedback", "")}
+        except (KeyError, TypeError, ValueError):
+            continue
+    return [verdicts.get(i) for i in range(1, len(questions) + 1)]
+
+def validate_questions_batch(questions, topic_name, difficulty, batch_size=None, max_concurrency=None, use_cache=True):
+    """Validate many questions with one evaluation prompt per batch.
+
+    Returns a list aligned with ``questions`` of ``{"valid", "feedback"}``
+    dicts, or None where no verdict could be obtained (failed batch or an
+    entry missing from the reply). Verdicts are memoized per question text
+    and shared with validate_question_quality.
+    """
+    batch_size = batch_size or VALIDATION_BATCH_SIZE
+    max_concurrency = max_concurrency or GENERATION_MAX_CONCURRENCY
+    cache = get_cache()
+
+    verdicts = [None] * len(questions)
+    keys = [make_key("validation", question=text, topic=topic_name, difficulty=difficulty) for text in questions]
+    pending = []
+    for i, key in enumerate(keys):
+        cached = cache.get(key) if cache is not None and use_cache else None
+        if cached is not None:
+            verdicts[i] = {"valid": cached["valid"], "feedback": cached.get("feedback", "")}
+        else:
+            pending.append(i)
+
+    batches = [pending[start:start + batch_size] for start in range(0, len(pending), batch_size)]
+    if not batches:
+        return verdicts
+
+    with ThreadPoolExecutor(max_workers=min(max_concurrency, len(batches))) as pool:
+        futures = {
+            pool.submit(_validate_batch, [questions[i] for i in batch], topic_name, difficulty, use_cache): batch
+            for batch in batches
+        }
+        for future in as_completed(futures):
+            batch = futures[future]
+            try:
+                results = future.result()
+            except Exception as e:
+                logging.error(f"Validation batch of {len(batch)} questions failed: {e}")
+                continue
+            for i, verdict in zip(batch, results):
+                verdicts[i] = verdict
+                if verdict is not None and cache is not None:
+                    cache.set(keys[i], verdict)
+
+    return verdicts
@@ -0,0 +1,32 @@
+from flask import request
+
+from app import db
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def page_size_arg():
+    """Read ``per_page`` from the query string, clamped to a sane range."""
+    per_page = request.args.get('per_page', DEFAULT_PAGE_SIZE, type=int)
+    return max(1, min(per_page or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE))
+
+
+def keyset_page(statement, key_column, after=None, limit=DEFAULT_PAGE_SIZE, descending=False):
+    """Fetch one page of ``statement`` ordered by a unique key column.
+
+    Instead of OFFSET, the page starts right after the key value ``after``
+    (the cursor returned for the previous page), so every page costs the
+    same index range scan however deep it is. Returns ``(rows, next_cursor)``;
+    ``next_cursor`` is None on the last page.
+    """
+    if after is not None:
+        statement = statement.where(key_column < after if descending else key_column > after)
+    statement = statement.order_by(key_column.desc() if descending else key_column).limit(limit + 1)
+
+    rows = db.session.execute(statement).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = rows[-1]._mapping[key_column]
+    return rows, next_cursor
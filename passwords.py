@@ -0,0 +1,147 @@
+import os
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+# Hash method for new and upgraded passwords, in werkzeug's syntax, e.g.
+# "scrypt", "scrypt:65536:8:1" or "pbkdf2:sha256:600000". Stored hashes made
+# with another method are replaced on the user's next successful login.
+PASSWORD_HASH_METHOD = os.environ.get("PASSWORD_HASH_METHOD", "scrypt")
+
+# Password hashing is deliberately CPU-heavy. At most HASH_WORKERS hashes run
+# at once, and at most HASH_QUEUE_LIMIT more may wait; beyond that logins are
+# turned away instead of starving the rest of the app.
+#
+# Sizing: hashlib releases the GIL, so each worker can keep a core busy. A
+# process checks about min(HASH_WORKERS, cores) / hash time logins a second
+# (default scrypt takes ~50-150 ms), and a login at the back of a full queue
+# waits HASH_QUEUE_LIMIT / that rate, which must stay below HASH_TIMEOUT or
+# queued logins fail late instead of being turned away at once. Unless
+# HASH_QUEUE_LIMIT is set, it is derived from the hash time measured at
+# startup so that wait is HASH_QUEUE_FILL of the timeout (half by default,
+# leaving room for hashes slowed by a busy CPU). More workers absorb login
+# bursts (e.g. a class signing in together) but take CPU from other requests
+# while the burst lasts; fewer keep pages fast and turn logins away sooner.
+# The default is half the cores, at least 2, so one slow hash never blocks
+# every login. ``hash_capacity`` reports the numbers for this host.
+HASH_WORKERS = int(os.environ.get("HASH_WORKERS", str(max(2, (os.cpu_count() or 2) // 2))))
+HASH_QUEUE_LIMIT = int(os.environ["HASH_QUEUE_LIMIT"]) if os.environ.get("HASH_QUEUE_LIMIT") else None
+HASH_QUEUE_FILL = float(os.environ.get("HASH_QUEUE_FILL", "0.5"))
+HASH_TIMEOUT = float(os.environ.get("HASH_TIMEOUT", "10"))
+
+
+class HashingBusy(Exception):
+    """Raised when the hash pool is saturated or a hash took too long."""
+
+
+_executor = None
+_slots = None
+_dummy_hash = None
+_current_method = None
+_hash_seconds = None
+_lock = threading.Lock()
+
+
+def _pool():
+    global _executor, _slots
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _slots = threading.BoundedSemaphore(HASH_WORKERS + queue_limit())
+                _executor = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="password-hash")
+    return _executor
+
+
+def _run(func, *args):
+    """Run ``func`` on the hash pool and wait for it, or raise HashingBusy."""
+    executor = _pool()
+    if not _slots.acquire(blocking=False):
+        raise HashingBusy("Too many password checks in progress")
+    try:
+        future = executor.submit(func, *args)
+    except Exception:
+        _slots.release()
+        raise
+    future.add_done_callback(lambda _: _slots.release())
+    try:
+        return future.result(timeout=HASH_TIMEOUT)
+    except TimeoutError:
+        future.cancel()
+        raise HashingBusy("Password check timed out")
+
+
+def hash_method(password_hash):
+    """Return the method prefix of a werkzeug hash, e.g. "scrypt:32768:8:1"."""
+    return password_hash.split("$", 1)[0]
+
+
+def current_method():
+    """Return PASSWORD_HASH_METHOD with werkzeug's defaults filled in."""
+    global _current_method, _dummy_hash, _hash_seconds
+    if _current_method is None:
+        started = time.perf_counter()
+        _dummy_hash = generate_password_hash("not-a-real-password", PASSWORD_HASH_METHOD)
+        _hash_seconds = time.perf_counter() - started
+        _current_method = hash_method(_dummy_hash)
+    return _current_method
+
+
+def _logins_per_second():
+    current_method()
+    return min(HASH_WORKERS, os.cpu_count() or 1) / _hash_seconds
+
+
+def queue_limit():
+    """HASH_QUEUE_LIMIT, or the queue the pool drains within HASH_QUEUE_FILL of HASH_TIMEOUT."""
+    if HASH_QUEUE_LIMIT is not None:
+        return HASH_QUEUE_LIMIT
+    return max(HASH_WORKERS, int(_logins_per_second() * HASH_TIMEOUT * HASH_QUEUE_FILL))
+
+
+def hash_capacity():
+    """Estimate what the pool sustains from the hash time measured at startup."""
+    current_method()
+    rate = _logins_per_second()
+    limit = queue_limit()
+    return {
+        "workers": HASH_WORKERS,
+        "queue_limit": limit,
+        "timeout": HASH_TIMEOUT,
+        "hash_seconds": _hash_seconds,
+        "logins_per_second": rate,
+        "full_queue_wait": limit / rate,
+    }
+
+
+def hash_password(password):
+    """Hash a password with the configured method on the hash pool."""
+    return _run(generate_password_hash, password, PASSWORD_HASH_METHOD)
+
+
+def verify_password(password_hash, password):
+    """Check a password on the hash pool.
+
+    Pass ``password_hash=None`` for an unknown user: a dummy hash is checked
+    instead, so the response time does not reveal whether the user exists.
+    """
+    if password_hash is None:
+        current_method()
+        _run(check_password_hash, _dummy_hash, password)
+        return False
+    return _run(check_password_hash, password_hash, password)
+
+
+def needs_rehash(password_hash):
+    return hash_method(password_hash) != current_method()
+
+
+def upgrade_hash(password):
+    """Return a fresh hash for a password that just verified, or None if the pool is busy."""
+    try:
+        return hash_password(password)
+    except HashingBusy:
+        logging.info("Skipping password rehash; hash pool is busy")
+        return None
@@ -0,0 +1,103 @@
+"""
+Per-student progress map for the student dashboard.
+
+Each student's assignments are kept as ``{topic_id: TopicProgress}`` in an
+in-process cache, loaded with one query on the ``user_id`` index and
+updated in place when the student is assigned a question or completes
+one, so the dashboard answers "has this topic been assigned?" with a dict
+lookup. Bulk writes (roster assignment, topic purge) drop the whole
+cache. Other processes catch up within PROGRESS_CACHE_TTL; a
+student who just changed something carries ``progress_changed_at`` in
+their session, which makes any process with an older map reload it.
+"""
+import os
+import time
+from collections import namedtuple
+
+from flask import has_request_context, session
+from sqlalchemy import select, event
+from sqlalchemy.orm import Session
+
+from app import db
+from cache import TTLCache
+from models import Question, QuestionAssignment
+
+PROGRESS_CACHE_TTL = float(os.environ.get("PROGRESS_CACHE_TTL", "60"))
+PROGRESS_CACHE_SIZE = int(os.environ.get("PROGRESS_CACHE_SIZE", "10000"))
+
+TopicProgress = namedtuple("TopicProgress", "assignment_id completed assigned_at question_text")
+
+# user_id -> (loaded_at, {topic_id: TopicProgress}); maps are replaced, never mutated
+_progress = TTLCache(maxsize=PROGRESS_CACHE_SIZE, ttl=PROGRESS_CACHE_TTL)
+
+
+def load_progress(user_id):
+    rows = db.session.execute(
+        select(
+            QuestionAssignment.topic_id,
+            QuestionAssignment.id,
+            QuestionAssignment.completed,
+            QuestionAssignment.assigned_at,
+            Question.question_text
+        ).join(
+            Question, QuestionAssignment.question_id == Question.id
+        ).where(QuestionAssignment.user_id == user_id).order_by(QuestionAssignment.id)
+    ).all()
+    return {
+        topic_id: TopicProgress(assignment_id, bool(completed), assigned_at, question_text)
+        for topic_id, assignment_id, completed, assigned_at, question_text in rows
+    }
+
+
+def get_progress(user_id):
+    """Return ``{topic_id: TopicProgress}`` for a user's assignments."""
+    changed_at = session.get('progress_changed_at', 0) if has_request_context() else 0
+    entry = _progress.get(user_id)
+    if entry is None or entry[0] < changed_at:
+        # Stamped before the query, so a write racing with the load forces another load
+        entry = (time.time(), load_progress(user_id))
+        _progress.set(user_id, entry)
+    return entry[1]
+
+
+def _update(user_id, topic_id, update):
+    now = time.time()
+    if has_request_context():
+        session['progress_changed_at'] = now
+    entry = _progress.get(user_id)
+    if entry is not None:
+        progress = dict(entry[1])
+        progress[topic_id] = update(progress.get(topic_id))
+        _progress.set(user_id, (now, progress))
+
+
+def _from_assignment(assignment):
+    return TopicProgress(assignment.id, bool(assignment.completed), assignment.assigned_at,
+                         assignment.question.question_text)
+
+
+def record_assignment(assignment):
+    """Add a newly created assignment to its user's cached map."""
+    _update(assignment.user_id, assignment.topic_id, lambda _: _from_assignment(assignment))
+
+
+def record_completion(assignment):
+    def update(current):
+        return current._replace(completed=True) if current else _from_assignment(assignment)
+    _update(assignment.user_id, assignment.topic_id, update)
+
+
+def invalidate_progress(user_id=None):
+    if user_id is None:
+        _progress.clear()
+    else:
+        _progress.delete(user_id)
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _invalidate_after_bulk_write(orm_execute_state):
+    # Roster assignment and purges write assignments with bulk statements
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        mapper = orm_execute_state.bind_mapper
+        if mapper is not None and mapper.class_ is QuestionAssignment:
+            invalidate_progress()
@@ -0,0 +1,125 @@
+import os
+import time
+import logging
+from datetime import datetime
+
+from sqlalchemy import select, delete, update, func
+
+from app import db
+from models import Job, Topic, Question, QuestionAssignment
+
+# Rows deleted per transaction; each chunk holds write locks only briefly
+PURGE_CHUNK_SIZE = int(os.environ.get("PURGE_CHUNK_SIZE", "1000"))
+# Pause between chunks so student requests can take the write lock (matters on SQLite)
+PURGE_PAUSE = float(os.environ.get("PURGE_PAUSE", "0.02"))
+# How long a purge waits for the topic's generate, refill or import jobs to stop
+PURGE_JOB_WAIT = float(os.environ.get("PURGE_JOB_WAIT", "600"))
+
+
+class TopicDeleted(Exception):
+    """Raised by jobs that find their topic deleted while they were still writing to it."""
+
+
+def deleted_topic_ids(topic_ids):
+    """Return the ids among ``topic_ids`` whose topic is soft-deleted or gone."""
+    topic_ids = set(topic_ids)
+    live = db.session.execute(
+        select(Topic.id).where(Topic.id.in_(topic_ids), Topic.deleted_at.is_(None))
+    ).scalars()
+    return topic_ids - set(live)
+
+
+def ensure_topic_active(topic_id):
+    """Raise TopicDeleted if the topic was deleted; call before writing questions to it."""
+    if deleted_topic_ids([topic_id]):
+        raise TopicDeleted(f"Topic {topic_id} was deleted")
+
+
+def active_topic_jobs(topic_id):
+    """Queued or running jobs, other than purges, that may still write to a topic."""
+    from jobs import ACTIVE_STATUSES
+    return Job.query.filter(
+        Job.topic_id == topic_id, Job.kind != 'purge', Job.status.in_(ACTIVE_STATUSES)
+    ).order_by(Job.id).all()
+
+
+def _wait_for_topic_jobs(topic_id):
+    # Writers check deleted_at before each batch, so they stop soon after the soft delete
+    deadline = time.monotonic() + PURGE_JOB_WAIT
+    while True:
+        jobs = active_topic_jobs(topic_id)
+        db.session.commit()
+        if not jobs:
+            return
+        if time.monotonic() > deadline:
+            raise Exception(f"Jobs {', '.join(f'#{job.id}' for job in jobs)} are still writing to topic {topic_id}; "
+                            f"run the purge again once they finish")
+        time.sleep(1)
+
+
+def soft_delete_topic(topic_id):
+    """Hide a topic from every listing at once; returns False if it was already deleted."""
+    hidden = db.session.execute(
+        update(Topic).where(Topic.id == topic_id, Topic.deleted_at.is_(None))
+        .values(deleted_at=datetime.utcnow())
+    ).rowcount
+    db.session.commit()
+    return hidden == 1
+
+
+def count_topic_rows(topic_id):
+    assignments = db.session.query(func.count(QuestionAssignment.id)).filter(QuestionAssignment.topic_id == topic_id).scalar()
+    questions = db.session.query(func.count(Question.id)).filter(Question.topic_id == topic_id).scalar()
+    return assignments + questions
+
+
+def _delete_in_chunks(model, topic_id, chunk_size, on_chunk):
+    deleted = 0
+    while True:
+        ids = db.session.execute(
+            select(model.id).where(model.topic_id == topic_id).order_by(model.id).limit(chunk_size)
+        ).scalars().all()
+        if not ids:
+            return deleted
+        db.session.execute(delete(model).where(model.id.in_(ids)), execution_options={"synchronize_session": False})
+        db.session.commit()
+        deleted += len(ids)
+        on_chunk(len(ids))
+        if PURGE_PAUSE:
+            time.sleep(PURGE_PAUSE)
+
+
+def purge_topic(topic_id, chunk_size=None, on_progress=None):
+    """Delete a topic with its assignments and questions in short transactions.
+
+    The topic must already be soft-deleted. Waits for the topic's other jobs
+    to stop first. Assignments go first because they reference questions,
+    then questions, then the topic row. Every chunk of ``chunk_size`` rows
+    is its own transaction. The job history of the topic is kept.
+    ``on_progress(deleted_rows)`` is called after each chunk. Returns a
+    summary dict.
+    """
+    from similarity import drop_topic_index
+
+    chunk_size = chunk_size or PURGE_CHUNK_SIZE
+    progress = [0]
+
+    def on_chunk(rows):
+        progress[0] += rows
+        if on_progress:
+            on_progress(progress[0])
+
+    _wait_for_topic_jobs(topic_id)
+    assignments = _delete_in_chunks(QuestionAssignment, topic_id, chunk_size, on_chunk)
+    questions = _delete_in_chunks(Question, topic_id, chunk_size, on_chunk)
+
+    # Sweep anything a writer committed after its chunks were deleted, with the topic
+    questions += db.session.execute(
+        delete(Question).where(Question.topic_id == topic_id), execution_options={"synchronize_session": False}
+    ).rowcount
+    db.session.execute(delete(Topic).where(Topic.id == topic_id))
+    db.session.commit()
+    drop_topic_index(topic_id)
+
+    logging.info(f"Purged topic {topic_id}: {assignments} assignments, {questions} questions")
+    return {"assignments": assignments, "questions": questions}
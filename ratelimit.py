@@ -0,0 +1,92 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+
+
+def parse_rate(text):
+    """Parse "N/S" (N requests per S seconds) into ``(capacity, refill_per_second)``."""
+    count, _, seconds = text.partition("/")
+    capacity = float(count)
+    return capacity, capacity / float(seconds or 1)
+
+
+class MemoryBackend:
+    """Token buckets kept in this process.
+
+    Buckets of keys that have not been seen for a while are evicted once
+    more than ``max_keys`` exist. Each worker process limits on its own.
+    """
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self.buckets = OrderedDict()
+        self.lock = threading.Lock()
+
+    def take(self, key, capacity, refill_rate, cost=1):
+        """Take ``cost`` tokens from a bucket; return ``(allowed, retry_after_seconds)``."""
+        now = time.monotonic()
+        with self.lock:
+            tokens, updated = self.buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * refill_rate)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            self.buckets[key] = (tokens, now)
+            self.buckets.move_to_end(key)
+            while len(self.buckets) > self.max_keys:
+                self.buckets.popitem(last=False)
+        retry_after = 0.0 if allowed else (cost - tokens) / refill_rate
+        return allowed, retry_after
+
+    def reset(self, key):
+        with self.lock:
+            self.buckets.pop(key, None)
+
+
+# Backends selectable with RATELIMIT_BACKEND. A shared store (e.g. Redis) can
+# be added here with the same take/reset methods to limit across workers.
+RATELIMIT_BACKENDS = {
+    "memory": MemoryBackend,
+}
+
+RATELIMIT_ENABLED = os.environ.get("RATELIMIT_ENABLED", "1") != "0"
+RATELIMIT_BACKEND = os.environ.get("RATELIMIT_BACKEND", "memory")
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    """Return the process-wide rate limit backend, creating it on first use."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = RATELIMIT_BACKENDS[RATELIMIT_BACKEND]()
+    return _backend
+
+
+def set_backend(backend):
+    global _backend
+    with _backend_lock:
+        _backend = backend
+
+
+class RateLimit:
+    """A named token-bucket limit, e.g. ``RateLimit("login-ip", "60/60")``.
+
+    ``hit(key)`` returns ``(allowed, retry_after_seconds)``.
+    """
+
+    def __init__(self, name, rate):
+        self.name = name
+        self.capacity, self.refill_rate = parse_rate(rate)
+
+    def hit(self, key, cost=1):
+        if not RATELIMIT_ENABLED:
+            return True, 0.0
+        return get_backend().take(f"{self.name}:{key}", self.capacity, self.refill_rate, cost)
+
+    def reset(self, key):
+        get_backend().reset(f"{self.name}:{key}")
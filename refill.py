@@ -0,0 +1,145 @@
+import os
+import json
+import logging
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, func
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from jobs import ACTIVE_STATUSES, submit_job, sweep_stale_jobs
+from models import Job, Question, Topic, UNCLAIMABLE_STATUSES
+
+# Generate more questions once fewer than the low watermark are unassigned,
+# up to the target size. Refills spend LLM calls, so they are opt-in: a topic
+# refills once an admin saves its pool settings, and REFILL_ENABLED=1 turns
+# them on for every topic with the defaults below.
+REFILL_ENABLED = os.environ.get("REFILL_ENABLED", "0") != "0"
+POOL_LOW_WATERMARK = int(os.environ.get("POOL_LOW_WATERMARK", "10"))
+POOL_TARGET_SIZE = int(os.environ.get("POOL_TARGET_SIZE", "30"))
+
+# A refill still queued or running after this long is assumed dead (e.g. its process exited)
+REFILL_STALE_SECONDS = int(os.environ.get("REFILL_STALE_SECONDS", "900"))
+
+# After a refill that added fewer than REFILL_MIN_ADDED assignable questions
+# (near-duplicates, failed reviews, LLM errors), wait this long before the next
+REFILL_COOLDOWN_SECONDS = int(os.environ.get("REFILL_COOLDOWN_SECONDS", "600"))
+REFILL_MIN_ADDED = int(os.environ.get("REFILL_MIN_ADDED", "5"))
+
+
+def pool_settings(topic):
+    """Return ``(low_watermark, target_size)`` for a topic."""
+    low = POOL_LOW_WATERMARK if topic.pool_low_watermark is None else topic.pool_low_watermark
+    target = POOL_TARGET_SIZE if topic.pool_target_size is None else topic.pool_target_size
+    return low, max(target, low)
+
+
+def refill_enabled(topic):
+    """Whether a topic refills: REFILL_ENABLED, or pool settings saved for the topic."""
+    return REFILL_ENABLED or topic.pool_target_size is not None
+
+
+def available_count(topic_id, limit=None):
+    """Count assignable questions of a topic, stopping at ``limit`` if given."""
+    statement = select(Question.id).where(
+        Question.topic_id == topic_id,
+        Question.is_assigned == False,
+        Question.quality_status.notin_(UNCLAIMABLE_STATUSES)
+    )
+    if limit is not None:
+        statement = statement.limit(limit)
+    return db.session.execute(select(func.count()).select_from(statement.subquery())).scalar()
+
+
+def active_refill(topic_id):
+    return Job.query.filter(
+        Job.kind == 'refill', Job.topic_id == topic_id, Job.status.in_(ACTIVE_STATUSES)
+    ).first()
+
+
+def base_question_for(topic_id):
+    """Return the base question of the topic's latest generate job, or its oldest question."""
+    jobs = db.session.execute(
+        select(Job.params).where(Job.kind == 'generate', Job.topic_id == topic_id, Job.status == 'succeeded')
+        .order_by(Job.id.desc()).limit(5)
+    ).scalars()
+    for params in jobs:
+        base_question = json.loads(params or "{}").get('base_question')
+        if base_question:
+            return base_question
+    return db.session.execute(
+        select(Question.question_text).where(Question.topic_id == topic_id).order_by(Question.id).limit(1)
+    ).scalar()
+
+
+def in_cooldown(topic_id):
+    """Whether the topic's last refill finished recently and added too little to try again yet."""
+    now = datetime.utcnow()
+    last = Job.query.filter(
+        Job.kind == 'refill', Job.topic_id == topic_id, Job.status.in_(('succeeded', 'failed')),
+        Job.finished_at > now - timedelta(seconds=REFILL_COOLDOWN_SECONDS)
+    ).order_by(Job.finished_at.desc()).first()
+    if last is None:
+        return False
+    added = db.session.execute(
+        select(func.count(Question.id)).where(
+            Question.topic_id == topic_id,
+            Question.created_at >= (last.started_at or last.created_at),
+            Question.created_at <= last.finished_at,
+            Question.quality_status.notin_(UNCLAIMABLE_STATUSES)
+        )
+    ).scalar()
+    return added < min(REFILL_MIN_ADDED, last.total or REFILL_MIN_ADDED)
+
+
+def maybe_refill(topic_id, force=False):
+    """Start a background refill if a topic's pool is below its low watermark.
+
+    Cheap enough to call after every assignment: one bounded count query,
+    plus an insert only when a refill is due. Concurrent callers in any
+    process are deduplicated by the ``ux_job_active_refill`` unique index.
+    ``force`` tops the pool up to its target even above the watermark, and
+    skips the cooldown after an unproductive refill.
+    Returns the new or already active refill job, or None.
+    """
+    topic = db.session.get(Topic, topic_id)
+    if topic is None or topic.deleted_at is not None or not refill_enabled(topic):
+        return None
+    low, target = pool_settings(topic)
+    if target <= 0:
+        return None
+
+    available = available_count(topic_id, limit=target if force else low)
+    if available >= (target if force else low):
+        return None
+
+    if base_question_for(topic_id) is None:
+        # Nothing to vary yet; run_refill would only fail
+        return None
+
+    existing = active_refill(topic_id)
+    if existing is not None and not sweep_stale_jobs(REFILL_STALE_SECONDS, job_id=existing.id):
+        return existing
+
+    if not force and in_cooldown(topic_id):
+        return None
+
+    try:
+        job = submit_job('refill', topic_id=topic_id, params={}, total=target - available)
+    except IntegrityError:
+        # Another request or process started the refill first
+        db.session.rollback()
+        return active_refill(topic_id)
+
+    logging.info(f"Refilling topic {topic_id}: {available} questions available, target {target}")
+    return job
+
+
+def trigger_refill(topic_id, force=False):
+    """maybe_refill for request paths: failures are logged, never raised."""
+    try:
+        return maybe_refill(topic_id, force)
+    except Exception:
+        db.session.rollback()
+        logging.exception(f"Could not start a refill for topic {topic_id}")
+        return None
@@ -0,0 +1,208 @@
+import os
+import re
+import random
+import hashlib
+import logging
+import threading
+
+from sqlalchemy import select
+
+from app import db
+from models import Question
+
+# Estimated Jaccard similarity (over word 3-gram shingles) above which two questions count as near-duplicates
+DUPLICATE_THRESHOLD = float(os.environ.get("DUPLICATE_THRESHOLD", "0.8"))
+
+# 64 MinHash permutations split into 16 LSH bands of 4 rows. Pairs with a
+# Jaccard similarity of 0.8 share at least one band with ~99.9% probability,
+# while dissimilar pairs rarely become candidates.
+NUM_PERMUTATIONS = 64
+LSH_BANDS = 16
+LSH_ROWS = NUM_PERMUTATIONS // LSH_BANDS
+SHINGLE_SIZE = 3
+
+# Upper bound on signature comparisons per lookup
+MAX_CANDIDATES = 256
+
+_MASK64 = (1 << 64) - 1
+_rng = random.Random(1729)  # Fixed seed: signatures must be comparable across processes
+# Multiply-shift hashing: h(x) = ((a * x + b) mod 2**64) >> 32 with odd a
+_PERMUTATIONS = [
+    (_rng.getrandbits(64) | 1, _rng.getrandbits(64))
+    for _ in range(NUM_PERMUTATIONS)
+]
+
+try:
+    import numpy
+except ImportError:  # NumPy only speeds up signatures; results are identical without it
+    numpy = None
+else:
+    _A = numpy.array([a for a, _ in _PERMUTATIONS], dtype=numpy.uint64)
+    _B = numpy.array([b for _, b in _PERMUTATIONS], dtype=numpy.uint64)
+
+
+def shingles(text):
+    """Return the set of hashed word n-grams of a text."""
+    words = re.findall(r"\w+", text.lower())
+    if len(words) < SHINGLE_SIZE:
+        grams = [" ".join(words)] if words else []
+    else:
+        grams = [" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)]
+    return {int.from_bytes(hashlib.blake2b(gram.encode("utf-8"), digest_size=4).digest(), "big") for gram in grams}
+
+
+def signature(text):
+    """Return the MinHash signature of a text as a tuple of NUM_PERMUTATIONS ints."""
+    values = shingles(text)
+    if not values:
+        return (0,) * NUM_PERMUTATIONS
+    if numpy is not None:
+        x = numpy.fromiter(values, dtype=numpy.uint64, count=len(values))
+        with numpy.errstate(over='ignore'):
+            hashed = (numpy.outer(x, _A) + _B) >> numpy.uint64(32)
+        return tuple(hashed.min(axis=0).tolist())
+    return tuple(
+        min((((a * value + b) & _MASK64) >> 32) for value in values)
+        for a, b in _PERMUTATIONS
+    )
+
+
+def estimated_similarity(first, second):
+    """Estimate Jaccard similarity from two MinHash signatures."""
+    return sum(1 for x, y in zip(first, second) if x == y) / NUM_PERMUTATIONS
+
+
+class MinHashLSH:
+    """Locality-sensitive hash index over MinHash signatures.
+
+    Lookups only compare against entries that share an LSH band with the
+    query, so their cost depends on the number of similar entries rather
+    than the size of the index.
+    """
+
+    def __init__(self, threshold=None):
+        self.threshold = DUPLICATE_THRESHOLD if threshold is None else threshold
+        self.signatures = {}
+        self.buckets = [dict() for _ in range(LSH_BANDS)]
+
+    def _bands(self, sig):
+        for band in range(LSH_BANDS):
+            yield band, sig[band * LSH_ROWS:(band + 1) * LSH_ROWS]
+
+    def add(self, key, sig):
+        self.signatures[key] = sig
+        for band, chunk in self._bands(sig):
+            self.buckets[band].setdefault(chunk, []).append(key)
+
+    def query(self, sig):
+        """Return ``(key, similarity)`` of an entry above the threshold, or None.
+
+        At most MAX_CANDIDATES entries are compared. A true near-duplicate
+        shares most bands with the query and is met early, while a topic of
+        templated, moderately similar questions cannot make lookups linear.
+        """
+        seen = set()
+        for band, chunk in self._bands(sig):
+            for key in self.buckets[band].get(chunk, ()):
+                if key in seen:
+                    continue
+                seen.add(key)
+                score = estimated_similarity(sig, self.signatures[key])
+                if score >= self.threshold:
+                    return key, score
+                if len(seen) >= MAX_CANDIDATES:
+                    return None
+        return None
+
+    def __len__(self):
+        return len(self.signatures)
+
+
+class TopicSimilarityIndex:
+    """LSH index of one topic's stored questions, kept in sync incrementally.
+
+    The index remembers the highest question id it has seen; ``refresh``
+    only reads questions inserted since then, including ones written by
+    other processes.
+    """
+
+    def __init__(self, topic_id, threshold=None):
+        self.topic_id = topic_id
+        self.lsh = MinHashLSH(threshold)
+        self.max_id = 0
+        self.lock = threading.Lock()
+
+    def refresh(self):
+        with self.lock:
+            rows = db.session.execute(
+                select(Question.id, Question.question_text).where(
+                    Question.topic_id == self.topic_id,
+                    Question.id > self.max_id
+                ).order_by(Question.id).execution_options(yield_per=1000)
+            )
+            added = 0
+            for question_id, text in rows:
+                if question_id not in self.lsh.signatures:
+                    self.lsh.add(question_id, signature(text))
+                    added += 1
+                self.max_id = question_id
+        if added:
+            logging.debug(f"Similarity index for topic {self.topic_id}: added {added} questions")
+        return self
+
+    def find_similar(self, text, sig=None):
+        with self.lock:
+            return self.lsh.query(sig or signature(text))
+
+    def record(self, question_id, text):
+        """Add a just-inserted question without waiting for the next refresh."""
+        with self.lock:
+            if question_id not in self.lsh.signatures:
+                self.lsh.add(question_id, signature(text))
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_topic_index(topic_id):
+    """Return the up-to-date similarity index of a topic, building it on first use."""
+    with _indexes_lock:
+        index = _indexes.get(topic_id)
+        if index is None:
+            index = _indexes[topic_id] = TopicSimilarityIndex(topic_id)
+    return index.refresh()
+
+
+def drop_topic_index(topic_id):
+    with _indexes_lock:
+        _indexes.pop(topic_id, None)
+
+
+def filter_near_duplicates(topic_id, variations):
+    """Split variations into ``(accepted, rejected)`` by similarity.
+
+    A variation is rejected when it is a near-duplicate of a stored question
+    of the topic or of a variation accepted earlier in the same list. Each
+    rejected item is ``(variation, matched, similarity)`` where ``matched``
+    is a question id or the text of the earlier variation.
+    """
+    stored = get_topic_index(topic_id)
+    batch = MinHashLSH()
+
+    accepted = []
+    rejected = []
+    for variation in variations:
+        text = variation.get('question') or ''
+        sig = signature(text)
+        match = stored.find_similar(text, sig)
+        if match is None:
+            match = batch.query(sig)
+            if match is not None:
+                match = (accepted[match[0]]['question'], match[1])
+        if match is not None:
+            rejected.append((variation, match[0], match[1]))
+            continue
+        batch.add(len(accepted), sig)
+        accepted.append(variation)
+    return accepted, rejected
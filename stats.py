@@ -0,0 +1,127 @@
+import os
+
+from sqlalchemy import select, func, case, event
+from sqlalchemy.orm import Session
+
+from app import db
+from cache import TTLCache
+from models import Topic, Question, QuestionAssignment, User
+
+# Dashboard aggregates are cached briefly; local writes invalidate them immediately
+DASHBOARD_CACHE_TTL = float(os.environ.get("DASHBOARD_CACHE_TTL", "10"))
+
+_dashboard_cache = TTLCache(maxsize=1, ttl=DASHBOARD_CACHE_TTL)
+
+# The topic list on the student dashboard only changes when topics or questions are added or removed
+TOPIC_CATALOGUE_TTL = float(os.environ.get("TOPIC_CATALOGUE_TTL", "30"))
+
+_catalogue_cache = TTLCache(maxsize=1, ttl=TOPIC_CATALOGUE_TTL)
+
+# Changes to these models make the dashboard figures stale
+_TRACKED_MODELS = (Topic, Question, QuestionAssignment, User)
+
+
+def topic_overview_query():
+    """One statement returning every topic with its question and assignment aggregates."""
+    question_counts = select(
+        Question.topic_id,
+        func.count().label('question_count'),
+        func.sum(case((Question.is_assigned == True, 1), else_=0)).label('assigned_count')
+    ).group_by(Question.topic_id).subquery()
+
+    assignment_counts = select(
+        QuestionAssignment.topic_id,
+        func.count().label('student_count'),
+        func.sum(case((QuestionAssignment.completed == True, 1), else_=0)).label('completed_count')
+    ).group_by(QuestionAssignment.topic_id).subquery()
+
+    return select(
+        Topic.id,
+        Topic.name,
+        Topic.description,
+        Topic.category,
+        Topic.difficulty,
+        Topic.created_at,
+        func.coalesce(question_counts.c.question_count, 0).label('question_count'),
+        func.coalesce(question_counts.c.assigned_count, 0).label('assigned_count'),
+        func.coalesce(assignment_counts.c.student_count, 0).label('student_count'),
+        func.coalesce(assignment_counts.c.completed_count, 0).label('completed_count'),
+    ).outerjoin(
+        question_counts, question_counts.c.topic_id == Topic.id
+    ).outerjoin(
+        assignment_counts, assignment_counts.c.topic_id == Topic.id
+    ).where(Topic.deleted_at.is_(None)).order_by(Topic.id)
+
+
+def topic_catalogue_query():
+    """Every active topic with its question count, for the student dashboard."""
+    question_counts = select(
+        Question.topic_id,
+        func.count().label('question_count')
+    ).group_by(Question.topic_id).subquery()
+
+    return select(
+        Topic.id,
+        Topic.name,
+        Topic.description,
+        Topic.category,
+        Topic.difficulty,
+        func.coalesce(question_counts.c.question_count, 0).label('question_count'),
+    ).outerjoin(
+        question_counts, question_counts.c.topic_id == Topic.id
+    ).where(Topic.deleted_at.is_(None)).order_by(Topic.id)
+
+
+def get_topic_catalogue():
+    """Return the active topics with question counts, served from a short-lived cache."""
+    return _catalogue_cache.get_or_set('topics', lambda: db.session.execute(topic_catalogue_query()).all())
+
+
+def invalidate_topic_catalogue():
+    _catalogue_cache.clear()
+
+
+def load_dashboard_stats():
+    topics = db.session.execute(topic_overview_query()).all()
+    total_students = db.session.query(func.count(User.id)).filter(User.role == 'student').scalar()
+
+    return {
+        'topics': topics,
+        'total_questions': sum(topic.question_count for topic in topics),
+        'total_assignments': sum(topic.student_count for topic in topics),
+        'total_students': total_students,
+    }
+
+
+def get_dashboard_stats():
+    """Return the admin dashboard figures, served from a short-lived cache."""
+    return _dashboard_cache.get_or_set('dashboard', load_dashboard_stats)
+
+
+def invalidate_dashboard_stats():
+    _dashboard_cache.clear()
+
+
+@event.listens_for(Session, 'after_flush')
+def _invalidate_after_flush(session, flush_context):
+    changed = (*session.new, *session.dirty, *session.deleted)
+    if any(isinstance(obj, _TRACKED_MODELS) for obj in changed):
+        invalidate_dashboard_stats()
+    # Question counts only change when questions are added or removed
+    if any(isinstance(obj, Topic) for obj in changed) or \
+            any(isinstance(obj, Question) for obj in (*session.new, *session.deleted)):
+        invalidate_topic_catalogue()
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _invalidate_after_bulk_write(orm_execute_state):
+    # Bulk insert/update/delete statements bypass the flush
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        mapper = orm_execute_state.bind_mapper
+        if mapper is None:
+            return
+        if issubclass(mapper.class_, _TRACKED_MODELS):
+            invalidate_dashboard_stats()
+        # Claiming questions is a bulk update, which leaves the catalogue as it is
+        if mapper.class_ is Topic or (mapper.class_ is Question and not orm_execute_state.is_update):
+            invalidate_topic_catalogue()
@@ -1,14 +1,80 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, session
+import hashlib
+from datetime import datetime
+
+from flask import Blueprint, render_template, request, redirect, url_for, flash, session, make_response, current_app
+from markupsafe import Markup
+from werkzeug.http import is_resource_modified
 from auth import login_required
 from models import Topic, Question, User, QuestionAssignment
 from app import db
-import random
+from assignment import assign_question
+from refill import trigger_refill
+from db_routing import read_only
+from progress import get_progress, record_assignment, record_completion
+from stats import get_topic_catalogue
+from fragments import cached_fragment, store_fragment, make_entry, invalidate_fragment, invalidate_on_change
 import logging
 
 student_bp = Blueprint('student', __name__)
 
+# Question pages show these columns; claims and quality reviews update questions in bulk
+# but never change what a student sees
+invalidate_on_change(Question, ('question_text', 'expected_answer', 'variation_number'), bulk_writes=False)
+invalidate_on_change(Topic, ('name', 'description', 'category', 'difficulty', 'deleted_at'))
+
+_question_template_version = None
+
+
+def _question_key(assignment_id, completed):
+    """Cache key of a rendered question page: template version, assignment and completion."""
+    global _question_template_version
+    if _question_template_version is None:
+        env = current_app.jinja_env
+        source = env.loader.get_source(env, 'student/question_body.html')[0]
+        _question_template_version = hashlib.sha1(source.encode('utf-8')).hexdigest()[:12]
+    return f"student_question:{_question_template_version}:{assignment_id}:{int(bool(completed))}"
+
+
+def _render_question(user_id, assignment_id):
+    assignment_data = db.session.query(QuestionAssignment, Topic, Question).join(
+        Topic, QuestionAssignment.topic_id == Topic.id
+    ).join(
+        Question, QuestionAssignment.question_id == Question.id
+    ).filter(
+        QuestionAssignment.id == assignment_id,
+        QuestionAssignment.user_id == user_id,
+        Topic.deleted_at.is_(None)
+    ).first()
+    
+    if not assignment_data:
+        return None
+    
+    assignment, topic, question = assignment_data
+    html = render_template('student/question_body.html', assignment=assignment, topic=topic, question=question)
+    return make_entry(html, completed=bool(assignment.completed))
+
+
+def question_fragment(user_id, assignment_id):
+    """Return the cached question page entry for a user's assignment, or None.
+
+    Ownership and completion come from the user's progress map, so a cached
+    page is served without touching the database. Assignments missing from
+    the map (it may lag writes from other processes) are looked up directly.
+    """
+    active_topics = {topic.id for topic in get_topic_catalogue()}
+    for topic_id, progress in get_progress(user_id).items():
+        if progress.assignment_id == assignment_id and topic_id in active_topics:
+            return cached_fragment(_question_key(assignment_id, progress.completed),
+                                   lambda: _render_question(user_id, assignment_id))
+    
+    entry = _render_question(user_id, assignment_id)
+    if entry is not None:
+        store_fragment(_question_key(assignment_id, entry['completed']), entry)
+    return entry
+
 @student_bp.route('/dashboard')
 @login_required
+@read_only
 def dashboard():
     if session.get('role') != 'student':
         flash('Student access required', 'error')
@@ -16,17 +82,16 @@ def dashboard():
     
     user_id = session['user_id']
     
-    # Get all available topics
-    topics = Topic.query.all()
+    # Active topics with question counts, shared by every student
+    topics = get_topic_catalogue()
     
-    # Get user's assignments
-    assignments = db.session.query(QuestionAssignment, Topic, Question).join(
-        Topic, QuestionAssignment.topic_id == Topic.id
-    ).join(
-        Question, QuestionAssignment.question_id == Question.id
-    ).filter(QuestionAssignment.user_id == user_id).all()
+    # The user's assignments by topic id
+    progress = get_progress(user_id)
+    assigned_topics = [topic for topic in topics if topic.id in progress]
+    completed_count = sum(1 for topic in assigned_topics if progress[topic.id].completed)
     
-    return render_template('student/dashboard.html', topics=topics, assignments=assignments)
+    return render_template('student/dashboard.html', topics=topics, progress=progress,
+                           assigned_topics=assigned_topics, completed_count=completed_count)
 
 @student_bp.route('/get_question/<int:topic_id>')
 @login_required
@@ -36,49 +101,28 @@ def get_question(topic_id):
         return redirect(url_for('auth.login'))
     
     user_id = session['user_id']
-    topic = Topic.query.get_or_404(topic_id)
-    
-    # Check if user already has an assignment for this topic
-    existing_assignment = QuestionAssignment.query.filter_by(
-        user_id=user_id, 
-        topic_id=topic_id
-    ).first()
-    
-    if existing_assignment:
-        return redirect(url_for('student.view_question', assignment_id=existing_assignment.id))
+    topic = Topic.get_active_or_404(topic_id)
     
-    # Get all unassigned questions for this topic
-    unassigned_questions = Question.query.filter_by(
-        topic_id=topic_id, 
-        is_assigned=False
-    ).all()
+    assignment, created = assign_question(user_id, topic.id)
     
-    if not unassigned_questions:
-        flash('No available questions for this topic. Please contact your administrator.', 'error')
+    if not assignment:
+        if trigger_refill(topic.id):
+            flash('New questions for this topic are being prepared. Please try again in a minute.', 'info')
+        else:
+            flash('No available questions for this topic. Please contact your administrator.', 'error')
         return redirect(url_for('student.dashboard'))
     
-    # Randomly assign a question to ensure fairness
-    selected_question = random.choice(unassigned_questions)
-    
-    # Create assignment
-    assignment = QuestionAssignment(
-        user_id=user_id,
-        question_id=selected_question.id,
-        topic_id=topic_id
-    )
-    
-    # Mark question as assigned
-    selected_question.is_assigned = True
-    
-    db.session.add(assignment)
-    db.session.commit()
-    
-    logging.info(f"Assigned question {selected_question.id} to user {user_id} for topic {topic_id}")
+    if created:
+        record_assignment(assignment)
+        logging.debug("Assigned question %s to user %s for topic %s", assignment.question_id, user_id, topic_id)
+        # Prefetch: generate more questions before the pool runs dry
+        trigger_refill(topic.id)
     
     return redirect(url_for('student.view_question', assignment_id=assignment.id))
 
 @student_bp.route('/question/<int:assignment_id>')
 @login_required
+@read_only
 def view_question(assignment_id):
     if session.get('role') != 'student':
         flash('Student access required', 'error')
@@ -86,26 +130,26 @@ def view_question(assignment_id):
     
     user_id = session['user_id']
     
-    # Get assignment details
-    assignment_data = db.session.query(QuestionAssignment, Topic, Question).join(
-        Topic, QuestionAssignment.topic_id == Topic.id
-    ).join(
-        Question, QuestionAssignment.question_id == Question.id
-    ).filter(
-        QuestionAssignment.id == assignment_id,
-        QuestionAssignment.user_id == user_id
-    ).first()
+    entry = question_fragment(user_id, assignment_id)
     
-    if not assignment_data:
+    if not entry:
         flash('Assignment not found or access denied', 'error')
         return redirect(url_for('student.dashboard'))
     
-    assignment, topic, question = assignment_data
-    
-    return render_template('student/question.html', 
-                         assignment=assignment, 
-                         topic=topic, 
-                         question=question)
+    last_modified = datetime.utcfromtimestamp(int(entry['rendered_at']))
+    # Pending flash messages are part of the page, so it cannot be answered with a 304
+    if not session.get('_flashes') and not is_resource_modified(request.environ, etag=entry['etag'],
+                                                                last_modified=last_modified):
+        response = make_response('', 304)
+    else:
+        response = make_response(render_template('student/question.html', fragment=Markup(entry['html'])))
+    
+    response.set_etag(entry['etag'])
+    response.last_modified = last_modified
+    # Browsers keep the page but check back on every view, since completing it changes it
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
 
 @student_bp.route('/complete_question/<int:assignment_id>', methods=['POST'])
 @login_required
@@ -127,6 +171,8 @@ def complete_question(assignment_id):
     
     assignment.completed = True
     db.session.commit()
+    record_completion(assignment)
+    invalidate_fragment(_question_key(assignment.id, False))
     
     flash('Question marked as completed!', 'success')
     return redirect(url_for('student.dashboard'))
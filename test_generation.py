@@ -1,6 +1,8 @@
 #!/usr/bin/env python3
 """
 Test script to verify and fix automatic question generation
+
+Set LLM_BACKEND=fake to run it offline against the local fake backend.
 """
 import os
 import sys
@@ -12,13 +14,14 @@ logging.basicConfig(level=logging.INFO)
 # Add current directory to Python path
 sys.path.insert(0, '.')
 
-from app import app, db
+from app import app, db, bootstrap
 from models import Topic, Question
 from openai_service import generate_question_variations
 
 def test_question_generation():
     """Test the complete question generation pipeline"""
     with app.app_context():
+        bootstrap()
         print("=== Testing AI Question Generation System ===")
         
         # Get available topics